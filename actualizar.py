@@ -1,67 +1,151 @@
-import json
-import requests
-from bs4 import BeautifulSoup
+import re
+import time
+import argparse
+import cliente_http
+import extractor
 import chardet
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import almacen
+import metricas
 
 # Configuración
 INPUT_JSON = "progarchives_albums_full_actualizado.json"
 OUTPUT_JSON = "progarchives_albums_full_actualizado_corregido.json"
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 MAX_WORKERS = 10
+CAMPOS = ("release_info", "tracklist", "lineup")  # campos que se vuelven a extraer de la página
 
-# Cargar el JSON existente
-with open(INPUT_JSON, "r", encoding="utf-8") as f:
-    data = json.load(f)
+# Carácter de reemplazo o UTF-8 leído como latin-1/cp1252 ("Ã©", "Ã±", "â€™", "Â ")
+MOJIBAKE = re.compile("�|[ÃÂ][\u0080-¿]|â€")
+CHARSET_HEADER = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+CHARSET_META = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.I)
+BYTES_META = 4096          # la declaración <meta> tiene que estar al principio del documento
+BLOQUE_DETECCION = 4096    # chardet se alimenta de a bloques y se detiene al estar seguro
+
+# ---------------------------
+# Decodificación
+# ---------------------------
+def _decodificar_estricto(contenido, encoding):
+    try:
+        return contenido.decode(encoding)
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+def detectar_incremental(contenido):
+    detector = chardet.UniversalDetector()
+    for i in range(0, len(contenido), BLOQUE_DETECCION):
+        detector.feed(contenido[i:i + BLOQUE_DETECCION])
+        if detector.done:
+            break
+    detector.close()
+    return detector.result["encoding"] or "utf-8"
 
 def detectar_y_arreglar_encoding(res):
-    result = chardet.detect(res.content)
-    real_encoding = result['encoding']
-    return res.content.decode(real_encoding, errors='replace')
+    """
+    Devuelve (texto, origen). Primero se cree en lo que declara el servidor
+    (cabecera HTTP y luego <meta charset>), comprobando que decodifique sin
+    errores; solo si no hay declaración válida se adivina con chardet.
+    """
+    contenido = res.content
+    declarados = []
+    m = CHARSET_HEADER.search(res.headers.get("Content-Type", ""))
+    if m:
+        declarados.append(("cabecera", m.group(1)))
+    m = CHARSET_META.search(contenido[:BYTES_META])
+    if m:
+        declarados.append(("meta", m.group(1).decode("ascii")))
+
+    for origen, encoding in declarados:
+        texto = _decodificar_estricto(contenido, encoding)
+        if texto is not None:
+            return texto, origen
+
+    # Si chardet se detuvo en un comienzo solo ASCII, su respuesta no cubre el resto:
+    # se verifica decodificando, con UTF-8 como segunda opción
+    encoding = detectar_incremental(contenido)
+    for candidato in (encoding, "utf-8"):
+        texto = _decodificar_estricto(contenido, candidato)
+        if texto is not None:
+            return texto, "chardet"
+    return contenido.decode("cp1252" if encoding == "ascii" else encoding, errors='replace'), "chardet"
+
+# ---------------------------
+# Selección de álbumes
+# ---------------------------
+def necesita_correccion(album):
+    return any(MOJIBAKE.search(album.get(campo) or "") for campo in CAMPOS)
 
 def corregir_album(album):
+    """Devuelve (album, origen del encoding, segundos); origen None si falló."""
+    inicio = time.perf_counter()
+    origen = None
     try:
-        res = requests.get(album["album_url"], headers=HEADERS, timeout=10)
-        html = detectar_y_arreglar_encoding(res)
-        soup = BeautifulSoup(html, "html.parser")
-
-        # Tracklist
-        tracklist_tag = soup.find("strong", string="Songs / Tracks Listing")
-        if tracklist_tag:
-            p = tracklist_tag.find_next("p")
-            if p:
-                album["tracklist"] = p.get_text(separator="\n", strip=True)
-
-        # Lineup
-        lineup_tag = soup.find("strong", string="Line-up / Musicians")
-        if lineup_tag:
-            p = lineup_tag.find_next("p")
-            if p:
-                album["lineup"] = p.get_text(separator="\n", strip=True)
+        res = cliente_http.get(album["album_url"], headers=HEADERS, timeout=10)
+        html, origen = detectar_y_arreglar_encoding(res)
+        details = extractor.extraer_album(html)
+
+        for campo in CAMPOS:
+            if details[campo]:
+                album[campo] = details[campo]
 
     except Exception as e:
         print(f"⚠️ Error actualizando álbum {album.get('title')}: {e}")
-    return album
-
-# Crear lista plana de (banda, album) para procesar en paralelo
-tareas = []
-for banda, info in data.items():
-    for album in info.get("albums", []):
-        tareas.append((banda, album))
-
-# Procesar en paralelo
-with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-    futuros = {executor.submit(corregir_album, album): (banda, album) for banda, album in tareas}
-    for future in as_completed(futuros):
-        banda, album = futuros[future]
-        try:
-            resultado = future.result()
-            print(f"✅ Corregido: {resultado.get('title')} ({banda})")
-        except Exception as e:
-            print(f"❌ Falló {album.get('title')} ({banda}): {e}")
-
-# Guardar el nuevo JSON corregido
-with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
-
-print(f"\n📁 Archivo corregido guardado en: {OUTPUT_JSON}")
+    return album, origen, time.perf_counter() - inicio
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vuelve a extraer release_info, tracklist y lineup de los álbumes con texto roto")
+    parser.add_argument("--todos", action="store_true", help="volver a descargar todos los álbumes, no solo los rotos")
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+    metricas.iniciar("reparacion", args)
+
+    # Cargar el JSON existente (con su diario pendiente, si lo hay)
+    data = almacen.cargar(INPUT_JSON)
+    salida = almacen.Almacen(OUTPUT_JSON, base=data)
+
+    # Solo se descargan los álbumes con caracteres de reemplazo o mojibake
+    tareas = []
+    total = 0
+    for banda, info in data.items():
+        for album in info.get("albums", []):
+            total += 1
+            if args.todos or necesita_correccion(album):
+                tareas.append((banda, album))
+    omitidos = total - len(tareas)
+    print(f"🔎 {len(tareas)} de {total} álbumes con texto roto; se omiten {omitidos}")
+
+    # Procesar en paralelo
+    inicio = time.perf_counter()
+    segundos_por_pagina = []
+    origenes = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futuros = {executor.submit(corregir_album, album): (banda, album) for banda, album in tareas}
+        for future in as_completed(futuros):
+            banda, album = futuros[future]
+            try:
+                resultado, origen, segundos = future.result()
+                segundos_por_pagina.append(segundos)
+                origenes[origen] = origenes.get(origen, 0) + 1
+                salida.guardar_album(banda, resultado)
+                sigue_roto = " (sigue con texto roto)" if necesita_correccion(resultado) else ""
+                print(f"✅ Corregido: {resultado.get('title')} ({banda}){sigue_roto}")
+            except Exception as e:
+                print(f"❌ Falló {album.get('title')} ({banda}): {e}")
+    duracion = time.perf_counter() - inicio
+
+    # Guardar el nuevo JSON corregido
+    salida.cerrar()
+
+    # Lo ahorrado: las páginas omitidas al mismo ritmo que las descargadas
+    if segundos_por_pagina:
+        por_pagina = sum(segundos_por_pagina) / len(segundos_por_pagina)
+        ahorro = omitidos * por_pagina / MAX_WORKERS
+        print(f"⏱ {len(tareas)} páginas en {duracion:.1f}s ({por_pagina * 1000:.0f} ms c/u); "
+              f"{omitidos} omitidas ≈ {ahorro:.1f}s ahorrados")
+        print("🔤 Encoding según: " + ", ".join(f"{k or 'error'} {v}" for k, v in origenes.items()))
+
+    print(f"\n📁 Archivo corregido guardado en: {OUTPUT_JSON}")
+    metricas.finalizar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import json
+import os
+import hashlib
+import re
+import time
+import threading
+import logging
+import unicodedata
+import urllib.parse
+import metricas
+
+# ---------------------------
+# Almacén de bandas y álbumes
+# ---------------------------
+# El JSON anidado {banda: {..., "albums": [...]}} sigue siendo el formato
+# del libro, pero ya no se reescribe entero después de cada registro.
+# Cada cambio se anexa como una línea a un diario JSONL (O(1) por registro)
+# y cada cierto tiempo se compacta el diario en el JSON completo.
+
+SUFIJO_DIARIO = ".diario.jsonl"
+SUFIJO_BASE = ".base"  # huella de la `base` de la corrida en curso que ya compactó en el snapshot
+FSYNC = True  # fsync tras cada registro: un corte de luz no pierde nada ya confirmado
+FORMATO_QR = "png"  # "svg" para imprenta; generar_qr.py lo escribe y libro.py lo lee sin importar el render
+
+
+def id_progarchives(url):
+    """Devuelve el id numérico de una URL de ProgArchives (album.asp?id=... / artist.asp?id=...)."""
+    if not url:
+        return None
+    qs = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+    return qs.get("id", [None])[0]
+
+
+def nombre_archivo(id_album):
+    """El id como nombre de archivo: los de respaldo ("banda/título") pasan a minúsculas ASCII con guiones."""
+    if id_album.isdigit():
+        return id_album
+    sin_acentos = unicodedata.normalize("NFKD", id_album).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", sin_acentos.lower()).strip("-") or "sin-id"
+
+
+def ruta_qr(carpeta, id_album):
+    """El archivo del QR de un álbum en `carpeta` (qr/spotify, qr/tidal), en FORMATO_QR."""
+    return os.path.join(carpeta, f"{nombre_archivo(id_album)}.{FORMATO_QR}")
+
+
+def _clave_album(album):
+    # Por id de ProgArchives; si no hay URL, por título
+    return id_progarchives(album.get("album_url")) or "titulo:" + (album.get("title") or "")
+
+
+def _huella(datos):
+    return hashlib.blake2b(json.dumps(datos, sort_keys=True, ensure_ascii=False).encode("utf-8"),
+                           digest_size=16).hexdigest()
+
+
+def escribir_json_atomico(ruta, data):
+    # Se escribe en un temporal y se reemplaza: el JSON nunca queda a medias
+    inicio = time.perf_counter()
+    tmp = ruta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+    archivo = os.path.basename(ruta)
+    metricas.observar("json_escritura_segundos", time.perf_counter() - inicio, archivo=archivo)
+    metricas.contar("json_escritura_bytes", os.path.getsize(ruta), archivo=archivo)
+
+
+class Almacen:
+    """
+    Snapshot JSON anidado + diario de solo-anexado.
+
+    Al abrir se carga el snapshot (o una copia de `base`, si se entrega) y se
+    reaplica el diario encima. Las operaciones son upserts idempotentes, por lo
+    que si se corta la compactación entre escribir el snapshot y vaciar el
+    diario, al reabrir se llega al mismo estado.
+
+    Con `base`, el snapshot que ya exista en ruta_json suele ser la salida de
+    una corrida anterior y no se usa, salvo que lo haya compactado una corrida
+    cortada desde esta misma base (<ruta_json>.base tiene su huella).
+    """
+
+    def __init__(self, ruta_json, base=None, compactar_auto=True):
+        self.ruta_json = ruta_json
+        self.ruta_diario = ruta_json + SUFIJO_DIARIO
+        self.compactar_auto = compactar_auto
+        self._lock = threading.RLock()
+        self._diario = None
+        self._bytes_diario = 0
+
+        self._huella_base = _huella(base) if base is not None else None
+        existe = os.path.exists(ruta_json)
+        if base is not None and not (existe and self._huella_base == self._leer_huella_base()):
+            # Bandas y listas de álbumes propias: los upserts no tocan `base`
+            self.datos = {banda: {**info, "albums": list(info["albums"])} if "albums" in info else dict(info)
+                          for banda, info in base.items()}
+        elif existe:
+            # Sin base, o una corrida cortada desde esta misma base ya dejó en el snapshot base + lo hecho
+            with open(ruta_json, "r", encoding="utf-8") as f:
+                self.datos = json.load(f)
+        else:
+            self.datos = {}
+
+        self._bytes_snapshot = os.path.getsize(ruta_json) if os.path.exists(ruta_json) else 0
+        self._indexar()
+        self._reaplicar_diario()
+
+    # ---------------------------
+    # Carga
+    # ---------------------------
+    def _indexar(self):
+        from indice import IndiceAlbums
+
+        # Consultas por id, banda/título, año, rank y rating (ver indice.py)
+        self.indice = IndiceAlbums(self.datos)
+        # (banda, clave_album) -> posición en la lista de álbumes de la banda
+        self._pos_album = {}
+        for banda, info in self.datos.items():
+            for i, album in enumerate(info.get("albums", [])):
+                self._pos_album[(banda, _clave_album(album))] = i
+
+    def _leer_huella_base(self):
+        try:
+            with open(self.ruta_json + SUFIJO_BASE, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _reaplicar_diario(self):
+        if not os.path.exists(self.ruta_diario):
+            return
+        aplicados = 0
+        valido_hasta = 0
+        with open(self.ruta_diario, "rb") as f:
+            for linea in f:
+                # Una línea sin salto final es una escritura cortada por un crash
+                if not linea.endswith(b"\n"):
+                    break
+                try:
+                    entrada = json.loads(linea)
+                except ValueError:
+                    break
+                self._aplicar(entrada)
+                aplicados += 1
+                valido_hasta += len(linea)
+
+        if valido_hasta < os.path.getsize(self.ruta_diario):
+            logging.warning(f"Diario {self.ruta_diario} con cola incompleta; se descarta desde el byte {valido_hasta}")
+            with open(self.ruta_diario, "r+b") as f:
+                f.truncate(valido_hasta)
+        self._bytes_diario = valido_hasta
+        if aplicados:
+            logging.info(f"Diario reaplicado: {aplicados} registros de {self.ruta_diario}")
+
+    def _aplicar(self, entrada):
+        banda = entrada["banda"]
+        if entrada["tipo"] == "banda":
+            albums = self.datos.get(banda, {}).get("albums", [])
+            self.datos[banda] = {**entrada["datos"], "albums": albums}
+            self.indice.actualizar_banda(banda, self.datos[banda])
+        elif entrada["tipo"] == "album":
+            album = entrada["album"]
+            info = self.datos.setdefault(banda, {"albums": []})
+            albums = info.setdefault("albums", [])
+            clave = (banda, _clave_album(album))
+            pos = self._pos_album.get(clave)
+            if pos is None:
+                self._pos_album[clave] = len(albums)
+                albums.append(album)
+            else:
+                albums[pos] = album
+            self.indice.agregar(banda, info, album)
+
+    # ---------------------------
+    # Escritura
+    # ---------------------------
+    def _anexar(self, entrada):
+        linea = (json.dumps(entrada, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._aplicar(entrada)
+            if self._diario is None:
+                self._diario = open(self.ruta_diario, "ab")
+            inicio = time.perf_counter()
+            self._diario.write(linea)
+            self._diario.flush()
+            if FSYNC:
+                os.fsync(self._diario.fileno())
+            metricas.observar("diario_escritura_segundos", time.perf_counter() - inicio)
+            self._bytes_diario += len(linea)
+
+            # Compactar cuando el diario supera al snapshot mantiene el costo amortizado en O(1)
+            if self.compactar_auto and self._bytes_diario > max(self._bytes_snapshot, 1 << 20):
+                self.compactar()
+
+    def guardar_banda(self, banda, datos):
+        """Inserta o reemplaza los datos de la banda (sin tocar sus álbumes)."""
+        datos = {k: v for k, v in datos.items() if k != "albums"}
+        self._anexar({"tipo": "banda", "banda": banda, "datos": datos})
+
+    def guardar_album(self, banda, album):
+        """Inserta o reemplaza un álbum de la banda (por id de ProgArchives)."""
+        self._anexar({"tipo": "album", "banda": banda, "album": album})
+
+    # ---------------------------
+    # Consultas
+    # ---------------------------
+    def existe_banda(self, banda):
+        return banda in self.datos
+
+    def existe_album(self, banda, titulo):
+        with self._lock:
+            return self.indice.buscar(banda, titulo) is not None
+
+    # ---------------------------
+    # Exportación / compactación
+    # ---------------------------
+    def exportar(self, ruta=None):
+        """Escribe el JSON anidado actual (el que usa el libro)."""
+        with self._lock:
+            escribir_json_atomico(ruta or self.ruta_json, self.datos)
+
+    def compactar(self):
+        with self._lock:
+            self.exportar()
+            self._bytes_snapshot = os.path.getsize(self.ruta_json)
+            if self._huella_base:
+                # Después del snapshot y antes de vaciar el diario: si se corta acá, se retoma igual
+                tmp = self.ruta_json + SUFIJO_BASE + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(self._huella_base)
+                os.replace(tmp, self.ruta_json + SUFIJO_BASE)
+            if self._diario is not None:
+                self._diario.close()
+                self._diario = None
+            if os.path.exists(self.ruta_diario):
+                os.remove(self.ruta_diario)
+            self._bytes_diario = 0
+            logging.info(f"✅ Almacén compactado: {self.ruta_json}")
+
+    def cerrar(self):
+        """Deja el JSON completo al día y el diario vacío."""
+        self.compactar()
+        # Corrida terminada: la próxima desde una base no parte de esta salida
+        if self._huella_base and os.path.exists(self.ruta_json + SUFIJO_BASE):
+            os.remove(self.ruta_json + SUFIJO_BASE)
+
+
+def cargar(ruta_json):
+    """Lee un dataset incluyendo los cambios aún no compactados de su diario."""
+    return Almacen(ruta_json).datos
@@ -0,0 +1,456 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# ---------------------------
+# Benchmark de punta a punta
+# ---------------------------
+# Corre los scripts completos (prog, completar, actualizar, generar_qr) y
+# algunas funciones calientes contra servidores locales que reproducen las
+# páginas grabadas en muestras/ y las APIs (OpenAI, Spotify, Tidal).
+#
+# Cada escenario corre en un proceso hijo nuevo, en un directorio temporal:
+# los módulos arrancan limpios y el pico de RSS es solo el del escenario.
+# Los servidores viven en este proceso y cuentan las peticiones de cada uno.
+#
+#   python bench_e2e.py                  # corre todo y compara con la línea base
+#   python bench_e2e.py --solo actualizar --solo micro_json
+#   python bench_e2e.py --guardar-base   # fija la línea base con esta corrida
+#
+# La línea base (bench_base.json) es de cada máquina y no va al repositorio:
+# la primera corrida de cada escenario la escribe, y --guardar-base la renueva.
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+DATASET = os.path.join(RAIZ, "progarchives_albums_full_actualizado.json")
+MUESTRAS = os.path.join(RAIZ, "muestras")
+LINEA_BASE = os.path.join(RAIZ, "bench_base.json")
+PROGARCHIVES = "https://www.progarchives.com/"
+
+TOLERANCIA_TIEMPO = 0.25       # +25% de tiempo es regresión
+TOLERANCIA_RSS = 0.20
+TOLERANCIA_PETICIONES = 0.05   # los modos con hilos pueden variar algunas peticiones
+MINIMO_TIEMPO = 0.05           # diferencias menores a esto (s) son ruido
+
+# Marcas de las muestras donde se inserta el id pedido: así cada reseña y
+# biografía es distinta, como en el sitio real, y la caché no las confunde
+MARCA_RESENA = 'color:#333;font-size:13px;">'
+MARCA_BIO = 'id="moreBio" style="display:none">'
+
+
+def leer_muestra(nombre):
+    with open(os.path.join(MUESTRAS, nombre), encoding="utf-8") as f:
+        return f.read()
+
+
+# ---------------------------
+# Servidores (proceso padre)
+# ---------------------------
+def rutas_sitio():
+    album, artista, tabla = leer_muestra("album.html"), leer_muestra("artista.html"), leer_muestra("tabla.html")
+    html = {"Content-Type": "text/html; charset=utf-8"}
+
+    def rutas(metodo, path, query, headers, cuerpo):
+        marca = f"[{query.get('id', '')}] "
+        if path == "/album.asp":
+            return 200, html, album.replace(MARCA_RESENA, MARCA_RESENA + marca)
+        if path == "/artist.asp":
+            return 200, html, artista.replace(MARCA_BIO, MARCA_BIO + marca)
+        if path == "/tabla.html":
+            return 200, html, tabla
+        return 404, html, "no encontrado"
+
+    return rutas
+
+
+def iniciar_servidores():
+    from servidores_prueba import ServidorPrueba, con_validadores, rutas_openai, rutas_spotify, rutas_tidal
+
+    return {
+        "progarchives": ServidorPrueba(con_validadores(rutas_sitio()), latencia=0.02).iniciar(),
+        "openai": ServidorPrueba(rutas_openai(0.05, 0.0001)).iniciar(),
+        "spotify": ServidorPrueba(rutas_spotify(latencia=0.02, sin_resultado=0.05)).iniciar(),
+        "tidal": ServidorPrueba(rutas_tidal(latencia=0.02, sin_resultado=0.05)).iniciar(),
+    }
+
+
+# ---------------------------
+# Escenarios (proceso hijo)
+# ---------------------------
+# Cada uno recibe las URLs de los servidores y devuelve (cantidad, unidad).
+ESCENARIOS = {}
+
+
+def escenario(fn):
+    ESCENARIOS[fn.__name__] = fn
+    return fn
+
+
+def dataset_local(urls, sin_bios=False):
+    with open(DATASET, encoding="utf-8") as f:
+        datos = json.load(f)
+    for info in datos.values():
+        info["band_url"] = (info.get("band_url") or "").replace(PROGARCHIVES, urls["progarchives"])
+        if sin_bios:
+            info["biography"] = {}
+        for album in info.get("albums", []):
+            album["album_url"] = (album.get("album_url") or "").replace(PROGARCHIVES, urls["progarchives"])
+    return datos
+
+
+def escribir_json(ruta, datos):
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False)
+
+
+def contar_albums(datos):
+    return sum(len(info.get("albums", [])) for info in datos.values())
+
+
+@escenario
+def prog_async(urls):
+    import prog
+    prog.BASE_URL = urls["progarchives"]
+    prog.main(["--async", "--rps", "500", "--tabla", urls["progarchives"] + "tabla.html"])
+    return contar_albums(prog.bands), "álbumes"
+
+
+@escenario
+def prog_hilos(urls):
+    import prog
+    prog.BASE_URL = urls["progarchives"]
+    prog.main(["--tabla", urls["progarchives"] + "tabla.html"])
+    return contar_albums(prog.bands), "álbumes"
+
+
+@escenario
+def completar(urls):
+    import completar
+    datos = dataset_local(urls, sin_bios=True)
+    escribir_json(completar.INPUT_JSON, datos)
+    completar.main([])
+    return len(datos), "bandas"
+
+
+@escenario
+def actualizar(urls):
+    import actualizar
+    datos = dataset_local(urls)
+    escribir_json(actualizar.INPUT_JSON, datos)
+    actualizar.main([])
+    return contar_albums(datos), "álbumes"
+
+
+def configurar_generar_qr(urls):
+    import generar_qr
+    generar_qr.SPOTIFY_AUTH_URL = urls["spotify"] + "api/token"
+    generar_qr.SPOTIFY_API_URL = urls["spotify"] + "v1/"
+    generar_qr.TIDAL_AUTH_URL = urls["tidal"] + "v1/oauth2/token"
+    generar_qr.TIDAL_API_URL = urls["tidal"] + "v2/"
+    # Se mide el pipeline, no la cuota de los proveedores (eso lo mide bench_qr.py)
+    generar_qr.SPOTIFY_RPS = generar_qr.TIDAL_RPS = 100.0
+    generar_qr.LOGO_SPOTIFY = os.path.join(RAIZ, "logos", "spotify_logo.png")
+    generar_qr.LOGO_TIDAL = os.path.join(RAIZ, "logos", "tidal_logo.png")
+    return generar_qr
+
+
+@escenario
+def generar_qr(urls):
+    modulo = configurar_generar_qr(urls)
+    datos = dataset_local(urls)
+    modulo.procesar_albums(datos)
+    return contar_albums(datos), "álbumes"
+
+
+@escenario
+def refrescar(urls):
+    # Una pasada que llena ETag/hash de cada página y otra que solo verifica (todo 304)
+    import refrescar
+    datos = dataset_local(urls)
+    escribir_json(refrescar.ENTRADA, datos)
+    refrescar.main(["--sin-traducir"])
+    refrescar.main(["--todo"])
+    return 2 * sum(1 + len(info.get("albums", [])) for info in datos.values()), "páginas"
+
+
+@escenario
+def pipeline(urls):
+    # Toda la cadena (prog → completar → reparación → traducción → QR) registro por registro
+    import almacen
+    import pipeline
+    configurar_generar_qr(urls)
+    pipeline.main(["--tabla", urls["progarchives"] + "tabla.html", "--base-url", urls["progarchives"]])
+    return contar_albums(almacen.cargar(pipeline.SALIDA)), "álbumes"
+
+
+# Micro-benchmarks: funciones calientes repetidas n veces
+@escenario
+def micro_extraer_album(urls, n=200):
+    import extractor
+    html = leer_muestra("album.html")
+    for _ in range(n):
+        extractor.extraer_album(html)
+    return n, "páginas"
+
+
+@escenario
+def micro_fetch_album_details(urls, n=100):
+    import prog
+    prog.GPT_TRANSLATE = False
+    for i in range(n):
+        prog.fetch_album_details(f"{urls['progarchives']}album.asp?id={i}")
+    return n, "álbumes"
+
+
+@escenario
+def micro_process_album(urls, n=100):
+    import extractor
+    import prog
+    prog.GPT_TRANSLATE = False
+    filas = extractor.extraer_tabla(leer_muestra("tabla.html"), urls["progarchives"])[:n]
+    for fila in filas:
+        prog.process_album(fila)
+    return len(filas), "álbumes"
+
+
+@escenario
+def micro_decodificar(urls, n=50):
+    # Peor caso: sin charset en la cabecera ni en <meta>, cae en la detección incremental
+    import actualizar
+    import requests
+    res = requests.Response()
+    res._content = leer_muestra("album.html").encode("utf-8").replace(b"; charset=utf-8", b"")
+    res.headers["Content-Type"] = "text/html"
+    for _ in range(n):
+        actualizar.detectar_y_arreglar_encoding(res)
+    return n, "páginas"
+
+
+@escenario
+def micro_generar_qr_con_logo(urls, n=100):
+    modulo = configurar_generar_qr(urls)
+    for i in range(n):
+        modulo.generar_qr_con_logo(f"https://open.spotify.com/album/{i:022d}", modulo.LOGO_SPOTIFY, f"{i}.png")
+    return n, "QR"
+
+
+@escenario
+def micro_json(urls, n=10):
+    for _ in range(n):
+        with open(DATASET, encoding="utf-8") as f:
+            datos = json.load(f)
+        with open("salida.json", "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+    return n, "load+dump"
+
+
+@escenario
+def micro_corregir_codificacion(urls, n=5):
+    import corregir_codificacion_utf
+    for _ in range(n):
+        corregir_codificacion_utf.main([DATASET, "-o", "salida.json"])
+    return n, "datasets"
+
+
+@escenario
+def micro_libro(urls, n=3):
+    import almacen
+    import libro
+    datos = almacen.cargar(DATASET)
+    for _ in range(n):
+        libro.escribir_libro(libro.paginas_libro(datos, os.path.join(RAIZ, libro.QR_DIR)), "libro.html")
+    return n, "libros"
+
+
+@escenario
+def micro_modelo(urls, n=50):
+    # Un armado del snapshot y n cargas desde él, recorriendo lo que usan generar_qr / indice
+    import modelo
+    shutil.copy(DATASET, "dataset.json")
+    modelo.cargar("dataset.json")
+    for _ in range(n):
+        datos = modelo.cargar("dataset.json")
+        sum(len(a.get("title") or "") for info in datos.values() for a in info.get("albums", []))
+    return n, "cargas"
+
+
+@escenario
+def micro_indice_libro(urls, n=5):
+    # Las páginas del libro se calculan una vez; se mide armar y paginar el índice
+    import almacen
+    import indice_libro
+    import libro
+    datos = almacen.cargar(DATASET)
+    anclas = {}
+    total = sum(1 for _ in libro.paginas_libro(datos, os.path.join(RAIZ, libro.QR_DIR), anclas=anclas))
+    for _ in range(n):
+        libro.escribir_libro(indice_libro.paginas_indice(datos, anclas), "indice.html", total + 1)
+    return n, "índices"
+
+
+@escenario
+def micro_busqueda(urls, n=500):
+    # Un armado del índice y n consultas (palabras, frases y campos)
+    import almacen
+    import busqueda
+    busqueda.construir(almacen.cargar(DATASET), "busqueda.idx")
+    indice = busqueda.IndiceBusqueda("busqueda.idx")
+    consultas = ["mellotron", '"close to the edge"', "rock progresivo", '"peter gabriel" flute', "canción"]
+    for i in range(n):
+        indice.buscar(consultas[i % len(consultas)])
+    indice.cerrar()
+    return n, "consultas"
+
+
+@escenario
+def micro_partir(urls, n=3):
+    import partir_partes
+    for _ in range(n):
+        partir_partes.main([DATASET, "--qr", os.path.join(RAIZ, "qr"), "-n", "3"])
+    return n, "particiones"
+
+
+@escenario
+def micro_libro_incremental(urls, n=10):
+    # Una construcción en frío y n reconstrucciones, cada una con otra reseña editada
+    import almacen
+    import libro
+    datos = almacen.cargar(DATASET)
+    qr_dir = os.path.join(RAIZ, libro.QR_DIR)
+    resenas = [a["collaborator_reviews"][0] for info in datos.values() for a in info.get("albums", [])
+               if a.get("collaborator_reviews")]
+    cache = libro.CacheFragmentos()
+    libro.escribir_libro(libro.paginas_libro(datos, qr_dir, cache), "libro.html")
+    for resena in resenas[:n]:
+        resena["translated_text"] += "\n\nEditada."
+        libro.escribir_libro(libro.paginas_libro(datos, qr_dir, cache), "libro.html")
+    cache.cerrar()
+    return n, "reconstrucciones"
+
+
+@escenario
+def micro_fixbio(urls, n=5):
+    import fixbio
+    with open(os.path.join(RAIZ, "libro3.html"), encoding="utf-8") as f:
+        contenido = f.read()
+    for _ in range(n):
+        fixbio.arreglar_bios(contenido)
+    return n, "libros"
+
+
+def correr_hijo(nombre, urls):
+    sys.path.insert(0, RAIZ)
+    tmp = tempfile.TemporaryDirectory(prefix=f"bench_{nombre}_")
+    os.chdir(tmp.name)
+    import openai
+    openai.api_key = "bench"
+    openai.base_url = urls["openai"] + "v1/"
+    # Sin tope de tokens por minuto: se mide el pipeline, no la cuota de OpenAI
+    import lotes_traduccion
+    lotes_traduccion._limitador = lotes_traduccion.LimitadorTasa(rpm=10 ** 6, tpm=10 ** 9)
+
+    # Lo que los scripts imprimen va a stderr; stdout queda para el resultado
+    with contextlib.redirect_stdout(sys.stderr):
+        inicio = time.perf_counter()
+        cantidad, unidad = ESCENARIOS[nombre](urls)
+        segundos = time.perf_counter() - inicio
+
+    os.chdir(RAIZ)
+    tmp.cleanup()
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB en Linux
+    print(json.dumps({"segundos": segundos, "cantidad": cantidad, "unidad": unidad, "rss_mb": rss_mb}))
+
+
+# ---------------------------
+# Orquestación (proceso padre)
+# ---------------------------
+def correr_escenario(nombre, servidores):
+    urls = {k: s.url for k, s in servidores.items()}
+    antes = sum(s.peticiones for s in servidores.values())
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--hijo", nombre, json.dumps(urls)],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        logging.error(f"❌ {nombre} falló:\n{proc.stderr[-3000:]}")
+        return None
+    resultado = json.loads(proc.stdout.strip().splitlines()[-1])
+    resultado["peticiones"] = sum(s.peticiones for s in servidores.values()) - antes
+    return resultado
+
+
+def regresiones(actual, base):
+    """Lista de métricas que empeoraron más allá de la tolerancia."""
+    if not base:
+        return []
+    malas = []
+    if (actual["segundos"] > base["segundos"] * (1 + TOLERANCIA_TIEMPO)
+            and actual["segundos"] - base["segundos"] > MINIMO_TIEMPO):
+        malas.append("tiempo")
+    if actual["rss_mb"] > base["rss_mb"] * (1 + TOLERANCIA_RSS):
+        malas.append("RSS")
+    if actual["peticiones"] > base["peticiones"] * (1 + TOLERANCIA_PETICIONES):
+        malas.append("peticiones")
+    return malas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta contra servidores locales")
+    parser.add_argument("--solo", action="append", choices=sorted(ESCENARIOS), help="escenario a correr (repetible)")
+    parser.add_argument("--guardar-base", action="store_true", help="guardar esta corrida como línea base")
+    parser.add_argument("--hijo", nargs=2, metavar=("ESCENARIO", "URLS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        logging.basicConfig(level=logging.WARNING)
+        correr_hijo(args.hijo[0], json.loads(args.hijo[1]))
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    base = {}
+    if os.path.exists(LINEA_BASE):
+        with open(LINEA_BASE, encoding="utf-8") as f:
+            base = json.load(f)
+
+    servidores = iniciar_servidores()
+    resultados = {}
+    hubo_regresion = False
+    print(f"{'escenario':<26} {'s':>7} {'ritmo':>18} {'RSS MB':>7} {'peticiones':>10}  vs base")
+    for nombre in args.solo or list(ESCENARIOS):
+        r = correr_escenario(nombre, servidores)
+        if r is None:
+            hubo_regresion = True
+            continue
+        resultados[nombre] = r
+        ritmo = f"{r['cantidad'] / r['segundos']:.1f} {r['unidad']}/s"
+        previo = base.get(nombre)
+        if previo:
+            comparacion = f"{100 * (r['segundos'] / previo['segundos'] - 1):+.0f}% tiempo"
+            malas = regresiones(r, previo)
+            if malas:
+                hubo_regresion = True
+                comparacion += f"  ⚠️ regresión: {', '.join(malas)}"
+        else:
+            comparacion = "sin base"
+        print(f"{nombre:<26} {r['segundos']:7.2f} {ritmo:>18} {r['rss_mb']:7.0f} {r['peticiones']:10d}  {comparacion}")
+
+    for s in servidores.values():
+        s.detener()
+
+    # Los escenarios sin base en esta máquina la toman de esta corrida
+    nuevos = {nombre: r for nombre, r in resultados.items() if args.guardar_base or nombre not in base}
+    if nuevos:
+        base.update(nuevos)
+        with open(LINEA_BASE, "w", encoding="utf-8") as f:
+            json.dump(base, f, indent=2, ensure_ascii=False)
+        print(f"\n📁 Línea base guardada en {LINEA_BASE} ({', '.join(nuevos)})")
+    return 1 if hubo_regresion and not args.guardar_base else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import argparse
+import time
+from bs4 import BeautifulSoup
+import extractor
+
+# ---------------------------
+# Tiempo de parseo por página: BeautifulSoup vs extractor.py
+# ---------------------------
+# Las funciones bs4_* son la lógica que tenían prog.py y completar.py antes
+# del extractor; sirven de referencia para comprobar que los campos
+# extraídos son los mismos.
+
+
+def bs4_album(html, max_review_chars=extractor.MAX_REVIEW_CHARS):
+    soup = BeautifulSoup(html, "html.parser")
+    details = {"album_type": None, "release_info": None, "tracklist": None, "lineup": None,
+               "collaborator_reviews": []}
+
+    type_block = soup.find("strong", string=lambda x: x and "Album" in x)
+    if type_block:
+        details["album_type"] = type_block.get_text(strip=True)
+        release_info = type_block.find_next("p")
+        if release_info:
+            details["release_info"] = release_info.get_text(separator="\n", strip=True)
+
+    for campo, titulo in (("tracklist", "Songs / Tracks Listing"), ("lineup", "Line-up / Musicians")):
+        tag = soup.find("strong", string=titulo)
+        if tag:
+            p = tag.find_next("p")
+            if p:
+                details[campo] = p.get_text(separator="\n", strip=True)
+
+    char_count = 0
+    for r in soup.find_all("div", style=lambda x: x and "background-color:#f0f0f0" in x):
+        if "SPECIAL COLLABORATOR" in r.get_text():
+            content = r.find("div", style=lambda x: x and "color:#333" in x)
+            if content:
+                text = content.get_text(separator="\n", strip=True)
+                if char_count + len(text) > max_review_chars:
+                    break
+                char_count += len(text)
+                author_tag = r.find("a")
+                details["collaborator_reviews"].append({
+                    "author": author_tag.get_text(strip=True) if author_tag else "Desconocido",
+                    "text": text,
+                    "translated_text": ""
+                })
+    return details
+
+
+def bs4_artista(html):
+    soup = BeautifulSoup(html, "html.parser")
+    h2 = soup.find("h2")
+    country = h2.text.split("•")[-1].strip() if h2 and "•" in h2.text else None
+    img_tag = soup.select_one("#artist-box img")
+    bio_text = ""
+    more_bio = soup.select_one("span#moreBio")
+    if more_bio:
+        for a in more_bio.find_all("a"):
+            a.unwrap()
+        bio_text = more_bio.get_text(separator="\n", strip=True)
+    else:
+        alt_bio = soup.select_one("#artist-biography")
+        if alt_bio:
+            bio_text = alt_bio.get_text(separator="\n", strip=True)
+    return {"country": country, "photo_url": img_tag["src"] if img_tag else None, "biography": bio_text}
+
+
+def bs4_tabla(html):
+    filas = []
+    for row in BeautifulSoup(html, "html.parser").find_all("tr"):
+        cols = row.find_all("td")
+        if len(cols) < 4:
+            continue
+        try:
+            rank = int(cols[0].text.strip())
+        except ValueError:
+            continue
+        a = cols[2].find_all("a")
+        info = cols[3].text.strip()
+        rating = cols[4].find("span", id=lambda x: x and "avgRatings_" in x)
+        votos = cols[4].find("span", id=lambda x: x and "nbRatings_" in x)
+        img = cols[1].find("img")
+        filas.append({
+            "band_name": a[1].text.strip(),
+            "band_url": extractor.BASE_URL + a[1]["href"],
+            "album": {
+                "rank": rank,
+                "title": a[0].text.strip(),
+                "album_url": extractor.BASE_URL + a[0]["href"],
+                "cover_url": img["src"] if img else "",
+                "year": int(info[-4:]) if info[-4:].isdigit() else None,
+                "average_rating": float(rating.text.strip()) if rating else None,
+                "ratings_count": int(votos.text.strip().replace(",", "")) if votos else None,
+            },
+        })
+    return filas
+
+
+PAGINAS = [
+    ("álbum", "muestras/album.html", bs4_album, extractor.extraer_album),
+    ("artista", "muestras/artista.html", bs4_artista, extractor.extraer_artista),
+    ("ranking", "muestras/tabla.html", bs4_tabla, extractor.extraer_tabla),
+]
+
+
+def cronometrar(fn, html, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = fn(html)
+    return (time.perf_counter() - inicio) / repeticiones * 1000, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=50, help="repeticiones por página")
+    args = parser.parse_args()
+
+    print(f"{'página':<10} {'KB':>6} {'bs4 ms':>9} {'lxml ms':>9} {'x':>6}  campos")
+    for nombre, ruta, referencia, nuevo in PAGINAS:
+        with open(ruta, encoding="utf-8") as f:
+            html = f.read()
+        t_bs4, r_bs4 = cronometrar(referencia, html, args.n)
+        t_lxml, r_lxml = cronometrar(nuevo, html, args.n)
+        iguales = "iguales" if r_bs4 == r_lxml else "DISTINTOS"
+        print(f"{nombre:<10} {len(html) / 1024:6.0f} {t_bs4:9.2f} {t_lxml:9.2f} {t_bs4 / t_lxml:6.1f}  {iguales}")
+
+
+if __name__ == "__main__":
+    main()
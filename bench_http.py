@@ -0,0 +1,49 @@
+import argparse
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+import cliente_http
+from servidores_prueba import ServidorPrueba, rutas_progarchives
+
+# ---------------------------
+# Peticiones por segundo: requests.get suelto vs cliente_http
+# ---------------------------
+# Levanta un ProgArchives local y pide N páginas con la misma cantidad de
+# hilos que prog.py. Con --latencia y --handshake se simula la distancia al
+# servidor real (en localhost abrir una conexión no cuesta casi nada).
+
+
+def medir(nombre, fn, urls, hilos):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ex:
+        respuestas = list(ex.map(fn, urls))
+    dt = time.perf_counter() - inicio
+    errores = sum(1 for r in respuestas if r.status_code != 200)
+    print(f"{nombre:<22} {len(urls) / dt:8.1f} req/s   {dt:6.2f} s   errores: {errores}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=500, help="cantidad de peticiones")
+    parser.add_argument("--hilos", type=int, default=12)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por respuesta")
+    parser.add_argument("--handshake", type=float, default=0.05, help="segundos por conexión nueva")
+    parser.add_argument("--fallos", type=float, default=0.0, help="fracción de respuestas 503")
+    args = parser.parse_args()
+
+    srv = ServidorPrueba(rutas_progarchives(), latencia=args.latencia, tasa_fallos=args.fallos,
+                         latencia_conexion=args.handshake).iniciar()
+    urls = [f"{srv.url}album.asp?id={i}" for i in range(args.n)]
+
+    medir("requests.get", lambda u: requests.get(u, headers={"User-Agent": "Mozilla/5.0"}), urls, args.hilos)
+    conexiones_antes = len(srv.conexiones)
+
+    cliente = cliente_http.ClienteHTTP(max_por_host=args.hilos)
+    medir("cliente_http", cliente.get, urls, args.hilos)
+    print(f"\nConexiones abiertas: requests.get={conexiones_antes}  cliente_http={len(srv.conexiones) - conexiones_antes}")
+
+    srv.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from PIL import Image
+import qrcode
+import almacen
+import generar_qr
+import render_qr
+from servidores_prueba import ServidorPrueba, rutas_spotify, rutas_tidal
+
+# ---------------------------
+# generar_qr.procesar_albums contra Spotify/Tidal locales con cuota
+# ---------------------------
+# Los servidores responden 429 + Retry-After a lo que exceda su cuota. El
+# tiempo ideal es el del proveedor más lento: álbumes / rps de su cuota.
+# La versión anterior tardaba, sin contar las búsquedas, 5 s por álbum.
+# Con --render se mide solo la generación de QR: la función anterior contra
+# render_qr (de a uno, en el pool, re-corrida con manifiesto y SVG).
+# Con --reanudar se simula una corrida cortada a la mitad, su reanudación y
+# una tercera corrida completa, con tokens que vencen durante la corrida.
+
+
+def recortar(datos, n):
+    """Las primeras n entradas de álbum del dataset, con la misma forma anidada."""
+    salida = {}
+    for banda, info in datos.items():
+        if n <= 0:
+            break
+        albums = info.get("albums", [])[:n]
+        salida[banda] = {**info, "albums": albums}
+        n -= len(albums)
+    return salida
+
+
+def correr(datos, spotify_rps, tidal_rps, cuota_spotify, cuota_tidal, tmp=None, expira_en=3600, reanudar=True):
+    sp = ServidorPrueba(rutas_spotify(rps=cuota_spotify, expira_en=expira_en, sin_resultado=0.05)).iniciar()
+    td = ServidorPrueba(rutas_tidal(rps=cuota_tidal, expira_en=expira_en, sin_resultado=0.05)).iniciar()
+    tmp = tmp or tempfile.mkdtemp()
+    generar_qr.CACHE_BUSQUEDAS = os.path.join(tmp, "busquedas.sqlite")
+    generar_qr.SPOTIFY_AUTH_URL = sp.url + "api/token"
+    generar_qr.SPOTIFY_API_URL = sp.url + "v1/"
+    generar_qr.TIDAL_AUTH_URL = td.url + "v1/oauth2/token"
+    generar_qr.TIDAL_API_URL = td.url + "v2/"
+    generar_qr.SPOTIFY_RPS = spotify_rps
+    generar_qr.TIDAL_RPS = tidal_rps
+    generar_qr.QR_SAVE_DIR_SPOTIFY = tmp + "/spotify/"
+    generar_qr.QR_SAVE_DIR_TIDAL = tmp + "/tidal/"
+
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = generar_qr.procesar_albums(datos, reanudar=reanudar)
+    dt = time.perf_counter() - inicio
+
+    qrs = sum(bool(r["spotify_path"]) + bool(r["tidal_path"]) for r in resultado)
+    rechazadas = sp.rutas.cuota.rechazadas + td.rutas.cuota.rechazadas
+    peticiones = sp.peticiones + td.peticiones
+    tokens = len(sp.rutas.tokens.emitidos) + len(td.rutas.tokens.emitidos)
+    sp.detener()
+    td.detener()
+    return dt, qrs, rechazadas, peticiones, tokens
+
+
+def bench_reanudar(datos, n, cuota_spotify, cuota_tidal):
+    tmp = tempfile.mkdtemp()
+    expira_en = max(5, n / min(cuota_spotify, cuota_tidal) / 3)  # vence ~3 veces por corrida
+    print(f"{n} álbumes · tokens que vencen cada {expira_en:.0f}s · 5% sin resultado")
+    print(f"{'corrida':<26} {'s':>6} {'QR':>5} {'peticiones':>11} {'tokens':>7}")
+    pasadas = (("cortada a la mitad", recortar(datos, n // 2), True),
+               ("reanudada", datos, True),
+               ("de nuevo (todo en caché)", datos, True),
+               ("--refrescar", datos, False))
+    for nombre, d, reanudar in pasadas:
+        dt, qrs, _, peticiones, tokens = correr(d, cuota_spotify, cuota_tidal, cuota_spotify, cuota_tidal,
+                                                tmp=tmp, expira_en=expira_en, reanudar=reanudar)
+        print(f"{nombre:<26} {dt:6.1f} {qrs:5d} {peticiones:11d} {tokens:7d}")
+
+
+def render_antes(url, logo_path, save_path, size_px=500):
+    """generar_qr_con_logo antes de render_qr: logo desde disco y LANCZOS en cada QR."""
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=4)
+    qr.add_data(url)
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
+    qr_img = qr_img.resize((size_px, size_px), Image.LANCZOS)
+    logo = Image.open(logo_path).convert("RGBA")
+    logo_size = int(size_px * 0.25)
+    logo = logo.resize((logo_size, logo_size), Image.LANCZOS)
+    logo_bg = Image.new("RGB", logo.size, "white")
+    logo_bg.paste(logo, mask=logo.split()[3])
+    pos = ((qr_img.size[0] - logo_size) // 2, (qr_img.size[1] - logo_size) // 2)
+    qr_img.paste(logo_bg, pos)
+    qr_img.save(save_path)
+
+
+def bench_render(n, procesos):
+    tmp = tempfile.mkdtemp()
+    urls = [f"https://open.spotify.com/album/{i:022d}" for i in range(n)]
+
+    def medir(nombre, fn):
+        inicio = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - inicio
+        print(f"{nombre:<30} {dt:6.2f}s {n / dt:8.0f} QR/s")
+
+    def antes():
+        for i, url in enumerate(urls):
+            render_antes(url, generar_qr.LOGO_SPOTIFY, os.path.join(tmp, f"a{i}.png"))
+
+    def de_a_uno():
+        for i, url in enumerate(urls):
+            render_qr.renderizar(url, generar_qr.LOGO_SPOTIFY, os.path.join(tmp, f"b{i}.png"))
+
+    def motor(ext):
+        def correr():
+            with render_qr.MotorQR(procesos=procesos) as m:
+                futuros = [m.enviar(url, generar_qr.LOGO_SPOTIFY, os.path.join(tmp, f"c{i}.{ext}"))
+                           for i, url in enumerate(urls)]
+                for f in futuros:
+                    f.result()
+        return correr
+
+    print(f"{n} QR, {procesos} procesos")
+    medir("antes (de a uno)", antes)
+    medir("render_qr de a uno", de_a_uno)
+    medir("MotorQR png", motor("png"))
+    medir("MotorQR png (sin cambios)", motor("png"))
+    medir("MotorQR svg", motor("svg"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", default="progarchives_albums_full_actualizado.json")
+    parser.add_argument("-n", type=int, default=60, help="cantidad de álbumes (o de QR con --render)")
+    parser.add_argument("--cuota-spotify", type=float, default=10.0)
+    parser.add_argument("--cuota-tidal", type=float, default=6.0)
+    parser.add_argument("--render", action="store_true", help="medir solo la generación de QR")
+    parser.add_argument("--procesos", type=int, default=render_qr.MAX_PROCESOS)
+    parser.add_argument("--reanudar", action="store_true", help="medir la reanudación con la caché de búsquedas")
+    args = parser.parse_args()
+
+    if args.render:
+        bench_render(args.n, args.procesos)
+        return
+
+    datos = recortar(almacen.cargar(args.json), args.n)
+    if args.reanudar:
+        bench_reanudar(datos, args.n, args.cuota_spotify, args.cuota_tidal)
+        return
+
+    ideal = args.n / min(args.cuota_spotify, args.cuota_tidal)
+    print(f"{args.n} álbumes · ideal por cuota {ideal:.1f}s · antes ≥ {args.n * 5:.0f}s solo en sleep(5)")
+    print(f"{'cliente':<28} {'s':>6} {'x ideal':>8} {'QR':>5} {'429':>5}")
+    for nombre, factor in (("a la cuota", 1.0), ("2x por encima de la cuota", 2.0)):
+        dt, qrs, rechazadas, _, _ = correr(datos, args.cuota_spotify * factor, args.cuota_tidal * factor,
+                                     args.cuota_spotify, args.cuota_tidal)
+        print(f"{nombre:<28} {dt:6.1f} {dt / ideal:8.2f} {qrs:5d} {rechazadas:5d}")
+
+
+if __name__ == "__main__":
+    main()
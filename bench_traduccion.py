@@ -0,0 +1,63 @@
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import openai
+import almacen
+import traduccion
+import lotes_traduccion
+from servidores_prueba import ServidorPrueba, rutas_openai
+
+# ---------------------------
+# Traducción de a uno vs por lotes, contra un OpenAI local
+# ---------------------------
+# Usa los textos originales (biografías y reseñas) del dataset y una caché
+# vacía en un directorio temporal, para que ninguna corrida tenga ventaja.
+
+
+def textos_dataset(ruta):
+    textos = []
+    for info in almacen.cargar(ruta).values():
+        textos.append((info.get("biography") or {}).get("original_biography"))
+        for album in info.get("albums", []):
+            textos.extend(r.get("text") for r in album.get("collaborator_reviews") or [])
+    return [t for t in textos if t]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", default="progarchives_albums_full_actualizado.json")
+    parser.add_argument("-n", type=int, default=150, help="cantidad de textos")
+    parser.add_argument("--hilos", type=int, default=lotes_traduccion.MAX_CONCURRENCIA)
+    args = parser.parse_args()
+
+    srv = ServidorPrueba(rutas_openai()).iniciar()
+    openai.api_key = "prueba"
+    openai.base_url = srv.url + "v1/"
+    textos = textos_dataset(args.json)[:args.n]
+    tokens = sum(lotes_traduccion.estimar_tokens(t) for t in textos)
+    tmp = tempfile.mkdtemp()
+
+    # De a uno (como fetch_album_details), con la misma cantidad de hilos
+    traduccion._cache = traduccion.CacheTraducciones(os.path.join(tmp, "uno.sqlite"))
+    antes = srv.peticiones
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.hilos) as ex:
+        list(ex.map(traduccion.traducir, textos))
+    dt = time.perf_counter() - inicio
+    print(f"de a uno   {len(textos) / dt:7.1f} textos/s  {tokens / dt:8.0f} tokens/s  {srv.peticiones - antes} peticiones")
+
+    # Por lotes
+    traduccion._cache = traduccion.CacheTraducciones(os.path.join(tmp, "lotes.sqlite"))
+    antes = srv.peticiones
+    stats = lotes_traduccion.Estadisticas()
+    lotes_traduccion.traducir_textos(textos, max_concurrencia=args.hilos, stats=stats)
+    dt = stats.segundos
+    print(f"por lotes  {len(textos) / dt:7.1f} textos/s  {tokens / dt:8.0f} tokens/s  {srv.peticiones - antes} peticiones")
+
+    srv.detener()
+
+
+if __name__ == "__main__":
+    main()
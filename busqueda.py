@@ -0,0 +1,498 @@
+import os
+import re
+import sys
+import json
+import math
+import mmap
+import time
+import array
+import bisect
+import struct
+import hashlib
+import marshal
+import argparse
+import unicodedata
+from collections import namedtuple, defaultdict
+import almacen
+
+# Configuración
+ENTRADA = "progarchives_albums_full_actualizado.json"
+INDICE = "busqueda.idx"
+SUFIJO_DELTA = ".delta.jsonl"
+MAGIA = b"PABUSQ01"
+K1, B = 1.2, 0.75            # parámetros de BM25
+COMPACTAR_DESDE = 0.1        # con más de un 10% de documentos en el delta se rearma el índice
+CONTEXTO = 60                # caracteres a cada lado del fragmento que se muestra
+
+# ---------------------------
+# Búsqueda de texto completo
+# ---------------------------
+# Un documento por campo de texto: biografía original y traducida de cada banda,
+# texto y traducción de cada reseña, tracklist y lineup de cada álbum. Los
+# textos se pliegan (sin mayúsculas ni acentos, "ñ" -> "n", sin apóstrofos
+# dentro de palabra: "don't" -> "dont") y se parten en palabras, así la misma
+# consulta encuentra textos en inglés y en castellano. Se guardan las posiciones
+# para las frases entre comillas y el orden es BM25.
+#
+# El índice es un solo archivo que se lee con mmap (no se carga entero):
+#   MAGIA | cabecera | documentos (marshal) | largos | tabla de términos | términos | postings
+# Los términos están ordenados y se buscan por bisección. Los postings de cada
+# término son tres tramos de enteros: los docs, el tf de cada uno y después las
+# posiciones de todos, en el mismo orden; así docs y tf salen con un slice, sin
+# recorrer posiciones. Son uint16 si todo entra (con este dataset siempre: el
+# texto más largo tiene ~5.000 palabras).
+#
+# Como almacen.py, los cambios no reescriben el archivo: los documentos nuevos
+# o cambiados (y los borrados) se anexan a <índice>.delta.jsonl, que al abrir se
+# indexa en memoria y tapa a los del archivo. Cuando el delta crece, se rearma.
+
+Documento = namedtuple("Documento", "banda album resena campo")  # album: id de ProgArchives; resena: n° o None
+# frase: (posición de la primera palabra, n° de palabras) donde aparece la primera frase de la consulta
+Resultado = namedtuple("Resultado", "documento puntaje frase", defaults=(None,))
+
+_CABECERA = struct.Struct("<qqqqIIII")  # firma del dataset (4), largo de documentos, n° de docs, de términos, bytes por entero
+SIN_DESCOMPOSICION = str.maketrans({"ø": "o", "æ": "ae", "œ": "oe", "ð": "d", "þ": "th", "ł": "l", "đ": "d"})
+APOSTROFO = re.compile(r"(?<=\w)['’](?=\w)")
+COMBINANTES = re.compile(r"[\u0300-\u036f]")
+PALABRA = re.compile(r"[^\W_]+")
+BLOQUE = re.compile(r"\S+")  # plegar() no junta ni parte palabras a través de un espacio
+CONSULTA = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def plegar(texto):
+    texto = APOSTROFO.sub("", texto.casefold())
+    return COMBINANTES.sub("", unicodedata.normalize("NFKD", texto)).translate(SIN_DESCOMPOSICION)
+
+
+def palabras(texto):
+    return PALABRA.findall(plegar(texto))
+
+
+def documentos(datos):
+    """(Documento, texto) de cada campo con texto del dataset."""
+    for banda, info in datos.items():
+        bio = info.get("biography") or {}
+        for campo in ("original_biography", "translated_biography"):
+            if bio.get(campo):
+                yield Documento(banda, None, None, campo), bio[campo]
+        for album in info.get("albums", []):
+            id_album = almacen.id_progarchives(album.get("album_url")) or album.get("title")
+            for campo in ("tracklist", "lineup"):
+                if album.get(campo):
+                    yield Documento(banda, id_album, None, campo), album[campo]
+            for n, resena in enumerate(album.get("collaborator_reviews") or []):
+                for campo in ("text", "translated_text"):
+                    if resena.get(campo):
+                        yield Documento(banda, id_album, n, campo), resena[campo]
+
+
+def texto_de(datos, doc):
+    """El texto de un documento en el dataset (dicts o modelo), o None si ya no está."""
+    info = datos.get(doc.banda)
+    if info is None:
+        return None
+    if doc.album is None:
+        return (info.get("biography") or {}).get(doc.campo)
+    for album in info.get("albums", []):
+        if (almacen.id_progarchives(album.get("album_url")) or album.get("title")) == doc.album:
+            if doc.resena is None:
+                return album.get(doc.campo)
+            resenas = album.get("collaborator_reviews") or []
+            return resenas[doc.resena].get(doc.campo) if doc.resena < len(resenas) else None
+    return None
+
+
+def _huella(texto):
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=8).digest()
+
+
+def _firma(ruta_json):
+    diario = ruta_json + almacen.SUFIJO_DIARIO
+    st = os.stat(ruta_json)
+    sd = os.stat(diario) if os.path.exists(diario) else None
+    return st.st_size, st.st_mtime_ns, sd.st_size if sd else -1, sd.st_mtime_ns if sd else -1
+
+
+def _postings(docs_palabras):
+    """término -> [(n° de doc, posiciones)] a partir de [(n° de doc, palabras)]."""
+    por_termino = defaultdict(list)
+    for n, lista in docs_palabras:
+        posiciones = defaultdict(list)
+        for i, p in enumerate(lista):
+            posiciones[p].append(i)
+        for termino, pos in posiciones.items():
+            por_termino[termino].append((n, pos))
+    return por_termino
+
+
+# ---------------------------
+# Armado del archivo
+# ---------------------------
+def _alinear(f):
+    resto = f.tell() % 4
+    if resto:
+        f.write(b"\0" * (4 - resto))
+
+
+def construir(datos, ruta=INDICE, firma=(-1, -1, -1, -1)):
+    """Arma el índice completo de `datos` en `ruta` (y vacía su delta)."""
+    docs, largos, docs_palabras = [], array.array("I"), []
+    for n, (doc, texto) in enumerate(documentos(datos)):
+        lista = palabras(texto)
+        docs.append((tuple(doc), _huella(texto)))
+        largos.append(len(lista))
+        docs_palabras.append((n, lista))
+    por_termino = _postings(docs_palabras)
+
+    terminos = sorted(por_termino)
+    corto = max(len(docs), max(largos, default=0)) < 1 << 16
+    inicio_termino, inicio_posting, df = array.array("I", [0]), array.array("I", [0]), array.array("I")
+    blob, postings = bytearray(), array.array("H" if corto else "I")
+    for termino in terminos:
+        blob += termino.encode("utf-8")
+        inicio_termino.append(len(blob))
+        lista = por_termino[termino]
+        df.append(len(lista))
+        postings.extend(n for n, _ in lista)
+        postings.extend(len(pos) for _, pos in lista)
+        for _, pos in lista:
+            postings.extend(pos)
+        inicio_posting.append(len(postings))
+
+    meta = marshal.dumps(docs)
+    tmp = ruta + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIA)
+        f.write(_CABECERA.pack(*firma, len(meta), len(docs), len(terminos), postings.itemsize))
+        f.write(meta)
+        _alinear(f)
+        for tabla in (largos, inicio_termino, inicio_posting, df):
+            f.write(tabla.tobytes())
+        f.write(blob)
+        _alinear(f)
+        f.write(postings.tobytes())
+    os.replace(tmp, ruta)
+    if os.path.exists(ruta + SUFIJO_DELTA):
+        os.remove(ruta + SUFIJO_DELTA)
+
+
+# ---------------------------
+# Consultas
+# ---------------------------
+class IndiceBusqueda:
+    def __init__(self, ruta=INDICE):
+        self.ruta = ruta
+        with open(ruta, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIA)] != MAGIA:
+            raise ValueError(f"{ruta} no es un índice de búsqueda")
+        *firma, largo_meta, n_docs, n_terminos, bytes_entero = _CABECERA.unpack_from(self._mm, len(MAGIA))
+        self.firma = tuple(firma)
+        pos = len(MAGIA) + _CABECERA.size
+        self._docs = marshal.loads(self._mm[pos:pos + largo_meta])
+        pos += largo_meta
+        pos += -pos % 4
+
+        vista = memoryview(self._mm)
+        def tabla(n):
+            nonlocal pos
+            t = vista[pos:pos + 4 * n].cast("I")
+            pos += 4 * n
+            return t
+        self._largos = tabla(n_docs)
+        self._inicio_termino = tabla(n_terminos + 1)
+        self._inicio_posting = tabla(n_terminos + 1)
+        self._df = tabla(n_terminos)
+        self._blob = pos
+        pos += self._inicio_termino[n_terminos]
+        pos += -pos % 4
+        self._postings = vista[pos:].cast("H" if bytes_entero == 2 else "I")
+        self._n_terminos = n_terminos
+        self._terminos = _Terminos(self)
+        self._cargar_delta()
+
+    def _termino(self, k):
+        return self._mm[self._blob + self._inicio_termino[k]:self._blob + self._inicio_termino[k + 1]].decode("utf-8")
+
+    def _cargar_delta(self):
+        """Documentos del delta (indexados en memoria) y los del archivo que quedan tapados."""
+        self._n_archivo = len(self._docs)
+        self._por_clave = {doc: n for n, (doc, _) in enumerate(self._docs)}
+        self._muertos = set()
+        self._delta = {}  # clave -> (huella, texto) o None si se borró
+        ruta_delta = self.ruta + SUFIJO_DELTA
+        if os.path.exists(ruta_delta):
+            with open(ruta_delta, "r", encoding="utf-8") as f:
+                for linea in f:
+                    if not linea.endswith("\n"):
+                        break  # escritura cortada
+                    entrada = json.loads(linea)
+                    clave = tuple(entrada["doc"])
+                    self._delta[clave] = None if entrada.get("borrado") else (bytes.fromhex(entrada["huella"]), entrada["texto"])
+        docs_delta, docs_palabras = [], []
+        for clave, valor in self._delta.items():
+            if clave in self._por_clave:
+                self._muertos.add(self._por_clave[clave])
+            if valor is not None:
+                n = self._n_archivo + len(docs_delta)
+                lista = palabras(valor[1])
+                docs_delta.append((clave, valor[0], len(lista)))
+                docs_palabras.append((n, lista))
+        self._docs_delta = docs_delta
+        self._postings_delta = _postings(docs_palabras)
+        vivos = [self._largos[n] for n in range(self._n_archivo) if n not in self._muertos]
+        self.n_docs = len(vivos) + len(docs_delta)
+        self.largo_medio = (sum(vivos) + sum(d[2] for d in docs_delta)) / max(self.n_docs, 1)
+        # Parte de BM25 que solo depende del largo de cada doc
+        largos = self._largos.tolist() + [d[2] for d in docs_delta]
+        self._normas = [K1 * (1 - B + B * largo / self.largo_medio) for largo in largos]
+
+    def documento(self, n):
+        clave = self._docs[n][0] if n < self._n_archivo else self._docs_delta[n - self._n_archivo][0]
+        return Documento(*clave)
+
+    def _buscar_termino(self, termino):
+        k = bisect.bisect_left(self._terminos, termino)
+        return k if k < self._n_terminos and self._termino(k) == termino else None
+
+    def postings(self, termino, con_posiciones=False, solo=None):
+        """{n° de doc: tf} o {n° de doc: posiciones} de un término plegado (de los docs en `solo`, si se da)."""
+        salida = {}
+        k = self._buscar_termino(termino)
+        if k is not None:
+            p = self._postings
+            i, df = self._inicio_posting[k], self._df[k]
+            docs, tfs = p[i:i + df].tolist(), p[i + df:i + 2 * df].tolist()
+            if con_posiciones:
+                inicio = i + 2 * df
+                for n, tf in zip(docs, tfs):
+                    if solo is None or n in solo:
+                        salida[n] = p[inicio:inicio + tf].tolist()
+                    inicio += tf
+            else:
+                salida = dict(zip(docs, tfs))
+            for n in self._muertos.intersection(salida):
+                del salida[n]
+            if solo is not None and not con_posiciones:
+                salida = {n: tf for n, tf in salida.items() if n in solo}
+        for n, pos in self._postings_delta.get(termino, ()):
+            if solo is None or n in solo:
+                salida[n] = pos if con_posiciones else len(pos)
+        return salida
+
+    def _contiene_frase(self, frase, candidatos):
+        """{candidato: posición de la primera aparición} de los que tienen las palabras de `frase` seguidas."""
+        posiciones = [self.postings(t, con_posiciones=True, solo=candidatos) for t in frase]
+        salida = {}
+        for n in candidatos:
+            if all(n in p for p in posiciones):
+                inicios = set(posiciones[0][n])
+                for desplazamiento, p in enumerate(posiciones[1:], 1):
+                    inicios &= {x - desplazamiento for x in p[n]}
+                if inicios:
+                    salida[n] = min(inicios)
+        return salida
+
+    def buscar(self, consulta, limite=10, campos=None):
+        """
+        Términos sueltos (se ordenan por BM25) y frases entre comillas (tienen que
+        aparecer tal cual). `campos` limita a algunos campos (p. ej. {"lineup"}).
+        """
+        frases, sueltos = [], []
+        for frase, palabra in CONSULTA.findall(consulta):
+            lista = palabras(frase or palabra)
+            if len(lista) > 1 or (frase and lista):
+                frases.append(lista)
+            elif lista:
+                sueltos.append(lista[0])
+
+        terminos = sueltos + [t for f in frases for t in f]
+        if not terminos:
+            return []
+        tfs = {t: self.postings(t) for t in set(terminos)}
+        en_frase = {}
+        if frases:
+            candidatos = set.intersection(*(set.intersection(*(set(tfs[t]) for t in f)) for f in frases))
+            for frase in reversed(frases):  # la primera frase queda para el fragmento
+                inicios = self._contiene_frase(frase, candidatos)
+                candidatos = set(inicios)
+                en_frase = {n: (inicios[n], len(frase)) for n in candidatos}
+        else:
+            candidatos = set().union(*(tfs[t].keys() for t in sueltos))
+
+        puntajes = defaultdict(float)
+        normas = self._normas
+        for termino in set(terminos):
+            docs = tfs[termino]
+            idf = math.log(1 + (self.n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for n, tf in docs.items():
+                if n in candidatos:
+                    puntajes[n] += idf * tf * (K1 + 1) / (tf + normas[n])
+        resultados = [Resultado(self.documento(n), p, en_frase.get(n)) for n, p in puntajes.items()]
+        if campos:
+            resultados = [r for r in resultados if r.documento.campo in campos]
+        resultados.sort(key=lambda r: -r.puntaje)
+        return resultados[:limite] if limite else resultados
+
+    # ---------------------------
+    # Actualización incremental
+    # ---------------------------
+    def huellas(self):
+        """Documento -> huella de lo que hoy está indexado (archivo + delta)."""
+        salida = {doc: h for n, (doc, h) in enumerate(self._docs) if n not in self._muertos}
+        salida.update((clave, h) for clave, h, _ in self._docs_delta)
+        return salida
+
+    def cerrar(self):
+        self._postings.release()
+        self._largos.release()
+        self._inicio_termino.release()
+        self._inicio_posting.release()
+        self._df.release()
+        self._mm.close()
+
+
+class _Terminos:
+    """Vista de la tabla de términos como secuencia ordenada, para bisect."""
+
+    def __init__(self, indice):
+        self._indice = indice
+
+    def __len__(self):
+        return self._indice._n_terminos
+
+    def __getitem__(self, k):
+        return self._indice._termino(k)
+
+
+def actualizar(datos, ruta=INDICE, firma=(-1, -1, -1, -1)):
+    """
+    Lleva el índice al estado de `datos`: anexa al delta solo los documentos
+    nuevos, cambiados o borrados, o rearma todo si el delta ya es grande.
+    Devuelve (nuevos o cambiados, borrados, si se rearmó).
+    """
+    if not os.path.exists(ruta):
+        construir(datos, ruta, firma)
+        return 0, 0, True
+    indice = IndiceBusqueda(ruta)
+    actuales = indice.huellas()
+    en_delta = len(indice._delta)
+    n_archivo = indice._n_archivo
+    indice.cerrar()
+
+    cambios = []
+    vistos = set()
+    for doc, texto in documentos(datos):
+        clave = tuple(doc)
+        vistos.add(clave)
+        h = _huella(texto)
+        if actuales.get(clave) != h:
+            cambios.append({"doc": clave, "huella": h.hex(), "texto": texto})
+    borrados = [{"doc": clave, "borrado": True} for clave in actuales if clave not in vistos]
+
+    if en_delta + len(cambios) + len(borrados) > COMPACTAR_DESDE * max(n_archivo, 1):
+        construir(datos, ruta, firma)
+        return len(cambios), len(borrados), True
+    with open(ruta + SUFIJO_DELTA, "a", encoding="utf-8") as f:
+        for entrada in cambios + borrados:
+            f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+    # La firma del dataset va en la cabecera: se reescriben solo esos bytes
+    with open(ruta, "r+b") as f:
+        f.seek(len(MAGIA))
+        f.write(struct.pack("<qqqq", *firma))
+    return len(cambios), len(borrados), False
+
+
+def abrir(ruta_json=ENTRADA, ruta=INDICE):
+    """El índice de `ruta_json`, puesto al día si el dataset cambió desde la última vez."""
+    firma = _firma(ruta_json)
+    if os.path.exists(ruta):
+        indice = IndiceBusqueda(ruta)
+        if indice.firma == firma:
+            return indice
+        indice.cerrar()
+    actualizar(almacen.cargar(ruta_json), ruta, firma)
+    return IndiceBusqueda(ruta)
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def _tramo(texto, inicio, largo):
+    """(desde, hasta) en caracteres de `texto` de las palabras inicio .. inicio + largo - 1 de palabras(texto)."""
+    vistas, desde = 0, None
+    for m in BLOQUE.finditer(texto):
+        vistas += len(palabras(m.group()))
+        if desde is None and vistas > inicio:
+            desde = m.start()
+        if vistas >= inicio + largo:
+            return desde, m.end()
+    return None
+
+
+def fragmento(texto, consulta, frase=None):
+    """
+    Un pedazo de `texto` alrededor de la frase encontrada (`frase` de un
+    Resultado) o, si no hay, de la primera palabra de la consulta.
+    """
+    tramo = _tramo(texto, *frase) if frase else None
+    if tramo is None:
+        buscadas = set(palabras(consulta))
+        tramo = next((m.span() for m in PALABRA.finditer(texto) if plegar(m.group()) in buscadas), None)
+    if tramo is None:
+        return " ".join(texto[:2 * CONTEXTO].split()) + "…"
+    inicio, fin = max(0, tramo[0] - CONTEXTO), min(len(texto), tramo[1] + CONTEXTO)
+    return ("…" if inicio else "") + " ".join(texto[inicio:fin].split()) + ("…" if fin < len(texto) else "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Búsqueda en biografías, reseñas, tracklists y lineups")
+    parser.add_argument("consulta", nargs="?", help='palabras sueltas y/o "frases entre comillas"')
+    parser.add_argument("--json", default=ENTRADA)
+    parser.add_argument("--indice", default=INDICE)
+    parser.add_argument("-n", "--limite", type=int, default=10)
+    parser.add_argument("--campo", action="append",
+                        choices=["original_biography", "translated_biography", "text", "translated_text",
+                                 "tracklist", "lineup"], help="buscar solo en estos campos (se puede repetir)")
+    parser.add_argument("--reconstruir", action="store_true", help="rearmar el índice desde cero")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.json):
+        print(f"❌ No existe {args.json}")
+        return 1
+    inicio = time.perf_counter()
+    if args.reconstruir:
+        construir(almacen.cargar(args.json), args.indice, _firma(args.json))
+    indice = abrir(args.json, args.indice)
+    print(f"🔎 {indice.n_docs} documentos, {len(indice._terminos)} términos "
+          f"({os.path.getsize(args.indice) / 1024:.0f} KB) en {(time.perf_counter() - inicio) * 1000:.0f} ms",
+          file=sys.stderr)
+    if not args.consulta:
+        return 0
+
+    inicio = time.perf_counter()
+    resultados = indice.buscar(args.consulta, args.limite, set(args.campo) if args.campo else None)
+    duracion = time.perf_counter() - inicio
+
+    import modelo  # los textos se leen solo para los resultados que se muestran
+    datos = modelo.cargar(args.json)
+    for r in resultados:
+        doc = r.documento
+        donde = doc.banda
+        if doc.album is not None:
+            album = next((a for a in datos[doc.banda].get("albums", [])
+                          if (almacen.id_progarchives(a.get("album_url")) or a.get("title")) == doc.album), None)
+            donde += f" - {album.get('title') if album else doc.album}"
+        if doc.resena is not None:
+            donde += f" (reseña {doc.resena + 1})"
+        print(f"{r.puntaje:6.2f}  {donde} [{doc.campo}]")
+        texto = texto_de(datos, doc)
+        if texto:
+            print(f"        {fragmento(texto, args.consulta, r.frase)}")
+    print(f"\n{len(resultados)} resultados en {duracion * 1e6:.0f} µs", file=sys.stderr)
+    indice.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
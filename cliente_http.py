@@ -0,0 +1,134 @@
+import time
+import random
+import threading
+import logging
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+import metricas
+
+# ---------------------------
+# Cliente HTTP compartido por los scrapers
+# ---------------------------
+# Una sola Session: keep-alive y pool de conexiones por host (un handshake TLS
+# por conexión y no por página), timeout por defecto, reintentos acotados con
+# backoff con jitter ante 429/5xx y un tope de peticiones simultáneas por host.
+# Cada petición deja en metricas.py su latencia, los bytes recibidos (tal como
+# viajaron, comprimidos), los reintentos y el estado, por etapa y host.
+
+TIMEOUT = (5, 20)          # (conexión, lectura) en segundos
+REINTENTOS = 4
+BACKOFF = 0.5              # 0.5s, 1s, 2s, 4s... (antes del jitter)
+MAX_POR_HOST = 8           # peticiones en vuelo por host
+POOL_POR_HOST = 16         # conexiones guardadas por host
+ESTADOS_REINTENTO = (429, 500, 502, 503, 504)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    # gzip/deflate siempre; br solo si está instalado brotli/brotlicffi
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+
+class _RetryConJitter(Retry):
+    # "Full jitter": un valor al azar entre 0 y el backoff exponencial, para que
+    # los hilos que fallan juntos no vuelvan a golpear el servidor juntos
+    def get_backoff_time(self):
+        base = super().get_backoff_time()
+        return random.uniform(0, base) if base else 0
+
+
+class ClienteHTTP:
+    def __init__(self, max_por_host=MAX_POR_HOST, reintentos=REINTENTOS, timeout=TIMEOUT, headers=None,
+                 estados_reintento=ESTADOS_REINTENTO, etapa=None):
+        # estados_reintento=() deja los 429/5xx al llamador (p. ej. un planificador con su propio backoff)
+        self.timeout = timeout
+        self.etapa = etapa  # etiqueta de las métricas; None = la etapa del proceso
+        self.max_por_host = max_por_host
+        self.estados_reintento = estados_reintento
+        self.peticiones = 0
+        self._semaforos = {}
+        self._lock = threading.Lock()
+
+        retry = _RetryConJitter(
+            total=reintentos,
+            backoff_factor=BACKOFF,
+            status_forcelist=estados_reintento,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=POOL_POR_HOST, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(HEADERS)
+        if headers:
+            self.session.headers.update(headers)
+
+    def _semaforo(self, host):
+        with self._lock:
+            sem = self._semaforos.get(host)
+            if sem is None:
+                sem = self._semaforos[host] = threading.BoundedSemaphore(self.max_por_host)
+            return sem
+
+    def _etiquetas(self, host):
+        return {"host": host} if self.etapa is None else {"host": host, "etapa": self.etapa}
+
+    def request(self, metodo, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = urllib.parse.urlsplit(url).netloc
+        etiquetas = self._etiquetas(host)
+        with self._semaforo(host):
+            with self._lock:
+                self.peticiones += 1
+            inicio = time.perf_counter()
+            try:
+                res = self.session.request(metodo, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                metricas.observar("http_segundos", time.perf_counter() - inicio, **etiquetas)
+                metricas.contar("http_errores", error=type(e).__name__, **etiquetas)
+                raise
+            metricas.observar("http_segundos", time.perf_counter() - inicio, **etiquetas)
+        metricas.contar("http_respuestas", estado=res.status_code, **etiquetas)
+        reintentos = getattr(res.raw, "retries", None)
+        if reintentos is not None and reintentos.history:
+            metricas.contar("http_reintentos", len(reintentos.history), **etiquetas)
+        if not kwargs.get("stream"):
+            metricas.contar("http_bytes", res.raw.tell(), **etiquetas)
+        if res.status_code in self.estados_reintento:
+            logging.warning(f"HTTP {res.status_code} tras reintentos: {url}")
+        return res
+
+    def contar_bytes(self, res):
+        """Con stream=True los bytes se cuentan recién cuando se terminó de leer el cuerpo."""
+        metricas.contar("http_bytes", res.raw.tell(), **self._etiquetas(urllib.parse.urlsplit(res.url).netloc))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def cerrar(self):
+        self.session.close()
+
+
+# Cliente por defecto del proceso
+cliente = ClienteHTTP()
+
+
+def get(url, **kwargs):
+    return cliente.get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return cliente.post(url, **kwargs)
+
+
+def contar_bytes(res):
+    cliente.contar_bytes(res)
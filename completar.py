@@ -1,11 +1,14 @@
-import json
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import cliente_http
+import extractor
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
-import time
 import os
 import openai
+import traduccion
+import lotes_traduccion
+import almacen
+import metricas
 
 # Configuración
 INPUT_JSON = "progarchives_albums_full.json"
@@ -25,55 +28,36 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S"
 )
 
+def traducir_varios(textos):
+    if not GPT_TRANSLATE:
+        return list(textos)
+    # Pipeline compartido con prog.py: caché en disco, lotes y troceo de textos largos
+    return lotes_traduccion.traducir_textos(textos)
+
 def traducir(texto):
     if not GPT_TRANSLATE or not texto:
         return texto
-    try:
-        logging.debug("→ Traduciendo con GPT...")
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "user", "content": f"Traduce al español el siguiente texto manteniendo el estilo original:\n\n{texto}"}
-            ],
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logging.error(f"Error al traducir: {e}")
-        return texto
+    return traducir_varios([texto])[0]
 
-def extraer_info_banda(band_name, band_url, current_bio=None):
+def extraer_info_banda(band_name, band_url, current_bio=None, traducir_ahora=True):
     try:
-        logging.info(f"🌐 Extrayendo info: {band_name}")
-        res = requests.get(band_url, headers=HEADERS)
+        logging.debug("🌐 Extrayendo info: %s", band_name)
+        res = cliente_http.get(band_url, headers=HEADERS)
         res.encoding = "utf-8"
-        soup = BeautifulSoup(res.text, "html.parser")
-
-        # País
-        h2 = soup.find("h2")
-        country = None
-        if h2 and "•" in h2.text:
-            country = h2.text.split("•")[-1].strip()
-
-        # Imagen principal
-        img_tag = soup.select_one("#artist-box img")
-        photo_url = img_tag["src"] if img_tag else None
+        # País, imagen principal y biografía (span#moreBio o #artist-biography)
+        artista = extractor.extraer_artista(res.text)
+        country = artista["country"]
+        photo_url = artista["photo_url"]
 
         # Biografía (solo si no existe)
         bio_text = ""
         translated_bio = ""
 
         if not current_bio or not current_bio.get("original_biography"):
-            more_bio = soup.select_one("span#moreBio")
-            if more_bio:
-                for a in more_bio.find_all("a"): a.unwrap()
-                bio_text = more_bio.get_text(separator="\n", strip=True)
-            else:
-                alt_bio = soup.select_one("#artist-biography")
-                if alt_bio:
-                    bio_text = alt_bio.get_text(separator="\n", strip=True)
+            bio_text = artista["biography"]
 
-            translated_bio = traducir(bio_text) if bio_text else ""
+            if traducir_ahora:
+                translated_bio = traducir(bio_text) if bio_text else ""
 
         return {
             "country": country,
@@ -86,25 +70,42 @@ def extraer_info_banda(band_name, band_url, current_bio=None):
         logging.error(f"❌ Error procesando {band_name}: {e}")
         return current_bio or {}
 
-def guardar_json(data):
-    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    logging.info("✅ Archivo guardado: %s", OUTPUT_JSON)
-
 def procesar_banda(nombre, datos):
     url = datos.get("band_url")
     bio_actual = datos.get("biography", {})
-    nueva_info = extraer_info_banda(nombre, url, bio_actual)
+    # La traducción se hace después, en lotes, para todas las bandas juntas
+    nueva_info = extraer_info_banda(nombre, url, bio_actual, traducir_ahora=False)
     datos["biography"] = nueva_info
     return nombre, datos
 
-if __name__ == "__main__":
+def traducir_biografias_pendientes(bandas, salida):
+    pendientes = [
+        (nombre, datos) for nombre, datos in bandas.items()
+        if datos.get("biography", {}).get("original_biography")
+        and not datos["biography"].get("translated_biography")
+    ]
+    if not pendientes:
+        return
+    logging.info(f"🈯 Traduciendo {len(pendientes)} biografías en lotes")
+    traducidas = traducir_varios([d["biography"]["original_biography"] for _, d in pendientes])
+    for (nombre, datos), traducida in zip(pendientes, traducidas):
+        datos["biography"]["translated_biography"] = traducida
+        salida.guardar_banda(nombre, datos)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Completa país, foto y biografía de cada banda")
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+    metricas.iniciar("enriquecimiento", args)
+
     if not os.path.exists(INPUT_JSON):
         logging.error(f"No se encuentra el archivo {INPUT_JSON}")
-        exit(1)
+        return 1
 
-    with open(INPUT_JSON, encoding="utf-8") as f:
-        bandas = json.load(f)
+    bandas = almacen.cargar(INPUT_JSON)
+    # La salida parte del JSON de entrada; si una corrida anterior se cortó,
+    # su diario se reaplica encima y no se pierde lo ya completado
+    salida = almacen.Almacen(OUTPUT_JSON, base=bandas)
 
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         futures = {executor.submit(procesar_banda, nombre, datos): nombre for nombre, datos in bandas.items()}
@@ -113,9 +114,19 @@ if __name__ == "__main__":
             nombre = futures[future]
             try:
                 nombre_banda, nuevos_datos = future.result()
-                bandas[nombre_banda] = nuevos_datos
-                guardar_json(bandas)  # Guardar tras cada banda
+                salida.guardar_banda(nombre_banda, nuevos_datos)  # Guardar tras cada banda
             except Exception as e:
                 logging.error(f"❌ Error procesando banda {nombre}: {e}")
 
+    if GPT_TRANSLATE:
+        traducir_biografias_pendientes(salida.datos, salida)
+
+    salida.cerrar()
+    logging.info("✅ Archivo guardado: %s", OUTPUT_JSON)
+    if GPT_TRANSLATE:
+        logging.info(traduccion.cache().resumen())
     logging.info("🎉 Proceso finalizado.")
+    metricas.finalizar()
+
+if __name__ == "__main__":
+    exit(main())
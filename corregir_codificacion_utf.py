@@ -1,48 +1,325 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from collections import Counter, defaultdict
+
+# Configuración
 input_path = "progarchives_albums_full_actualizado.json"
 output_path = "progarchives_albums_full_actualizado_utf.json"
-import json
+SUFIJO = "_utf"  # con varias entradas (parte*.json) cada salida lleva este sufijo
+MAX_SIN_ARREGLO = 15  # palabras con "�" sin resolver que se muestran en el informe
 
-import re
+# ---------------------------
+# Reparación de cadenas
+# ---------------------------
+# Se lee el JSON línea por línea (una cadena JSON nunca cruza un salto de línea)
+# y solo se decodifica, corrige y vuelve a codificar la cadena que tiene algo roto;
+# todo lo demás se copia tal cual a la salida.
+#
+# 1. UTF-8 leído como cp1252/latin-1 ("Ã©", "Ã±", "â€™", "Â "): una sola regex con
+#    todas las secuencias posibles y un diccionario secuencia -> carácter.
+# 2. "�" (el byte latin-1 se perdió al decodificar como UTF-8, p. ej. "�brete Gandul"):
+#    la palabra se busca en un vocabulario aprendido de las palabras sanas del propio
+#    archivo ("Capit�n" -> "Capitán" porque "Capitán" aparece en otro campo), con
+#    DICCIONARIO como respaldo. Cada "�" reemplaza exactamente una letra no ASCII.
+
+CADENA = re.compile(r'"(?:[^"\\]|\\.)*"')
+CLAVE = re.compile(r'\s*:')
+CLAVE_INICIAL = re.compile(r'\s*("(?:[^"\\]|\\.)*")\s*:')  # JSON con indentación: una clave por línea
+PALABRA = re.compile(r"(?:[^\W\d_]|�)+")
+NO_ASCII = re.compile(r"[^\x00-\x7f]")
+CONTRACCION = re.compile(r"[A-Za-z]+�(?:s|t|d|ll|re|ve|m)", re.I)  # "Don�t", "GABRIEL�s"
+INICIO_FRASE = re.compile(r"(?:(?:^|\n)\s*(?:\d+\.?\s*)?|[.!?:\"(\-]\s*)$")
+CONTEXTO = 12  # caracteres antes de la palabra que se miran para INICIO_FRASE
+
+# Palabras que no siempre aparecen sanas en el dataset
+DICCIONARIO = """
+ábrete último última música canción corazón mañana señor señorita también así más
+después través época días sueño niño pájaro camión aquí allá acción nº
+não são coração ação ascensão canção então
+città perché più così già però
+château montréal naïve naïveté naiveté purée répertoire clichéd résumé protégé
+exposé condensé lumière premières première été épisode présage rêve mémoire
+düsseldorf düsseldorfian über für schön grün köln
+därför år på för över även också
+""".split()
+
+
+def _tabla_mojibake():
+    """Secuencia mojibake -> carácter, para latin-1 extendido y la puntuación de cp1252."""
+    caracteres = [chr(c) for c in range(0xA0, 0x180)] + list("‘’‚“”„†‡•…‰‹›€™–—")
+    tabla = {}
+    for c in caracteres:
+        # Cada byte se lee con cp1252 y, si no está definido ahí, con latin-1
+        malo = "".join(bytes([b]).decode("cp1252", errors="ignore") or chr(b) for b in c.encode("utf-8"))
+        tabla[malo] = c
+        tabla[c.encode("utf-8").decode("latin-1")] = c
+    return tabla
+
+
+TABLA_MOJIBAKE = _tabla_mojibake()
+MOJIBAKE = re.compile("|".join(map(re.escape, sorted(TABLA_MOJIBAKE, key=len, reverse=True))))
+SOSPECHOSO = re.compile("[�" + re.escape("".join(sorted({k[0] for k in TABLA_MOJIBAKE}))) + "]")
+
+
+def _clave(palabra):
+    return NO_ASCII.sub("�", palabra)
+
+
+class Vocabulario:
+    """Palabras sanas con letras no ASCII tal como se vieron, agrupadas por su forma en minúsculas con "�"."""
+
+    def __init__(self):
+        self._formas = defaultdict(Counter)
+
+    def aprender(self, texto, peso=1):
+        # split() es mucho más rápido que una regex sobre todo el texto: solo se
+        # miran de cerca los trozos con algún carácter no ASCII
+        for trozo in texto.split():
+            if trozo.isascii() or "�" in trozo:
+                continue
+            for palabra in PALABRA.findall(trozo):
+                if not palabra.isascii():
+                    self._formas[_clave(palabra.lower())][palabra] += peso
+
+    def _candidatos(self, rota):
+        """Formas que encajan con la palabra rota: (veces por forma en minúsculas, formas vistas de cada una)."""
+        minuscula = rota.lower()
+        veces = Counter()
+        vistas = defaultdict(Counter)
+        for forma, n in self._formas.get(_clave(minuscula), Counter()).items():
+            if all(a == b or a == "�" for a, b in zip(minuscula, forma.lower())):
+                veces[forma.lower()] += n
+                vistas[forma.lower()][forma] += n
+        return veces, vistas
+
+    def resolver(self, rota, inicio_frase=False):
+        if not rota.strip("�"):
+            return None  # un "�" suelto no dice qué letra era
+        veces, vistas = self._candidatos(rota)
+        if not veces:
+            return None
+        ranking = veces.most_common(2)
+        # Con el "�" al principio se adivina la letra inicial: solo si una opción gana claramente
+        if rota[0] == "�" and len(ranking) > 1 and ranking[0][1] < max(2 * ranking[1][1], 1):
+            return None
+        # La forma más vista decide las letras perdidas; las que llegaron sanas no se tocan
+        opcion = vistas[ranking[0][0]].most_common(1)[0][0]
+        letras = rota.replace("�", "")
+        if letras and letras.isupper() and len(letras) > 1:
+            return opcion.upper()
+        # Dentro de la palabra la letra va en minúscula, como las que la rodean; la
+        # inicial conserva la mayúscula de la forma vista ("Änglagård") o la toma del contexto
+        salida = [b.lower() if a == "�" else a for a, b in zip(rota, opcion)]
+        if rota[0] == "�":
+            salida[0] = opcion[0]
+            if inicio_frase or (len(rota) > 1 and rota[1].isupper()):
+                salida[0] = salida[0].upper()
+        return "".join(salida)
+
+
+def _palabras_rotas(texto):
+    """(inicio, fin) de cada palabra con "�"; se buscan los "�" y se extienden a la palabra."""
+    i = texto.find("�")
+    while i != -1:
+        inicio, fin = i, i + 1
+        while inicio > 0 and (texto[inicio - 1].isalpha() or texto[inicio - 1] == "�"):
+            inicio -= 1
+        while fin < len(texto) and (texto[fin].isalpha() or texto[fin] == "�"):
+            fin += 1
+        yield inicio, fin
+        i = texto.find("�", fin)
+
+
+def aprender_de(rutas, vocabulario):
+    for ruta in rutas:
+        with open(ruta, "r", encoding="utf-8", errors="replace") as f:
+            for linea in f:
+                if linea.isascii():
+                    continue
+                for literal in CADENA.findall(linea):
+                    if not literal.isascii():
+                        vocabulario.aprender(json.loads(literal))
+
+
+class Reparador:
+    def __init__(self, vocabulario):
+        self.vocabulario = vocabulario
+        self.por_campo = defaultdict(Counter)
+        self.sin_arreglo = Counter()
+
+    def _arreglar_rota(self, texto, inicio, fin, contadores):
+        rota = texto[inicio:fin]
+        inicio_frase = INICIO_FRASE.search(texto, max(0, inicio - CONTEXTO), inicio)
+        arreglada = self.vocabulario.resolver(rota, bool(inicio_frase))
+        if arreglada is None:
+            arreglada = rota.replace("�", "’") if CONTRACCION.fullmatch(rota) else rota
+        if arreglada == rota:
+            self.sin_arreglo[rota] += 1
+        else:
+            contadores["�"] += rota.count("�")
+        return arreglada
+
+    def reparar(self, texto, campo):
+        """Devuelve el mismo objeto str si no hubo nada que cambiar."""
+        contadores = self.por_campo[campo]
+        nuevo = texto
+        if MOJIBAKE.search(nuevo):
+            def mojibake(m):
+                contadores["mojibake"] += 1
+                return TABLA_MOJIBAKE[m.group()]
+            nuevo = MOJIBAKE.sub(mojibake, nuevo)
+        if "�" in nuevo:
+            partes = []
+            previo = 0
+            for inicio, fin in _palabras_rotas(nuevo):
+                partes.append(nuevo[previo:inicio])
+                partes.append(self._arreglar_rota(nuevo, inicio, fin, contadores))
+                previo = fin
+            partes.append(nuevo[previo:])
+            nuevo = "".join(partes)
+        if nuevo != texto:
+            contadores["cadenas"] += 1
+            return nuevo
+        return texto
+
+    def reparar_linea(self, linea, estado):
+        if linea.isascii() or not SOSPECHOSO.search(linea):
+            # Nada que arreglar; solo se sigue la clave actual para el informe
+            m = CLAVE_INICIAL.match(linea)
+            if m:
+                estado["campo"] = json.loads(m.group(1))
+            elif '":' in linea:
+                for m in CADENA.finditer(linea):
+                    if CLAVE.match(linea, m.end()):
+                        estado["campo"] = json.loads(m.group())
+            return linea
+        partes = []
+        previo = 0
+        for m in CADENA.finditer(linea):
+            literal = m.group()
+            if CLAVE.match(linea, m.end()):
+                estado["campo"] = json.loads(literal)
+                continue
+            if literal.isascii():
+                continue
+            texto = json.loads(literal)
+            nuevo = self.reparar(texto, estado["campo"])
+            if nuevo is not texto:
+                partes.append(linea[previo:m.start()])
+                partes.append(json.dumps(nuevo, ensure_ascii=False))
+                previo = m.end()
+        if not partes:
+            return linea
+        partes.append(linea[previo:])
+        return "".join(partes)
+
+    def reparar_archivo(self, entrada, salida):
+        estado = {"campo": None}
+        lineas = cambiadas = 0
+        tmp = salida + ".tmp"
+        with open(entrada, "r", encoding="utf-8", errors="replace") as f, open(tmp, "w", encoding="utf-8") as out:
+            for linea in f:
+                nueva = self.reparar_linea(linea, estado)
+                lineas += 1
+                cambiadas += nueva is not linea
+                out.write(nueva)
+        os.replace(tmp, salida)
+        return lineas, cambiadas
+
+
+# ---------------------------
+# Autoprueba
+# ---------------------------
+# (texto del que se aprende, texto roto, resultado esperado)
+CASOS = [
+    ("El Capitán", "Capit�n Beyond", "Capitán Beyond"),
+    # La mayúscula que se vio se conserva aunque las minúsculas sumen más
+    ("Änglagård y Änglagård, ÄNGLAGÅRD", "band �nglag�rd, on this", "band Änglagård, on this"),
+    ("Änglagård y Änglagård, ÄNGLAGÅRD", "Epilog.\n�nglag�rd's sound", "Epilog.\nÄnglagård's sound"),
+    ("WEGMÜLLER WEGMÜLLER Wegmüller", "Peter Wegm�ller", "Peter Wegmüller"),
+    # Un "�" suelto no se adivina
+    ("C'è più", "their first album \"� Bichos = Dichos?\"", "their first album \"� Bichos = Dichos?\""),
+    ("ésta ásta", "y �sta", "y �sta"),  # sin una inicial que gane claramente, se deja
+    ("ábrete", "dijo. �brete Gandul", "dijo. Ábrete Gandul"),
+    ("", "Don�t stop", "Don’t stop"),
+    ("", "CafÃ© y canciÃ³n", "Café y canción"),
+]
+
+
+def autoprueba():
+    fallas = 0
+    for vocab, roto, esperado in CASOS:
+        vocabulario = Vocabulario()
+        vocabulario.aprender(vocab)
+        obtenido = Reparador(vocabulario).reparar(roto, "prueba")
+        if obtenido != esperado:
+            fallas += 1
+            print(f"❌ {roto!r}: {obtenido!r} (se esperaba {esperado!r})")
+    print(f"{'✅' if not fallas else '❌'} {len(CASOS) - fallas} de {len(CASOS)} casos")
+    return 1 if fallas else 0
 
-with open("progarchives_albums_full_actualizado.json", "r", encoding="utf-8", errors="replace") as f:
-    contenido = f.read()
 
-# Buscar palabras con caracteres fuera del rango típico (acentos mal codificados, caracteres extraños, etc.)
-malos = re.findall(r"\b[\w\u00A0-\u00FF]*[^\x00-\x7F]{1,}[\w\u00A0-\u00FF]*\b", contenido)
-print(set(malos))
+# ---------------------------
+# Informe
+# ---------------------------
+def informe(reparador):
+    if not reparador.por_campo:
+        print("✨ No había nada que reparar")
+    else:
+        print(f"{'campo':<24} {'cadenas':>8} {'mojibake':>9} {'�':>6}")
+        for campo, c in sorted(reparador.por_campo.items(), key=lambda x: -x[1]["cadenas"]):
+            if c["cadenas"]:
+                print(f"{str(campo):<24} {c['cadenas']:8d} {c['mojibake']:9d} {c['�']:6d}")
+    if reparador.sin_arreglo:
+        total = sum(reparador.sin_arreglo.values())
+        muestra = ", ".join(p for p, _ in reparador.sin_arreglo.most_common(MAX_SIN_ARREGLO))
+        print(f"⚠️ {total} palabras con \"�\" sin resolver: {muestra}")
 
 
-# # Diccionario de reemplazos comunes
-# reemplazos = {
-#     "Ã¡": "á", "Ã©": "é", "Ã­": "í", "Ã³": "ó", "Ãº": "ú",
-#     "Ã±": "ñ", "Ã": "Á", "Ã‰": "É", "Ã": "Í", "Ã“": "Ó",
-#     "Ãš": "Ú", "Ã‘": "Ñ", "â": "“", "â": "”", "â": "’",
-#     "â": "–", "â": "—", "â¦": "…", "Â": ""
-# }
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Repara mojibake y caracteres \"�\" en los JSON del dataset")
+    parser.add_argument("entradas", nargs="*", default=[input_path], help="JSON a reparar (p. ej. parte*.json)")
+    parser.add_argument("-o", "--salida", help=f"archivo de salida (solo con una entrada; si no, se agrega {SUFIJO})")
+    parser.add_argument("--vocabulario", nargs="*", default=[],
+                        help="otros archivos de los que aprender palabras sanas (JSON o texto)")
+    parser.add_argument("--autoprueba", action="store_true", help="correr los casos conocidos y salir")
+    args = parser.parse_args(argv)
 
-# def reemplazar(texto):
-#     for malo, bueno in reemplazos.items():
-#         texto = texto.replace(malo, bueno)
-#     return texto
+    if args.autoprueba:
+        return autoprueba()
+    if args.salida and len(args.entradas) > 1:
+        parser.error("--salida solo sirve con una entrada")
+    faltantes = [r for r in args.entradas + args.vocabulario if not os.path.exists(r)]
+    if faltantes:
+        print(f"❌ No existe: {', '.join(faltantes)}")
+        return 1
 
-# # Aplicar reemplazo a todo
-# def corregir(obj):
-#     if isinstance(obj, dict):
-#         return {k: corregir(v) for k, v in obj.items()}
-#     elif isinstance(obj, list):
-#         return [corregir(i) for i in obj]
-#     elif isinstance(obj, str):
-#         return reemplazar(obj)
-#     return obj
+    inicio = time.perf_counter()
+    vocabulario = Vocabulario()
+    for palabra in DICCIONARIO:
+        vocabulario.aprender(palabra, peso=0)  # el dataset manda si también la tiene
+    aprender_de(args.entradas + args.vocabulario, vocabulario)
 
-# # Cargar archivo
-# with open("progarchives_albums_full_actualizado.json", "r", encoding="utf-8") as f:
-#     data = json.load(f)
+    reparador = Reparador(vocabulario)
+    for entrada in args.entradas:
+        if args.salida:
+            salida = args.salida
+        elif entrada == input_path:
+            salida = output_path
+        else:
+            base, ext = os.path.splitext(entrada)
+            salida = base + SUFIJO + ext
+        lineas, cambiadas = reparador.reparar_archivo(entrada, salida)
+        print(f"📁 {entrada} -> {salida}: {cambiadas} de {lineas} líneas cambiadas")
 
-# # Corregir y guardar
-# data_limpia = corregir(data)
+    informe(reparador)
+    print(f"⏱ {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    return 0
 
-# with open("progarchives_albums_full_actualizado_utf.json", "w", encoding="utf-8") as f:
-#     json.dump(data_limpia, f, ensure_ascii=False, indent=2)
 
-# print("¡Archivo reparado guardado como 'arreglado.json'!")
+if __name__ == "__main__":
+    sys.exit(main())
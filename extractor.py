@@ -0,0 +1,295 @@
+from lxml import etree, html as lxml_html
+import cliente_http
+import metricas
+
+# ---------------------------
+# Extracción de páginas de ProgArchives con lxml
+# ---------------------------
+# Reemplaza los árboles BeautifulSoup(html.parser) + find/find_all con
+# lambdas de prog.py, completar.py y actualizar.py. Cada tipo de página
+# (álbum, artista, tabla de ranking) tiene sus selectores XPath compilados
+# una sola vez al importar, y devuelve los mismos campos que antes.
+# lxml parsea en C y suelta el GIL, así que los 12 hilos ya no se frenan
+# entre sí al parsear. El tiempo de parseo de cada página queda en
+# metricas.py (parseo_segundos, por tipo de página).
+
+BASE_URL = "https://www.progarchives.com/"
+MAX_REVIEW_CHARS = 4000
+
+ALBUM = {
+    "tipo": etree.XPath("(//strong[not(*)][contains(text(), 'Album')])[1]"),
+    "tracklist": etree.XPath("(//strong[text()='Songs / Tracks Listing'])[1]"),
+    "lineup": etree.XPath("(//strong[text()='Line-up / Musicians'])[1]"),
+    "siguiente_p": etree.XPath("following::p[1]"),
+    "reviews": etree.XPath("//div[contains(@style, 'background-color:#f0f0f0')]"),
+    "review_texto": etree.XPath(".//div[contains(@style, 'color:#333')][1]"),
+    "review_autor": etree.XPath(".//a[1]"),
+    "rating": etree.XPath("(//*[@itemprop='ratingValue'])[1]"),
+    "votos": etree.XPath("(//*[@itemprop='ratingCount'])[1]"),
+}
+
+ARTISTA = {
+    "h2": etree.XPath("(//h2)[1]"),
+    "foto": etree.XPath("(//*[@id='artist-box']//img)[1]/@src"),
+    "bio": etree.XPath("(//span[@id='moreBio'])[1]"),
+    "bio_alt": etree.XPath("(//*[@id='artist-biography'])[1]"),
+}
+
+RANKING = {
+    "filas": etree.XPath("//tr"),
+    "celdas": etree.XPath("./td"),
+    "links": etree.XPath(".//a"),
+    "img": etree.XPath(".//img[1]/@src"),
+    "rating": etree.XPath(".//span[contains(@id, 'avgRatings_')][1]"),
+    "votos": etree.XPath(".//span[contains(@id, 'nbRatings_')][1]"),
+}
+
+_SIN_TEXTO = {"script", "style"}
+_TAMANO_BLOQUE = 16 * 1024
+_TAMANO_LECTURA = 64 * 1024
+
+
+def textos(el):
+    """Equivale a los strings que usa BeautifulSoup.get_text (sin comentarios ni <script>)."""
+    if isinstance(el.tag, str) and el.tag not in _SIN_TEXTO and el.text:
+        yield el.text
+    for hijo in el:
+        if isinstance(hijo.tag, str):
+            yield from textos(hijo)
+        if hijo.tail:
+            yield hijo.tail
+
+
+def get_text(el, separator="\n"):
+    """Equivale a BeautifulSoup.get_text(separator=..., strip=True)."""
+    return separator.join(t.strip() for t in textos(el) if t.strip())
+
+
+def _primero(xpath, el):
+    r = xpath(el)
+    return r[0] if r else None
+
+
+_PARSER_UTF8 = lxml_html.HTMLParser(encoding="utf-8")
+
+
+def parsear(html):
+    if isinstance(html, bytes):
+        return lxml_html.document_fromstring(html)
+    return lxml_html.document_fromstring(html.encode("utf-8"), parser=_PARSER_UTF8)
+
+
+def parsear_parcial(html, fin):
+    """
+    Parsea solo hasta que se cierra el primer elemento que cumple `fin`
+    (tag, id). El resto del documento no se tokeniza.
+    """
+    tag, id_fin = fin
+    parser = etree.HTMLPullParser(events=("end",), tag=tag, encoding="utf-8")
+    datos = html.encode("utf-8") if isinstance(html, str) else html
+    for i in range(0, len(datos), _TAMANO_BLOQUE):
+        parser.feed(datos[i:i + _TAMANO_BLOQUE])
+        for _, el in parser.read_events():
+            if el.get("id") == id_fin:
+                return parser.close()
+    return parser.close()
+
+
+# ---------------------------
+# Página de álbum
+# ---------------------------
+@metricas.cronometrar("parseo_segundos", pagina="album")
+def extraer_album(html, max_review_chars=MAX_REVIEW_CHARS, valoracion=False):
+    """Campos del álbum; con valoracion=True también average_rating y ratings_count, si la página los trae."""
+    raiz = parsear(html)
+    details = {
+        "album_type": None,
+        "release_info": None,
+        "tracklist": None,
+        "lineup": None,
+        "collaborator_reviews": []
+    }
+
+    tipo = _primero(ALBUM["tipo"], raiz)
+    if tipo is not None:
+        details["album_type"] = get_text(tipo, "")
+        p = _primero(ALBUM["siguiente_p"], tipo)
+        if p is not None:
+            details["release_info"] = get_text(p)
+
+    for campo in ("tracklist", "lineup"):
+        strong = _primero(ALBUM[campo], raiz)
+        if strong is not None:
+            p = _primero(ALBUM["siguiente_p"], strong)
+            if p is not None:
+                details[campo] = get_text(p)
+
+    if valoracion:
+        # Microdatos de la página: los mismos valores que la tabla de ranking, pero al día
+        rating = _primero(ALBUM["rating"], raiz)
+        votos = _primero(ALBUM["votos"], raiz)
+        try:
+            if rating is not None:
+                details["average_rating"] = float("".join(textos(rating)).strip())
+            if votos is not None:
+                details["ratings_count"] = int("".join(textos(votos)).strip().replace(",", ""))
+        except ValueError:
+            pass
+
+    char_count = 0
+    for r in ALBUM["reviews"](raiz):
+        if "SPECIAL COLLABORATOR" not in "".join(textos(r)):
+            continue
+        content = _primero(ALBUM["review_texto"], r)
+        if content is None:
+            continue
+        text = get_text(content)
+        if char_count + len(text) > max_review_chars:
+            break
+        char_count += len(text)
+        autor = _primero(ALBUM["review_autor"], r)
+        details["collaborator_reviews"].append({
+            "author": get_text(autor, "") if autor is not None else "Desconocido",
+            "text": text,
+            "translated_text": ""
+        })
+
+    return details
+
+
+# ---------------------------
+# Página de artista
+# ---------------------------
+@metricas.cronometrar("parseo_segundos", pagina="artista")
+def extraer_artista(html):
+    # Todo lo que se usa está antes del cierre de span#moreBio (cuando existe)
+    raiz = parsear_parcial(html, ("span", "moreBio"))
+
+    country = None
+    h2 = _primero(ARTISTA["h2"], raiz)
+    if h2 is not None:
+        texto_h2 = "".join(textos(h2))
+        if "•" in texto_h2:
+            country = texto_h2.split("•")[-1].strip()
+
+    bio = _primero(ARTISTA["bio"], raiz)
+    if bio is None:
+        bio = _primero(ARTISTA["bio_alt"], raiz)
+
+    return {
+        "country": country,
+        "photo_url": _primero(ARTISTA["foto"], raiz),
+        "biography": get_text(bio) if bio is not None else "",
+    }
+
+
+# ---------------------------
+# Tabla de ranking
+# ---------------------------
+@metricas.cronometrar("parseo_segundos", pagina="fila_ranking")
+def extraer_fila_ranking(tr, base_url=BASE_URL):
+    """Misma salida que prog.parse_row, a partir de un <tr> de lxml."""
+    cols = RANKING["celdas"](tr)
+    if len(cols) < 4:
+        return None
+    try:
+        rank = int("".join(textos(cols[0])).strip())
+    except ValueError:
+        return None
+
+    links = RANKING["links"](cols[2])
+    if len(links) < 2:
+        return None
+    album_link, band_link = links[0], links[1]
+    info = "".join(textos(cols[3])).strip()
+
+    rating = _primero(RANKING["rating"], cols[4]) if len(cols) > 4 else None
+    votos = _primero(RANKING["votos"], cols[4]) if len(cols) > 4 else None
+
+    return {
+        "band_name": "".join(textos(band_link)).strip(),
+        "band_url": base_url + band_link.get("href"),
+        "album": {
+            "rank": rank,
+            "title": "".join(textos(album_link)).strip(),
+            "album_url": base_url + album_link.get("href"),
+            "cover_url": _primero(RANKING["img"], cols[1]) or "",
+            "year": int(info[-4:]) if info[-4:].isdigit() else None,
+            "average_rating": float("".join(textos(rating)).strip()) if rating is not None else None,
+            "ratings_count": int("".join(textos(votos)).strip().replace(",", "")) if votos is not None else None
+        }
+    }
+
+
+def extraer_tabla(html, base_url=BASE_URL):
+    filas = (extraer_fila_ranking(tr, base_url) for tr in RANKING["filas"](parsear(html)))
+    return [f for f in filas if f]
+
+
+# ---------------------------
+# Ranking en streaming
+# ---------------------------
+# Para rankings de miles de filas (o varias páginas): el HTML se lee por
+# bloques, cada <tr> se entrega apenas se cierra y luego se borra del árbol,
+# así la memoria no crece con la cantidad de filas.
+
+def expandir_fuentes(fuentes, paginas=1):
+    """Las fuentes con {pagina} se expanden a las páginas 1..paginas."""
+    for fuente in fuentes:
+        if "{pagina}" in fuente:
+            for n in range(1, paginas + 1):
+                yield fuente.format(pagina=n)
+        else:
+            yield fuente
+
+
+def _bloques(fuente):
+    if fuente.startswith(("http://", "https://")):
+        res = cliente_http.get(fuente, stream=True)
+        res.raise_for_status()
+        try:
+            yield from res.iter_content(_TAMANO_LECTURA)
+        finally:
+            cliente_http.contar_bytes(res)
+            res.close()
+    else:
+        with open(fuente, "rb") as f:
+            while True:
+                bloque = f.read(_TAMANO_LECTURA)
+                if not bloque:
+                    return
+                yield bloque
+
+
+def iterar_filas_ranking(fuente, base_url=BASE_URL):
+    """Genera las filas (como extraer_fila_ranking) de un archivo o URL de ranking, en streaming."""
+    parser = etree.HTMLPullParser(events=("end",), tag="tr", encoding="utf-8")
+
+    def filas_listas():
+        for _, tr in parser.read_events():
+            fila = extraer_fila_ranking(tr, base_url)
+            # Se libera la fila y todo lo anterior a ella
+            tr.clear()
+            padre = tr.getparent()
+            if padre is not None:
+                while tr.getprevious() is not None:
+                    del padre[0]
+            if fila:
+                yield fila
+
+    for bloque in _bloques(fuente):
+        parser.feed(bloque)
+        yield from filas_listas()
+    parser.close()
+    yield from filas_listas()
+
+
+def iterar_rankings(fuentes, base_url=BASE_URL):
+    """Encadena varias tablas; un álbum que aparece en más de una se entrega una sola vez."""
+    vistos = set()
+    for fuente in fuentes:
+        for fila in iterar_filas_ranking(fuente, base_url):
+            url = fila["album"]["album_url"]
+            if url not in vistos:
+                vistos.add(url)
+                yield fila
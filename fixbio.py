@@ -1,15 +1,232 @@
+import io
 import re
+import sys
+import argparse
+from html.parser import HTMLParser
 
-with open("libro3.html", "r", encoding="utf-8") as f:
-    contenido = f.read()
+# Configuración
+ENTRADA = "libro3.html"
+SALIDA = "libro3v2.html"
+BLOQUE = 64 * 1024  # caracteres que se leen por vez
+SALTO = re.compile("\n")
 
-def reemplazar_bio(m):
-    texto = m.group(1)
-    parrafos = re.split(r'<br\s*/?>\s*<br\s*/?>', texto)
-    nuevo = '\n'.join(f'  <p class="bio-p">{p.strip()}</p>' for p in parrafos)
-    return f'<div class="bio">\n{nuevo}\n</div>'
+# ---------------------------
+# Post-proceso del libro en una sola pasada
+# ---------------------------
+# El HTML se lee de a bloques y se parte en tokens (etiquetas, texto, comentarios)
+# que conservan su texto original. Los tokens pasan por una cadena de reglas: cada
+# regla deja pasar lo que no le interesa tal cual y reescribe lo suyo, y al final
+# de la cadena se escriben a la salida. Agregar un arreglo es agregar una regla a
+# REGLAS, no otra lectura completa del libro.
 
-nuevo_contenido = re.sub(r'(?s)<p class="bio">(.*?)</p>', reemplazar_bio, contenido)
 
-with open("libro3v2.html", "w", encoding="utf-8") as f:
-    f.write(nuevo_contenido)
\ No newline at end of file
+class Token:
+    __slots__ = ("tipo", "tag", "attrs", "crudo")
+
+    def __init__(self, tipo, tag, attrs, crudo):
+        self.tipo = tipo    # "inicio", "fin", "vacio" (<br/>), "texto" u "otro"
+        self.tag = tag
+        self.attrs = attrs
+        self.crudo = crudo  # el texto tal como estaba en el archivo
+
+
+def texto(crudo):
+    return Token("texto", None, None, crudo)
+
+
+class Tokenizador(HTMLParser):
+    """
+    HTMLParser no entrega el texto original de las etiquetas de cierre ni de
+    las entidades: se recorta de rawdata desde getpos(), que durante cada
+    handle_* apunta al comienzo de lo que se está procesando.
+    """
+
+    def __init__(self, emitir):
+        super().__init__(convert_charrefs=False)  # las entidades se copian sin tocar
+        self._emitir = emitir
+        self._leidos = 0          # caracteres recibidos por feed()
+        self._renglones = [0]     # posición (absoluta) donde empieza cada renglón, desde _primer_renglon
+        self._primer_renglon = 1
+
+    def feed(self, datos):
+        self._renglones.extend(self._leidos + m.end() for m in SALTO.finditer(datos))
+        self._leidos += len(datos)
+        super().feed(datos)
+        # Los renglones ya procesados no se vuelven a consultar
+        renglon = self.getpos()[0]
+        del self._renglones[:renglon - self._primer_renglon]
+        self._primer_renglon = renglon
+
+    def _posicion(self):
+        """Índice en rawdata de lo que se está procesando (getpos() es renglón y columna)."""
+        renglon, columna = self.getpos()
+        absoluta = self._renglones[renglon - self._primer_renglon] + columna
+        return absoluta - (self._leidos - len(self.rawdata))
+
+    def handle_starttag(self, tag, attrs):
+        self._emitir(Token("inicio", tag, attrs, self.get_starttag_text()))
+
+    def handle_startendtag(self, tag, attrs):
+        self._emitir(Token("vacio", tag, attrs, self.get_starttag_text()))
+
+    def handle_endtag(self, tag):
+        # La etiqueta de cierre termina en el primer ">"
+        i = self._posicion()
+        self._emitir(Token("fin", tag, None, self.rawdata[i:self.rawdata.find(">", i + 1) + 1]))
+
+    def handle_data(self, data):
+        self._emitir(texto(data))
+
+    def _entidad(self, crudo):
+        # El ";" es opcional
+        i = self._posicion() + len(crudo)
+        self._emitir(texto(crudo + ";" if self.rawdata.startswith(";", i) else crudo))
+
+    def handle_entityref(self, name):
+        self._entidad(f"&{name}")
+
+    def handle_charref(self, name):
+        self._entidad(f"&#{name}")
+
+    def handle_comment(self, data):
+        self._emitir(Token("otro", None, None, f"<!--{data}-->"))
+
+    def handle_decl(self, decl):
+        self._emitir(Token("otro", None, None, f"<!{decl}>"))
+
+    def handle_pi(self, data):
+        self._emitir(Token("otro", None, None, f"<?{data}>"))
+
+    def unknown_decl(self, data):
+        # "<![CDATA[...]]>" o "<![if ...]>": el cierre se copia tal cual
+        i = self._posicion()
+        self._emitir(Token("otro", None, None, self.rawdata[i:self.rawdata.find(">", i + 3 + len(data)) + 1]))
+
+
+# ---------------------------
+# Reglas
+# ---------------------------
+class Regla:
+    """Una etapa de la cadena: recibe cada token y le pasa a `emitir` lo que sigue."""
+
+    def conectar(self, emitir):
+        self.emitir = emitir
+
+    def token(self, t):
+        self.emitir(t)
+
+    def cerrar(self):
+        pass
+
+
+class ReglaBio(Regla):
+    """
+    <p class="bio"> con los párrafos separados por <br><br> pasa a ser un
+    <div class="bio"> con un <p class="bio-p"> por párrafo.
+    Solo se guarda en memoria la biografía que se está leyendo.
+    """
+
+    def __init__(self):
+        self._parrafos = None  # None: fuera de una biografía
+        self._pendiente = []   # un <br> (y espacios) que puede ser la mitad de un corte
+
+    def token(self, t):
+        if self._parrafos is None:
+            if t.tipo == "inicio" and t.tag == "p" and t.attrs == [("class", "bio")]:
+                self._parrafos = [[]]
+            else:
+                self.emitir(t)
+            return
+
+        if t.tipo == "fin" and t.tag == "p":
+            self._volcar()
+        elif t.tipo in ("inicio", "vacio") and t.tag == "br" and not t.attrs:
+            if self._pendiente:
+                self._parrafos.append([])
+                self._pendiente = []
+            else:
+                self._pendiente = [t]
+        elif self._pendiente and t.tipo == "texto" and not t.crudo.strip():
+            self._pendiente.append(t)
+        else:
+            self._parrafos[-1].extend(self._pendiente)
+            self._pendiente = []
+            self._parrafos[-1].append(t)
+
+    def _volcar(self):
+        self._parrafos[-1].extend(self._pendiente)
+        self.emitir(Token("inicio", "div", [("class", "bio")], '<div class="bio">'))
+        for parrafo in self._parrafos:
+            self.emitir(texto("\n  "))
+            self.emitir(Token("inicio", "p", [("class", "bio-p")], '<p class="bio-p">'))
+            for t in _sin_espacios_en_bordes(parrafo):
+                self.emitir(t)
+            self.emitir(Token("fin", "p", None, "</p>"))
+        self.emitir(texto("\n"))
+        self.emitir(Token("fin", "div", None, "</div>"))
+        self._parrafos = None
+        self._pendiente = []
+
+    def cerrar(self):
+        if self._parrafos is not None:  # biografía sin </p> al final del archivo
+            self._volcar()
+
+
+def _sin_espacios_en_bordes(tokens):
+    tokens = list(tokens)
+    while tokens and tokens[0].tipo == "texto" and not tokens[0].crudo.strip():
+        tokens.pop(0)
+    while tokens and tokens[-1].tipo == "texto" and not tokens[-1].crudo.strip():
+        tokens.pop()
+    if tokens and tokens[0].tipo == "texto":
+        tokens[0] = texto(tokens[0].crudo.lstrip())
+    if tokens and tokens[-1].tipo == "texto":
+        tokens[-1] = texto(tokens[-1].crudo.rstrip())
+    return tokens
+
+
+REGLAS = [ReglaBio]
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+def procesar(entrada, salida, reglas=None):
+    """Lee `entrada` de a bloques y escribe en `salida` (archivos de texto abiertos)."""
+    reglas = [r() for r in REGLAS] if reglas is None else reglas
+    siguiente = lambda t: salida.write(t.crudo)
+    for regla in reversed(reglas):
+        regla.conectar(siguiente)
+        siguiente = regla.token
+
+    tokenizador = Tokenizador(siguiente)
+    while True:
+        bloque = entrada.read(BLOQUE)
+        if not bloque:
+            break
+        tokenizador.feed(bloque)
+    tokenizador.close()
+    for regla in reglas:
+        regla.cerrar()
+
+
+def arreglar_bios(contenido):
+    salida = io.StringIO()
+    procesar(io.StringIO(contenido), salida)
+    return salida.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aplica los arreglos de post-proceso al HTML del libro")
+    parser.add_argument("entrada", nargs="?", default=ENTRADA)
+    parser.add_argument("salida", nargs="?", default=SALIDA)
+    args = parser.parse_args(argv)
+
+    with open(args.entrada, "r", encoding="utf-8") as f, open(args.salida, "w", encoding="utf-8") as out:
+        procesar(f, out)
+    print(f"📁 {args.entrada} -> {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,19 @@
 import os
 import time
-import json
+import random
+import sqlite3
+import argparse
+import threading
+import unicodedata
 import requests
 import urllib.parse
-from PIL import Image
-import qrcode
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import almacen
+import cliente_http
+import metricas
+import modelo
+import render_qr
+from indice import IndiceAlbums
 
 # ---------------------------
 # Configuración
@@ -20,58 +29,125 @@ QR_SAVE_DIR_TIDAL = "./qr/tidal/"
 LOGO_SPOTIFY = "./logos/spotify_logo.png"
 LOGO_TIDAL = "./logos/tidal_logo.png"
 
+# URLs base (se pueden apuntar a servidores de prueba)
+SPOTIFY_AUTH_URL = "https://accounts.spotify.com/api/token"
+SPOTIFY_API_URL = "https://api.spotify.com/v1/"
+TIDAL_AUTH_URL = "https://auth.tidal.com/v1/oauth2/token"
+TIDAL_API_URL = "https://openapi.tidal.com/v2/"
+
+# Cuota por proveedor: búsquedas por segundo y búsquedas en vuelo
+SPOTIFY_RPS = 3.0
+TIDAL_RPS = 2.0
+BUSQUEDAS_EN_VUELO = 4
+REINTENTOS_BUSQUEDA = 5
+BACKOFF_BUSQUEDA = 1.0     # 1s, 2s, 4s... (con jitter) si no llega Retry-After
+MAX_RENDER = render_qr.MAX_PROCESOS  # procesos generando QR detrás de las búsquedas
+# El formato de los QR (png / svg para imprenta) es almacen.FORMATO_QR: libro.py arma las mismas rutas
+
+# Caché de búsquedas entre corridas
+CACHE_BUSQUEDAS = "cache_busquedas.sqlite"
+TTL_NEGATIVO = 7 * 24 * 3600   # un "no encontrado" se vuelve a buscar pasada una semana
+MARGEN_TOKEN = 60              # se renueva el token este tanto antes de que venza
+
+# Los 429/5xx no se reintentan dentro de requests: los maneja el planificador
+_http = cliente_http.ClienteHTTP(max_por_host=BUSQUEDAS_EN_VUELO, estados_reintento=())
+
 # ---------------------------
 # QR con logo centrado
 # ---------------------------
 def generar_qr_con_logo(url, logo_path, save_path, size_px=500):
-    qr = qrcode.QRCode(
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(url)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
-    qr_img = qr_img.resize((size_px, size_px), Image.LANCZOS)
+    with metricas.medir("qr_render_segundos", formato=os.path.splitext(save_path)[1].lstrip(".")):
+        render_qr.renderizar(url, logo_path, save_path, size_px)
+    metricas.depurar("QR con logo guardado en: %s", save_path)
 
-    logo = Image.open(logo_path).convert("RGBA")
-    logo_size = int(size_px * 0.25)
-    logo = logo.resize((logo_size, logo_size), Image.LANCZOS)
+# ---------------------------
+# Funciones auxiliares
+# ---------------------------
+class Reintentar(Exception):
+    """429/5xx de un proveedor: el planificador espera `espera` segundos (o aplica backoff) y reintenta."""
 
-    logo_bg = Image.new("RGB", logo.size, "white")
-    logo_bg.paste(logo, mask=logo.split()[3])
+    def __init__(self, estado, espera=None):
+        super().__init__(f"HTTP {estado}")
+        self.estado = estado
+        self.espera = espera
 
-    pos = ((qr_img.size[0] - logo_size) // 2, (qr_img.size[1] - logo_size) // 2)
-    qr_img.paste(logo_bg, pos)
 
-    qr_img.save(save_path)
-    print(f"[✅] QR con logo guardado en: {save_path}")
+def _revisar_limite(response):
+    if response.status_code == 429 or response.status_code >= 500:
+        espera = response.headers.get("Retry-After")
+        try:
+            espera = float(espera) if espera is not None else None
+        except ValueError:
+            espera = None  # Retry-After como fecha HTTP: se usa el backoff propio
+        raise Reintentar(response.status_code, espera)
+    if response.status_code == 401:
+        raise TokenVencido()
+
+
+class TokenVencido(Exception):
+    """401: el token venció antes de lo previsto; se pide otro y se reintenta."""
+
+
+class SinRespuesta(Exception):
+    """Se agotaron los reintentos: la búsqueda no se guarda en la caché."""
+
+
+class Token:
+    """
+    Token OAuth de client credentials. Se pide al primer uso y se renueva
+    MARGEN_TOKEN segundos antes de vencer (o al recibir un 401). Un token
+    fijo (sin `pedir`) se usa tal cual.
+    """
+
+    def __init__(self, nombre, pedir=None, fijo=None):
+        self.nombre = nombre
+        self._pedir = pedir
+        self._valor = fijo
+        self._renovar_en = float("inf") if fijo else 0.0
+        self.renovaciones = 0
+        self._lock = threading.Lock()
+
+    def valor(self):
+        with self._lock:
+            if self._pedir and time.monotonic() >= self._renovar_en:
+                token, expira = self._pedir()
+                if not token:
+                    raise Exception(f"[ERROR] No se pudo obtener token de {self.nombre}")
+                expira = float(expira or 3600)
+                self._valor = token
+                # Con tokens muy cortos el margen no pasa de un 10% de su vida
+                self._renovar_en = time.monotonic() + expira - min(MARGEN_TOKEN, expira * 0.1)
+                self.renovaciones += 1
+            return self._valor
+
+    def invalidar(self, usado):
+        with self._lock:
+            # Si otro hilo ya lo renovó, no se vuelve a pedir
+            if self._valor == usado:
+                self._renovar_en = 0.0
+
 
-# ---------------------------
-# Funciones auxiliares
-# ---------------------------
 def get_spotify_token(client_id, client_secret):
-    print("[DEBUG] Solicitando token de Spotify...")
-    url = "https://accounts.spotify.com/api/token"
+    metricas.depurar("Solicitando token de Spotify...")
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
     data = {"grant_type": "client_credentials"}
     try:
-        response = requests.post(url, headers=headers, data=data, auth=(client_id, client_secret), timeout=10)
+        response = _http.post(SPOTIFY_AUTH_URL, headers=headers, data=data, auth=(client_id, client_secret), timeout=10)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         raise Exception(f"[ERROR] No se pudo conectar con Spotify: {e}")
 
-    token = response.json()['access_token']
-    print("[DEBUG] Token de Spotify obtenido.")
-    return token
+    datos = response.json()
+    metricas.depurar("Token de Spotify obtenido.")
+    return datos['access_token'], datos.get('expires_in')
 
 def search_spotify_album(search_query, token):
-    print(f"[DEBUG] Buscando en Spotify: {search_query}")
-    url = "https://api.spotify.com/v1/search"
+    metricas.depurar("Buscando en Spotify: %s", search_query)
     params = {"q": search_query, "type": "album", "limit": 1}
     headers = {"Authorization": f"Bearer {token}"}
+    response = _http.get(SPOTIFY_API_URL + "search", headers=headers, params=params, timeout=10)
+    _revisar_limite(response)
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"[ERROR] Falló la búsqueda en Spotify: {e}")
@@ -79,38 +155,31 @@ def search_spotify_album(search_query, token):
 
     items = response.json().get("albums", {}).get("items", [])
     if items:
-        print(f"[DEBUG] Álbum encontrado: {items[0]['name']} ({items[0]['id']})")
+        metricas.depurar("Álbum encontrado: %s (%s)", items[0]['name'], items[0]['id'])
         return items[0]["id"]
-    print("[DEBUG] No se encontraron álbumes en Spotify.")
+    metricas.depurar("No se encontraron álbumes en Spotify.")
     return None
 
-def extract_progarchives_album_id(album_url):
-    if not album_url:
-        return None
-    parsed = urllib.parse.urlparse(album_url)
-    qs = urllib.parse.parse_qs(parsed.query)
-    return qs.get("id", [None])[0]
-
 def generate_tidal_album_url_from_id(tidal_album_id):
     return f"https://tidal.com/browse/album/{tidal_album_id}"
 
 def get_tidal_token(client_id, client_secret):
-    url = "https://auth.tidal.com/v1/oauth2/token"
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
     data = {
         "grant_type": "client_credentials",
-        "client_id": TIDAL_CLIENT_ID,
-        "client_secret": TIDAL_CLIENT_SECRET,
+        "client_id": client_id,
+        "client_secret": client_secret,
         "scope": "r_usr w_usr"  # puedes personalizar los scopes si es necesario
     }
 
     try:
-        response = requests.post(url, headers=headers, data=data, timeout=10)
+        response = _http.post(TIDAL_AUTH_URL, headers=headers, data=data, timeout=10)
         response.raise_for_status()
-        return response.json().get("access_token")
+        datos = response.json()
+        return datos.get("access_token"), datos.get("expires_in")
     except requests.exceptions.RequestException as e:
         print(f"[ERROR] Error al obtener token de Tidal: {e}")
-        return None
+        return None, None
 
 
 
@@ -124,7 +193,7 @@ def search_tidal_album_id(query, access_token):
     """
     # Codificar el query para asegurar que la URL sea correcta
     encoded_query = urllib.parse.quote(query)
-    url = f"https://openapi.tidal.com/v2/searchResults/{encoded_query}"
+    url = f"{TIDAL_API_URL}searchResults/{encoded_query}"
     
     headers = {
         "Authorization": f"Bearer {access_token}",
@@ -136,112 +205,311 @@ def search_tidal_album_id(query, access_token):
         "include": "albums"
     }
     
+    response = _http.get(url, headers=headers, params=params, timeout=10)
+    _revisar_limite(response)
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
         response.raise_for_status()
-        data = response.json()
-        print(f"[DEBUG] Respuesta completa: {data}")
-        
-        # Intentar extraer desde relationships.albums.data
-        albums_rel = data.get("data", {}).get("relationships", {}).get("albums", {}).get("data", [])
-        if albums_rel and len(albums_rel) > 0:
-            album_id = albums_rel[0].get("id")
-            if album_id:
-                print(f"[✅] Tidal (relationships): '{query}' → ID {album_id}")
-                return album_id
-        
-        # Si no se encontró allí, buscar en "included"
-        included = data.get("included", [])
-        for item in included:
-            if item.get("type") == "albums" and item.get("id"):
-                album_id = item.get("id")
-                print(f"[✅] Tidal (included): '{query}' → ID {album_id}")
-                return album_id
-        
-        print(f"[⚠️] No se encontró álbum en Tidal para: {query}")
-        return None
-    
     except requests.exceptions.RequestException as e:
         print(f"[ERROR] Error buscando en Tidal: {e}")
         return None
 
+    # Fuera del try: un cuerpo que no es JSON no es un "no encontrado" (no se guarda en la caché)
+    data = response.json()
+    # La respuesta entera solo con --detallado: formatearla en cada búsqueda costaba más que parsearla
+    metricas.depurar("Respuesta completa: %s", data)
+    
+    # Intentar extraer desde relationships.albums.data
+    albums_rel = data.get("data", {}).get("relationships", {}).get("albums", {}).get("data", [])
+    if albums_rel and len(albums_rel) > 0:
+        album_id = albums_rel[0].get("id")
+        if album_id:
+            metricas.depurar("Tidal (relationships): '%s' → ID %s", query, album_id)
+            return album_id
+    
+    # Si no se encontró allí, buscar en "included"
+    included = data.get("included", [])
+    for item in included:
+        if item.get("type") == "albums" and item.get("id"):
+            album_id = item.get("id")
+            metricas.depurar("Tidal (included): '%s' → ID %s", query, album_id)
+            return album_id
+    
+    metricas.depurar("No se encontró álbum en Tidal para: %s", query)
+    return None
+
 
 
 # ---------------------------
-# Procesamiento principal
+# Caché de búsquedas
 # ---------------------------
-def procesar_albums(json_data):
-    print("[INFO] Iniciando procesamiento de álbumes...")
-    results = []
+def normalizar_consulta(texto):
+    texto = unicodedata.normalize("NFKC", texto).casefold()
+    return " ".join(texto.split())
 
-    try:
-        spotify_token = get_spotify_token(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET)
-    except Exception as e:
-        print(f"[ERROR] {e}")
-        return []
-    
 
+class CacheBusquedas:
+    """
+    Respuestas de Spotify/Tidal por (proveedor, consulta normalizada): el id y
+    la URL encontrados, o un "no encontrado" que vence a los TTL_NEGATIVO
+    segundos. Cada respuesta se guarda apenas llega, así una corrida cortada
+    retoma donde quedó.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or CACHE_BUSQUEDAS
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS busquedas ("
+            " proveedor TEXT NOT NULL, consulta TEXT NOT NULL, album_id TEXT, url TEXT,"
+            " fecha REAL NOT NULL, PRIMARY KEY (proveedor, consulta))"
+        )
+        self._db.commit()
+
+    def obtener(self, proveedor, consulta):
+        """(True, album_id) si hay respuesta vigente (album_id None = no está); (False, None) si hay que buscar."""
+        with self._lock:
+            fila = self._db.execute(
+                "SELECT album_id, fecha FROM busquedas WHERE proveedor = ? AND consulta = ?",
+                (proveedor, normalizar_consulta(consulta)),
+            ).fetchone()
+            if fila is None or (fila[0] is None and time.time() - fila[1] > TTL_NEGATIVO):
+                self.fallos += 1
+                metricas.contar("cache_fallos", cache="busquedas", proveedor=proveedor)
+                return False, None
+            self.aciertos += 1
+            metricas.contar("cache_aciertos", cache="busquedas", proveedor=proveedor)
+            return True, fila[0]
+
+    def guardar(self, proveedor, consulta, album_id, url=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO busquedas (proveedor, consulta, album_id, url, fecha) VALUES (?, ?, ?, ?, ?)",
+                (proveedor, normalizar_consulta(consulta), album_id, url, time.time()),
+            )
+            self._db.commit()
+
+    def cerrar(self):
+        self._db.close()
 
 
+# ---------------------------
+# Planificador de búsquedas
+# ---------------------------
+class Proveedor:
+    """
+    Búsquedas de un proveedor con su propia cuota. Las peticiones se espacian
+    a `rps`; ante un 429 se pausa todo el proveedor lo que pida Retry-After y
+    la tasa baja a la mitad, y luego se recupera de a poco con cada éxito.
+    """
+
+    def __init__(self, nombre, buscar, token, rps):
+        self.nombre = nombre
+        self._buscar = buscar
+        self.token = token
+        self.rps_max = rps
+        self.rps = rps
+        self.peticiones = 0
+        self.limitadas = 0
+        self.desde_cache = 0
+        self._siguiente = 0.0
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def _esperar_turno(self):
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente, self._pausa_hasta)
+            self._siguiente = turno + 1 / self.rps
+            self.peticiones += 1
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+    def _frenar(self, espera):
+        with self._lock:
+            self.limitadas += 1
+            self.rps = max(self.rps / 2, self.rps_max / 16)
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + espera)
+
+    def _acelerar(self):
+        with self._lock:
+            self.rps = min(self.rps_max, self.rps + self.rps_max / 20)
+
+    def buscar(self, query):
+        for intento in range(REINTENTOS_BUSQUEDA):
+            self._esperar_turno()
+            try:
+                token = self.token.valor()
+            except Exception as e:
+                raise SinRespuesta(f"{self.nombre}: {e}")
+            try:
+                resultado = self._buscar(query, token)
+            except TokenVencido:
+                print(f"[WARN] {self.nombre}: token rechazado; se pide otro")
+                metricas.contar("busqueda_reintentos", proveedor=self.nombre, motivo="token")
+                self.token.invalidar(token)
+                continue
+            except (Reintentar, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                espera = getattr(e, "espera", None)
+                if espera is None:
+                    espera = random.uniform(0, BACKOFF_BUSQUEDA * 2 ** intento)
+                print(f"[WARN] {self.nombre}: {e}; reintento en {espera:.1f}s")
+                metricas.contar("busqueda_reintentos", proveedor=self.nombre, motivo=getattr(e, "estado", type(e).__name__))
+                self._frenar(espera)
+                continue
+            self._acelerar()
+            return resultado
+        raise SinRespuesta(f"{self.nombre}: sin respuesta para '{query}' tras {REINTENTOS_BUSQUEDA} intentos")
+
+
+def crear_proveedores():
+    """nombre -> (Proveedor, plantilla de la URL del álbum, logo, carpeta de los QR)."""
     os.makedirs(QR_SAVE_DIR_SPOTIFY, exist_ok=True)
     os.makedirs(QR_SAVE_DIR_TIDAL, exist_ok=True)
 
-    for band_name, band_data in json_data.items():
-        print(f"\n[INFO] Procesando banda: {band_name}")
-        for album in band_data.get("albums", []):
-            album_title = album.get("title")
-            album_year = album.get("year")
-            prog_album_url = album.get("album_url")
-            prog_album_id = extract_progarchives_album_id(prog_album_url)
-            search_query = f"{band_name} - {album_title}"
-
-            print(f"\n➡️  Álbum: {album_title} ({album_year})")
-            print(f"[DEBUG] Query búsqueda: {search_query}")
-            print(f"[DEBUG] ID ProgArchives: {prog_album_id}")
-
-            # --- Spotify ---
-            spotify_album_id = search_spotify_album(search_query, spotify_token)
-            if spotify_album_id:
-                spotify_url = f"https://open.spotify.com/album/{spotify_album_id}"
-                spotify_path = os.path.join(QR_SAVE_DIR_SPOTIFY, f"{prog_album_id}.png")
-                generar_qr_con_logo(spotify_url, LOGO_SPOTIFY, spotify_path)
-            else:
-                spotify_path = None
-
-            # --- Tidal (mock) ---
-            tidal_album_id = search_tidal_album_id(search_query, TIDAL_TOKEN)
-            if tidal_album_id:
-                tidal_url = f"https://tidal.com/browse/album/{tidal_album_id}"
-                tidal_path = os.path.join(QR_SAVE_DIR_TIDAL, f"{prog_album_id}.png")
-                generar_qr_con_logo(tidal_url, LOGO_TIDAL, tidal_path)
-            else:
-                print("[WARN] No se encontró ID de Tidal; no se genera QR.")
-                      
+    # Los tokens se piden recién cuando hace falta buscar algo
+    spotify_token = Token("Spotify", lambda: get_spotify_token(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET))
+    if TIDAL_TOKEN:
+        tidal_token = Token("Tidal", fijo=TIDAL_TOKEN)
+    else:
+        tidal_token = Token("Tidal", lambda: get_tidal_token(TIDAL_CLIENT_ID, TIDAL_CLIENT_SECRET))
+
+    return {
+        "spotify": (Proveedor("Spotify", search_spotify_album, spotify_token, SPOTIFY_RPS),
+                    "https://open.spotify.com/album/{}", LOGO_SPOTIFY, QR_SAVE_DIR_SPOTIFY),
+        "tidal": (Proveedor("Tidal", search_tidal_album_id, tidal_token, TIDAL_RPS),
+                  "https://tidal.com/browse/album/{}", LOGO_TIDAL, QR_SAVE_DIR_TIDAL),
+    }
 
-            results.append({
-                "band": band_name,
-                "album": album_title,
-                "spotify_id": spotify_album_id,
-                "spotify_path": spotify_path,
-                "tidal_id": tidal_album_id,
-                "tidal_path": tidal_path
-            })
 
-            time.sleep(5)
+# ---------------------------
+# Procesamiento principal
+# ---------------------------
+def procesar_albums(json_data, reanudar=True):
+    """
+    Busca cada álbum en Spotify y Tidal y genera sus QR. Con reanudar=True
+    solo se consulta a las APIs lo que no está en la caché de búsquedas.
+    """
+    print("[INFO] Iniciando procesamiento de álbumes...")
+    inicio = time.perf_counter()
 
+    proveedores = crear_proveedores()
+    cache = CacheBusquedas()
 
-    print("\n✅ Procesamiento finalizado.")
-    return results
+    # El índice ya trae el id de ProgArchives de cada álbum (sin reparsear URLs)
+    registros = IndiceAlbums(json_data).todos()
+    results = {
+        reg.id: {"band": reg.banda, "album": reg.titulo, "spotify_id": None, "spotify_path": None,
+                 "tidal_id": None, "tidal_path": None, "errores": []}
+        for reg in registros
+    }
+    fallidos = 0
+
+    def fallo(nombre, prog_album_id, error):
+        # Un álbum que falla no corta la corrida: queda anotado y se sigue con el resto
+        nonlocal fallidos
+        fallidos += 1
+        print(f"[ERROR] {proveedores[nombre][0].nombre} - {results[prog_album_id]['album']}: {error}")
+        results[prog_album_id]["errores"].append(f"{nombre}: {error}")
+
+    # Lo que ya está en la caché no se vuelve a buscar
+    pendientes = {nombre: [] for nombre in proveedores}
+    resueltos = []
+    for reg in registros:
+        search_query = f"{reg.banda} - {reg.titulo}"
+        for nombre, (proveedor, *_) in proveedores.items():
+            encontrado, album_id = cache.obtener(nombre, search_query) if reanudar else (False, None)
+            if encontrado:
+                proveedor.desde_cache += 1
+                resueltos.append((nombre, reg.id, album_id))
+            else:
+                pendientes[nombre].append((reg.id, search_query))
+
+    for nombre, (proveedor, *_) in proveedores.items():
+        if pendientes[nombre]:
+            try:
+                proveedor.token.valor()
+            except Exception as e:
+                print(f"[ERROR] {e}; se omiten {len(pendientes[nombre])} búsquedas en {proveedor.nombre}")
+                pendientes[nombre] = []
+
+    # Cada proveedor con su pool de búsquedas; los QR se generan en otro pool
+    # apenas llega cada id, sin esperar al resto del catálogo
+    pools = {nombre: ThreadPoolExecutor(max_workers=BUSQUEDAS_EN_VUELO) for nombre in proveedores}
+    with render_qr.MotorQR(procesos=MAX_RENDER) as motor:
+        renders = {}
+
+        def entregar(nombre, prog_album_id, album_id):
+            _, plantilla, logo, carpeta = proveedores[nombre]
+            results[prog_album_id][f"{nombre}_id"] = album_id
+            if album_id:
+                path = almacen.ruta_qr(carpeta, prog_album_id)
+                try:
+                    renders[motor.enviar(plantilla.format(album_id), logo, path)] = (nombre, prog_album_id)
+                except Exception as e:
+                    fallo(nombre, prog_album_id, e)
+            else:
+                print(f"[WARN] Sin ID de {proveedores[nombre][0].nombre} para {results[prog_album_id]['album']}; no se genera QR.")
+
+        for nombre, prog_album_id, album_id in resueltos:
+            entregar(nombre, prog_album_id, album_id)
+
+        busquedas = {}
+        for nombre, lista in pendientes.items():
+            proveedor = proveedores[nombre][0]
+            for prog_album_id, search_query in lista:
+                busquedas[pools[nombre].submit(proveedor.buscar, search_query)] = (nombre, prog_album_id, search_query)
+
+        for futuro in as_completed(busquedas):
+            nombre, prog_album_id, search_query = busquedas[futuro]
+            try:
+                album_id = futuro.result()
+            except Exception as e:
+                # SinRespuesta, o una respuesta que no es JSON: no se guarda en la caché
+                fallo(nombre, prog_album_id, e)
+                continue
+            url = proveedores[nombre][1].format(album_id) if album_id else None
+            cache.guardar(nombre, search_query, album_id, url)
+            entregar(nombre, prog_album_id, album_id)
+
+        for futuro in as_completed(renders):
+            nombre, prog_album_id = renders[futuro]
+            try:
+                results[prog_album_id][f"{nombre}_path"] = futuro.result()
+            except Exception as e:
+                fallo(nombre, prog_album_id, e)
+    print(f"[INFO] QR: {motor.generados} generados, {motor.omitidos} sin cambios"
+          + (f", {fallidos} con error" if fallidos else ""))
+
+    for pool in pools.values():
+        pool.shutdown()
+    cache.cerrar()
+
+    duracion = time.perf_counter() - inicio
+    resumen = ", ".join(f"{p.nombre}: {p.desde_cache} de caché, {p.peticiones} peticiones, "
+                        f"{p.limitadas} limitadas, {p.token.renovaciones} tokens"
+                        for p, *_ in proveedores.values())
+    print(f"\n✅ Procesamiento finalizado: {len(registros)} álbumes en {duracion:.1f}s ({resumen})")
+    return list(results.values())
 
 # ---------------------------
 # Ejecución principal
 # ---------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QR de Spotify y Tidal para cada álbum")
+    parser.add_argument("--json", default="progarchives_albums_full_actualizado.json")
+    parser.add_argument("--refrescar", action="store_true", help="ignorar la caché y volver a buscar todo")
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args()
+    metricas.iniciar("qr", args)
+
     print("[INFO] Cargando archivo JSON...")
-    with open("progarchives_albums_full_actualizado.json", "r", encoding="utf-8") as f:
-        json_data = json.load(f)
+    json_data = modelo.cargar(args.json)  # sin biografías ni reseñas: solo hacen falta títulos e ids
 
-    resultado = procesar_albums(json_data)
+    resultado = procesar_albums(json_data, reanudar=not args.refrescar)
 
     for r in resultado:
         print("======================================")
@@ -249,3 +517,7 @@ if __name__ == "__main__":
         print(f"Álbum: {r['album']}")
         print(f"  🎧 Spotify → {r['spotify_path']}")
         print(f"  📀 Tidal   → {r['tidal_path']}")
+        for error in r["errores"]:
+            print(f"  ❌ {error}")
+
+    metricas.finalizar()
@@ -0,0 +1,273 @@
+import os
+import sys
+import html
+import json
+import math
+import time
+import hashlib
+import argparse
+import mimetypes
+import threading
+import multiprocessing
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from PIL import Image
+import almacen
+import cliente_http
+import fixbio
+import libro
+
+# Configuración
+ENTRADA = "progarchives_albums_full_actualizado.json"
+CARPETA = "imagenes"
+MANIFIESTO = "indice.json"
+DESCARGAS_EN_VUELO = 8
+MAX_PROCESOS = max(1, (os.cpu_count() or 2) - 1)
+# Variante -> (dpi, calidad JPEG). El tamaño en puntos sale de la caja que ocupa en libro.py
+VARIANTES = {"impresion": (300, 90), "vista": (96, 80)}
+CAJAS = {"portada": (libro.LADO_PORTADA, libro.LADO_PORTADA), "foto": (libro.FOTO_ANCHO, libro.FOTO_ALTO)}
+EXTENSIONES = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+# ---------------------------
+# Imágenes locales del libro
+# ---------------------------
+# Las carátulas (cover_url) y las fotos de banda (biography.photo_url) se bajan
+# una vez, en paralelo, y se guardan por contenido:
+#   imagenes/originales/ab/<sha256>.jpg         lo que devolvió el sitio
+#   imagenes/impresion/<sha256>-<ancho>x<alto>.jpg   al tamaño de su caja a 300 dpi
+#   imagenes/vista/<sha256>-<ancho>x<alto>.jpg       a 96 dpi, para revisar en pantalla
+# indice.json guarda URL -> original y variantes. Una URL que ya está en el índice
+# no se vuelve a bajar, dos URLs con el mismo contenido comparten archivos y las
+# variantes se calculan en un pool de procesos apenas llega cada original.
+# libro.py --imagenes y --html (para los libros HTML ya armados) usan las copias
+# locales: renderizar e imprimir ya no necesitan red.
+
+
+def urls_del_dataset(datos):
+    """URL -> "portada" o "foto" para cada imagen que usa el libro."""
+    urls = {}
+    for info in datos.values():
+        foto = libro.url_foto(info.get("biography") or {})
+        if foto:
+            urls.setdefault(foto, "foto")
+        for album in info.get("albums", []):
+            if album.get("cover_url"):
+                urls.setdefault(album["cover_url"], "portada")
+    return urls
+
+
+def _px(puntos, dpi):
+    return math.ceil(puntos * dpi / 72)
+
+
+def generar_variante(origen, destino, ancho, alto, dpi, calidad):
+    """Reduce `origen` para que entre en ancho x alto px y lo guarda como JPEG (corre en el pool)."""
+    if os.path.exists(destino):
+        return destino
+    with Image.open(origen) as img:
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            fondo = Image.new("RGB", img.size, "white")
+            fondo.paste(img, mask=img.split()[3])
+            img = fondo
+        else:
+            img = img.convert("RGB")
+        img.thumbnail((ancho, alto), Image.LANCZOS)  # nunca agranda
+        tmp = destino + ".tmp"
+        img.save(tmp, "JPEG", quality=calidad, optimize=True, dpi=(dpi, dpi))
+    os.replace(tmp, destino)
+    return destino
+
+
+class CacheImagenes:
+    def __init__(self, carpeta=CARPETA, cliente=None):
+        self.carpeta = carpeta
+        self.cliente = cliente or cliente_http.cliente
+        self.ruta_manifiesto = os.path.join(carpeta, MANIFIESTO)
+        self.indice = {}
+        if os.path.exists(self.ruta_manifiesto):
+            with open(self.ruta_manifiesto, "r", encoding="utf-8") as f:
+                self.indice = json.load(f)
+        self._lock = threading.Lock()
+        self.descargadas = 0
+        self.en_cache = 0
+        self.repetidas = 0
+        self.fallidas = []
+        self.variantes = 0
+        self.bytes = 0
+
+    def _ruta(self, relativa):
+        return os.path.join(self.carpeta, relativa)
+
+    def locales(self, variante="impresion"):
+        """URL -> archivo local de la variante, para libro.py y fixbio."""
+        return {url: self._ruta(entrada["variantes"][variante]).replace(os.sep, "/")
+                for url, entrada in self.indice.items() if variante in entrada.get("variantes", {})}
+
+    # ---------------------------
+    # Descarga
+    # ---------------------------
+    def _extension(self, url, tipo_contenido):
+        ext = os.path.splitext(urllib.parse.urlsplit(url).path)[1].lower()
+        if ext in EXTENSIONES:
+            return ext
+        ext = mimetypes.guess_extension((tipo_contenido or "").split(";")[0].strip())
+        return ext if ext in EXTENSIONES else ".img"
+
+    def _descargar(self, url):
+        res = self.cliente.get(url)
+        if res.status_code != 200 or not res.content:
+            raise ValueError(f"HTTP {res.status_code}")
+        sha = hashlib.sha256(res.content).hexdigest()
+        relativa = os.path.join("originales", sha[:2], sha + self._extension(url, res.headers.get("Content-Type")))
+        ruta = self._ruta(relativa)
+        with self._lock:
+            self.bytes += len(res.content)
+            if os.path.exists(ruta):
+                self.repetidas += 1  # otra URL ya trajo este mismo contenido
+                return sha, relativa
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        tmp = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(res.content)
+        os.replace(tmp, ruta)
+        return sha, relativa
+
+    def _variantes(self, sha, tipo):
+        """Variante -> (ruta relativa, ancho px, alto px, dpi, calidad)."""
+        ancho, alto = CAJAS[tipo]
+        salida = {}
+        for variante, (dpi, calidad) in VARIANTES.items():
+            w, h = _px(ancho, dpi), _px(alto, dpi)
+            salida[variante] = (os.path.join(variante, f"{sha}-{w}x{h}.jpg"), w, h, dpi, calidad)
+        return salida
+
+    def _al_dia(self, url, tipo):
+        entrada = self.indice.get(url)
+        if not entrada or not os.path.exists(self._ruta(entrada["original"])):
+            return False
+        esperadas = {v: r for v, (r, *_) in self._variantes(entrada["sha"], tipo).items()}
+        return entrada.get("variantes") == esperadas and all(os.path.exists(self._ruta(r)) for r in esperadas.values())
+
+    def actualizar(self, urls, procesos=MAX_PROCESOS):
+        """Baja lo que falta de `urls` (URL -> tipo) y genera sus variantes."""
+        faltan = {}
+        for url, tipo in urls.items():
+            if self._al_dia(url, tipo):
+                self.en_cache += 1
+            else:
+                faltan[url] = tipo
+        if not faltan:
+            return
+        for variante in VARIANTES:
+            os.makedirs(self._ruta(variante), exist_ok=True)
+
+        pool = None
+        trabajos = {}  # ruta de la variante -> Future (una sola vez por contenido y tamaño)
+        try:
+            with ThreadPoolExecutor(max_workers=DESCARGAS_EN_VUELO) as red:
+                descargas = {}
+                for url, tipo in faltan.items():
+                    entrada = self.indice.get(url)
+                    if entrada and os.path.exists(self._ruta(entrada["original"])):
+                        # Ya bajada; solo faltan variantes (p. ej. cambió el tamaño de la caja)
+                        listo = red.submit(lambda e=entrada: (e["sha"], e["original"]))
+                    else:
+                        listo = red.submit(self._descargar, url)
+                    descargas[listo] = url
+
+                for futuro in as_completed(descargas):
+                    url = descargas[futuro]
+                    try:
+                        sha, original = futuro.result()
+                    except Exception as e:
+                        self.fallidas.append((url, str(e)))
+                        continue
+                    if url not in self.indice or self.indice[url]["sha"] != sha:
+                        self.descargadas += 1
+                    variantes = self._variantes(sha, faltan[url])
+                    for relativa, w, h, dpi, calidad in variantes.values():
+                        if relativa not in trabajos and not os.path.exists(self._ruta(relativa)):
+                            if pool is None:
+                                pool = ProcessPoolExecutor(max_workers=procesos,
+                                                           mp_context=multiprocessing.get_context("spawn"))
+                            trabajos[relativa] = pool.submit(generar_variante, self._ruta(original),
+                                                             self._ruta(relativa), w, h, dpi, calidad)
+                    self.indice[url] = {"sha": sha, "original": original,
+                                        "variantes": {v: r for v, (r, *_) in variantes.items()}}
+            for relativa, futuro in trabajos.items():
+                try:
+                    futuro.result()
+                    self.variantes += 1
+                except Exception as e:
+                    # Imagen que Pillow no puede abrir: se saca del índice para reintentar
+                    for url in [u for u, en in self.indice.items() if relativa in en["variantes"].values()]:
+                        self.fallidas.append((url, f"variante: {e}"))
+                        del self.indice[url]
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            self.guardar()
+
+    def guardar(self):
+        os.makedirs(self.carpeta, exist_ok=True)
+        almacen.escribir_json_atomico(self.ruta_manifiesto, self.indice)
+
+
+# ---------------------------
+# Libros HTML ya armados
+# ---------------------------
+class ReglaImagenes(fixbio.Regla):
+    """Regla de fixbio: <img src="URL del sitio"> pasa a la copia local."""
+
+    def __init__(self, locales):
+        self.locales = locales
+        self.cambiadas = 0
+
+    def token(self, t):
+        if t.tipo in ("inicio", "vacio") and t.tag == "img":
+            src = dict(t.attrs).get("src")
+            if src in self.locales:
+                crudo = t.crudo
+                for forma in {src, html.escape(src)}:  # el atributo puede venir con &amp;
+                    crudo = crudo.replace(f'"{forma}"', f'"{html.escape(self.locales[src])}"', 1)
+                t = fixbio.Token(t.tipo, t.tag, [(k, self.locales[src] if k == "src" else v) for k, v in t.attrs], crudo)
+                self.cambiadas += 1
+        self.emitir(t)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Baja carátulas y fotos de banda a un caché local con variantes para imprimir")
+    parser.add_argument("json", nargs="?", default=ENTRADA)
+    parser.add_argument("--carpeta", default=CARPETA)
+    parser.add_argument("--html", nargs=2, metavar=("ENTRADA", "SALIDA"),
+                        help="solo reescribir las <img> de un libro HTML ya armado con las copias locales")
+    parser.add_argument("--variante", choices=list(VARIANTES), default="impresion")
+    args = parser.parse_args(argv)
+
+    cache = CacheImagenes(args.carpeta)
+    if args.html:
+        regla = ReglaImagenes(cache.locales(args.variante))
+        with open(args.html[0], "r", encoding="utf-8") as f, open(args.html[1], "w", encoding="utf-8") as out:
+            fixbio.procesar(f, out, [regla])
+        print(f"📁 {args.html[0]} -> {args.html[1]}: {regla.cambiadas} imágenes locales")
+        return 0
+
+    if not os.path.exists(args.json):
+        print(f"❌ No existe {args.json}")
+        return 1
+    inicio = time.perf_counter()
+    urls = urls_del_dataset(almacen.cargar(args.json))
+    cache.actualizar(urls)
+    print(f"🖼 {len(urls)} imágenes: {cache.descargadas} descargadas ({cache.bytes / 1e6:.1f} MB), "
+          f"{cache.en_cache} ya en caché, {cache.repetidas} repetidas por contenido, "
+          f"{cache.variantes} variantes generadas en {time.perf_counter() - inicio:.1f}s")
+    for url, error in cache.fallidas[:10]:
+        print(f"⚠️ {url}: {error}")
+    if len(cache.fallidas) > 10:
+        print(f"⚠️ ... y {len(cache.fallidas) - 10} más (se reintentan en la próxima corrida)")
+    return 0 if not cache.fallidas else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import argparse
+import bisect
+import itertools
+import json
+import sys
+import time
+from almacen import id_progarchives
+
+# ---------------------------
+# Índice en memoria sobre el dataset
+# ---------------------------
+# Se arma una sola vez al cargar y responde sin recorrer el JSON:
+#   id de álbum, id de artista, (banda, título)  → diccionarios
+#   año, rank, rating                            → listas ordenadas + bisect
+# Los registros apuntan a los mismos dicts del dataset (no hay copias).
+# Almacen lo mantiene al día en cada guardar_album / guardar_banda.
+
+
+def _num(valor, tipo=float):
+    # El extractor ya los guarda como números; datasets viejos pueden traerlos como strings ("1,234")
+    if valor in (None, ""):
+        return None
+    try:
+        return tipo(str(valor).replace(",", ""))
+    except ValueError:
+        return None
+
+
+class Registro:
+    __slots__ = ("id", "banda", "artist_id", "album", "anio", "rank", "rating")
+
+    def __init__(self, id_album, banda, artist_id, album):
+        self.id = id_album
+        self.banda = banda
+        self.artist_id = artist_id
+        self.album = album
+        self.anio = _num(album.get("year"), int)
+        self.rank = _num(album.get("rank"), int)
+        self.rating = _num(album.get("average_rating"))
+
+    @property
+    def titulo(self):
+        return self.album.get("title")
+
+    def __repr__(self):
+        return f"<{self.id} {self.banda} - {self.titulo} ({self.anio}) #{self.rank} ★{self.rating}>"
+
+
+class _Orden:
+    """Lista ordenada de (valor, id) para consultas por rango; los ids sin valor van aparte, ordenados."""
+
+    def __init__(self):
+        self.claves = []
+        self.sin_valor = []
+
+    def agregar(self, valor, id_album):
+        if valor is None:
+            bisect.insort(self.sin_valor, id_album)
+        else:
+            bisect.insort(self.claves, (valor, id_album))
+
+    def quitar(self, valor, id_album):
+        lista, clave = (self.sin_valor, id_album) if valor is None else (self.claves, (valor, id_album))
+        i = bisect.bisect_left(lista, clave)
+        if i < len(lista) and lista[i] == clave:
+            del lista[i]
+
+    def rango(self, desde=None, hasta=None):
+        # Los ids son strings: "" es menor y "￿" mayor que cualquiera
+        i = 0 if desde is None else bisect.bisect_left(self.claves, (desde, ""))
+        j = len(self.claves) if hasta is None else bisect.bisect_right(self.claves, (hasta, "￿"))
+        return [id_album for _, id_album in self.claves[i:j]]
+
+
+class IndiceAlbums:
+    def __init__(self, datos=None):
+        self.por_id = {}
+        self.por_artista = {}
+        self.por_banda_titulo = {}
+        self.por_anio = _Orden()
+        self.por_rank = _Orden()
+        self.por_rating = _Orden()
+        for banda, info in (datos or {}).items():
+            for album in info.get("albums", []):
+                self.agregar(banda, info, album)
+
+    # ---------------------------
+    # Mantenimiento
+    # ---------------------------
+    def agregar(self, banda, info_banda, album):
+        """Inserta o reemplaza un álbum (por id de ProgArchives) y sus índices secundarios."""
+        id_album = id_progarchives(album.get("album_url")) or f"{banda}/{album.get('title')}"
+        self.quitar(id_album)
+        reg = Registro(id_album, banda, id_progarchives(info_banda.get("band_url")), album)
+        self.por_id[id_album] = reg
+        self.por_artista.setdefault(reg.artist_id, set()).add(id_album)
+        self.por_banda_titulo[(banda, reg.titulo)] = id_album
+        self.por_anio.agregar(reg.anio, id_album)
+        self.por_rank.agregar(reg.rank, id_album)
+        self.por_rating.agregar(reg.rating, id_album)
+        return reg
+
+    def quitar(self, id_album):
+        reg = self.por_id.pop(id_album, None)
+        if reg is None:
+            return
+        self.por_artista.get(reg.artist_id, set()).discard(id_album)
+        if self.por_banda_titulo.get((reg.banda, reg.titulo)) == id_album:
+            del self.por_banda_titulo[(reg.banda, reg.titulo)]
+        self.por_anio.quitar(reg.anio, id_album)
+        self.por_rank.quitar(reg.rank, id_album)
+        self.por_rating.quitar(reg.rating, id_album)
+
+    def actualizar_banda(self, banda, info_banda):
+        for album in info_banda.get("albums", []):
+            self.agregar(banda, info_banda, album)
+
+    # ---------------------------
+    # Consultas
+    # ---------------------------
+    def album(self, id_album):
+        return self.por_id.get(str(id_album))
+
+    def de_artista(self, artist_id):
+        return [self.por_id[i] for i in self.por_artista.get(str(artist_id), ())]
+
+    def buscar(self, banda, titulo):
+        id_album = self.por_banda_titulo.get((banda, titulo))
+        return self.por_id.get(id_album) if id_album else None
+
+    def todos(self):
+        return list(self.por_id.values())
+
+    def consultar(self, anio_desde=None, anio_hasta=None, rating_min=None, rating_max=None,
+                  rank_desde=None, rank_hasta=None, orden="rank", limite=None):
+        """
+        Álbumes que cumplen todos los filtros (rangos inclusivos), ordenados por
+        "rank", "rating" (mayor primero) o "anio".
+        """
+        candidatos = None
+        for orden_idx, desde, hasta in ((self.por_anio, anio_desde, anio_hasta),
+                                        (self.por_rating, rating_min, rating_max),
+                                        (self.por_rank, rank_desde, rank_hasta)):
+            if desde is None and hasta is None:
+                continue
+            ids = set(orden_idx.rango(desde, hasta))
+            candidatos = ids if candidatos is None else candidatos & ids
+            if not candidatos:
+                return []
+
+        indice_orden = {"rank": self.por_rank, "rating": self.por_rating, "anio": self.por_anio}[orden]
+        mayor_primero = orden == "rating"
+        # Los álbumes sin valor para el orden van al final
+        if candidatos is None:
+            claves = reversed(indice_orden.claves) if mayor_primero else indice_orden.claves
+            ids = itertools.chain((i for _, i in claves), indice_orden.sin_valor)
+        else:
+            # Solo se ordenan los candidatos, no el índice entero
+            con_valor = sorted(((getattr(self.por_id[i], orden), i) for i in candidatos
+                                if getattr(self.por_id[i], orden) is not None), reverse=mayor_primero)
+            sin_valor = sorted(i for i in candidatos if getattr(self.por_id[i], orden) is None)
+            ids = itertools.chain((i for _, i in con_valor), sin_valor)
+        return [self.por_id[i] for i in itertools.islice(ids, limite or None)]
+
+    def titulos(self):
+        """Proyección banda → títulos (el formato de solotitulos.json)."""
+        por_banda = {}
+        for reg in self.por_id.values():
+            por_banda.setdefault(reg.banda, []).append(reg.titulo)
+        return [{"banda": banda, "albumes": albumes} for banda, albumes in por_banda.items()]
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def _rango(texto, tipo):
+    desde, _, hasta = texto.partition("-")
+    return tipo(desde) if desde else None, tipo(hasta) if hasta else None
+
+
+def main(argv=None):
+    import modelo
+
+    parser = argparse.ArgumentParser(description="Consultas sobre el dataset de álbumes")
+    parser.add_argument("--json", default="progarchives_albums_full_actualizado.json")
+    parser.add_argument("--anios", help="rango de años, ej. 1970-1975")
+    parser.add_argument("--rating", help="rango de rating, ej. 4.3- (inclusivo)")
+    parser.add_argument("--rank", help="rango de ranking, ej. 1-50")
+    parser.add_argument("--orden", choices=["rank", "rating", "anio"], default="rank")
+    parser.add_argument("--limite", type=int)
+    parser.add_argument("--id", help="id de álbum de ProgArchives")
+    parser.add_argument("--artista", help="id de artista de ProgArchives")
+    parser.add_argument("--titulos", action="store_true", help="imprimir la proyección de solotitulos.json")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    indice = IndiceAlbums(modelo.cargar(args.json))
+    t1 = time.perf_counter()
+
+    if args.titulos:
+        json.dump(indice.titulos(), sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+
+    t2 = time.perf_counter()
+    if args.id:
+        resultado = [r for r in [indice.album(args.id)] if r]
+    elif args.artista:
+        resultado = indice.de_artista(args.artista)
+    else:
+        anios = _rango(args.anios, int) if args.anios else (None, None)
+        rating = _rango(args.rating, float) if args.rating else (None, None)
+        rank = _rango(args.rank, int) if args.rank else (None, None)
+        resultado = indice.consultar(*anios, *rating, *rank, orden=args.orden, limite=args.limite)
+    t3 = time.perf_counter()
+
+    for r in resultado:
+        print(f"#{r.rank or '-':>4}  {r.anio or '----'}  {r.rating or '-':>4}  {r.banda} - {r.titulo}")
+    print(f"\n{len(resultado)} álbumes · índice armado en {(t1 - t0) * 1000:.0f} ms · consulta en {(t3 - t2) * 1e6:.0f} µs",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import os
+import re
+import sys
+import time
+import argparse
+import unicodedata
+from collections import Counter, defaultdict
+import almacen
+import libro
+
+# Configuración
+ENTRADA = "progarchives_albums_full_actualizado.json"
+SALIDA = "indice_libro.html"
+MAX_PALABRAS_SIN_ROL = 6  # "- The London Symphony Orchestra" sí, "- 15 seconds of track 6 performed by..." no
+
+# ---------------------------
+# Índice del libro
+# ---------------------------
+# js/createIndex.js armaba el índice en el navegador mientras PagedJS paginaba:
+# juntaba las claves de cada <span data-book-index>, las deduplicaba con
+# filter(indexOf) (cuadrático) y ordenaba pasando a minúsculas en cada
+# comparación. Acá sale del dataset: bandas, álbumes y músicos (del lineup de
+# cada álbum), deduplicados con dicts/sets, ordenados una sola vez con una clave
+# de orden alfabético español, y con las páginas que ya calculó libro.py. Cada
+# entrada enlaza al id de la cabecera de la banda o el álbum.
+#
+#   python libro.py --indice           # el índice al final del mismo libro
+#   python indice_libro.py             # el índice en un HTML aparte
+
+PUNTUACION_INICIAL = "\"'¡¿«“‘([-–—.… "
+ENTRE_PARENTESIS = re.compile(r"\s*\([^)]*\)\s*$")
+ESPACIOS = re.compile(r"\s+")
+SIN_DESCOMPOSICION = str.maketrans({"ø": "o", "æ": "ae", "œ": "oe", "ð": "d", "þ": "th", "ł": "l", "đ": "d"})
+
+
+def clave_es(texto):
+    """Orden alfabético español: sin mayúsculas ni acentos, "ñ" entre "n" y "o"; a igual base, sin acento primero."""
+    minusculas = texto.casefold().replace("ñ", "n\x7f")
+    base = "".join(c for c in unicodedata.normalize("NFD", minusculas) if not unicodedata.combining(c))
+    base = base.translate(SIN_DESCOMPOSICION)
+    return base.lstrip(PUNTUACION_INICIAL), minusculas, texto
+
+
+def letra(clave):
+    base = clave[0]
+    if base.startswith("n\x7f"):
+        return "Ñ"
+    return base[0].upper() if base[:1].isalpha() else "#"
+
+
+# ---------------------------
+# Músicos
+# ---------------------------
+def musicos(lineup):
+    """(nombre, roles) de cada renglón "- Nombre / roles" del lineup."""
+    for renglon in (lineup or "").split("\n"):
+        renglon = renglon.strip()
+        if not renglon.startswith("-"):
+            continue  # "With:", "Tracks 1-3:", notas
+        nombre, barra, roles = renglon.lstrip("-– ").partition("/")
+        nombre = ESPACIOS.sub(" ", ENTRE_PARENTESIS.sub("", nombre)).strip(" ,;:")
+        if not nombre or nombre[0].isdigit():
+            continue
+        if not barra and len(nombre.split()) > MAX_PALABRAS_SIN_ROL:
+            continue
+        # "Mike Altschul, Joel Peskin / woodwinds" son dos; "Harold I. Williams, Jr." es uno
+        partes = [p.strip() for p in nombre.split(",")]
+        if len(partes) > 1 and all(len(p.split()) > 1 for p in partes):
+            for parte in partes:
+                yield parte, roles.strip()
+        else:
+            yield nombre, roles.strip()
+
+
+# ---------------------------
+# Entradas
+# ---------------------------
+def construir(datos):
+    """
+    Secciones del índice: [(título, [(texto, ancla, [(subtexto, ancla), ...]), ...]), ...]
+    ordenadas con clave_es. Un músico que aparece escrito con o sin acentos es uno solo
+    (se muestra la forma más común) y tiene un renglón por álbum.
+    """
+    bandas = []
+    albumes = []
+    formas = defaultdict(Counter)   # clave del músico -> formas escritas
+    apariciones = defaultdict(dict)     # clave del músico -> {ancla del álbum: subtexto}
+    vistos = set()
+    for nombre, info in datos.items():
+        bandas.append((nombre, libro.ancla_banda(nombre), []))
+        for album in info.get("albums", []):
+            ancla = libro.ancla_album(album)
+            titulo = album.get("title") or ""
+            if ancla not in vistos:  # dos ediciones con el mismo título tienen anclas distintas
+                vistos.add(ancla)
+                albumes.append((f"{titulo} ({nombre})", ancla, []))
+            for musico, _ in musicos(album.get("lineup")):
+                clave = clave_es(musico)[0]
+                formas[clave][musico] += 1
+                apariciones[clave].setdefault(ancla, f"{titulo} ({nombre})")
+
+    lista_musicos = [(formas[c].most_common(1)[0][0], None,
+                      sorted(((sub, ancla) for ancla, sub in apariciones[c].items()), key=lambda x: clave_es(x[0])))
+                     for c in formas]
+    return [(titulo, sorted(entradas, key=lambda x: clave_es(x[0])))
+            for titulo, entradas in (("Bandas", bandas), ("Álbumes", albumes), ("Músicos", lista_musicos))]
+
+
+# ---------------------------
+# Páginas
+# ---------------------------
+def _enlace(ancla, anclas, primera, destino):
+    pagina = anclas.get(ancla)
+    # Sin número conocido el <a> queda vacío: lo completa el navegador (target-counter)
+    texto = "" if pagina is None else str(primera + pagina)
+    return f'<a href="{destino}#{ancla}">{texto}</a>', texto
+
+
+def paginas_indice(datos, anclas, primera=1, destino=""):
+    """Páginas del índice en tres columnas, con el formato de libro.py (generador)."""
+    paginas = []
+    ancho = libro.ANCHO_COLUMNA - libro.SANGRIA  # los renglones que siguen van con sangría
+    interlinea = libro.INDICE.tam * libro.INDICE.interlinea
+    alto_titulo = libro.alto_texto("Índice", libro.ANCHO, libro.INDICE_TITULO)
+
+    def nueva_columna():
+        pagina = paginas[-1] if paginas else None
+        if pagina is None or len(pagina.columnas) == libro.COLUMNAS:
+            pagina = libro.Caja(libro.ANCHO, libro.ALTO)
+            if not paginas:
+                pagina.html.append('<h1 class="indice-titulo">Índice</h1>')
+                pagina.y = alto_titulo
+            pagina.alto_columnas = pagina.alto - pagina.y
+            pagina.y = pagina.alto
+            paginas.append(pagina)
+        caja = libro.Caja(libro.ANCHO_COLUMNA, pagina.alto_columnas)
+        pagina.columnas.append(caja)
+        return caja
+
+    flujo = libro.Flujo(nueva_columna)
+    for seccion, entradas in construir(datos):
+        alto_seccion = libro.alto_texto(seccion, libro.ANCHO_COLUMNA, libro.SUBTITULO)
+        flujo.bloque(f'<h3>{libro.e(seccion)}</h3>', alto_seccion, con_lo_que_sigue=3 * interlinea)
+        anterior = None
+        for texto, ancla, subentradas in entradas:
+            inicial = letra(clave_es(texto))
+            if inicial != anterior:
+                flujo.bloque(f"<h4>{inicial}</h4>", libro.alto_texto(inicial, ancho, libro.INDICE_LETRA),
+                             con_lo_que_sigue=2 * interlinea)
+                anterior = inicial
+            enlace, numero = _enlace(ancla, anclas, primera, destino) if ancla else ("", "")
+            flujo.bloque(f"<p>{libro.e(texto)} {enlace}</p>",
+                         libro.alto_texto(f"{texto} {numero}", ancho, libro.INDICE),
+                         con_lo_que_sigue=interlinea if subentradas else 0)
+            for subtexto, subancla in subentradas:
+                enlace, numero = _enlace(subancla, anclas, primera, destino)
+                flujo.bloque(f'<p class="sub">{libro.e(subtexto)} {enlace}</p>',
+                             libro.alto_texto(f"{subtexto} {numero}", ancho - libro.SANGRIA, libro.INDICE))
+    for pagina in paginas:
+        yield f'<div class="indice">{libro._pagina_html(pagina)}</div>'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice de bandas, álbumes y músicos del libro")
+    parser.add_argument("entrada", nargs="?", default=ENTRADA)
+    parser.add_argument("-o", "--salida", default=SALIDA)
+    parser.add_argument("--libro", default=libro.SALIDA, help="HTML del libro al que apuntan los enlaces")
+    parser.add_argument("--qr", default=libro.QR_DIR, help="la misma carpeta de QR con la que se armó el libro")
+    parser.add_argument("--primera-pagina", type=int, default=1, help="primera página del libro")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.entrada):
+        print(f"❌ No existe {args.entrada}")
+        return 1
+    inicio = time.perf_counter()
+    datos = almacen.cargar(args.entrada)
+    anclas = {}
+    total = sum(1 for _ in libro.paginas_libro(datos, args.qr, anclas=anclas))  # solo para saber las páginas
+    primera_indice = args.primera_pagina + total
+    paginas = libro.escribir_libro(paginas_indice(datos, anclas, args.primera_pagina, args.libro),
+                                   args.salida, primera_indice, titulo="Índice")
+    entradas = {titulo: len(lista) for titulo, lista in construir(datos)}
+    print(f"📇 {args.salida}: {entradas['Bandas']} bandas, {entradas['Álbumes']} álbumes, "
+          f"{entradas['Músicos']} músicos en {paginas} páginas ({primera_indice}-{primera_indice + paginas - 1}) "
+          f"en {time.perf_counter() - inicio:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
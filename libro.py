@@ -0,0 +1,616 @@
+import os
+import re
+import sys
+import html
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import itertools
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache, partial
+import almacen
+
+# Configuración
+ENTRADA = "progarchives_albums_full_actualizado.json"
+SALIDA = "libro_paginado.html"
+QR_DIR = "qr"
+SITIO = "https://www.progarchives.com/"  # biography.photo_url es relativa a este sitio
+CACHE_LIBRO = "cache_libro.sqlite"
+VIGENCIA_CACHE = 30 * 24 * 3600  # fragmentos que ninguna construcción usó en 30 días se borran
+
+# ---------------------------
+# Libro paginado en Python
+# ---------------------------
+# libro.html pagina en el navegador: mide cada bloque de reseñas insertando un
+# div oculto y forzando layout, una vez por bloque y con todos los anteriores
+# de la página (trabajo cuadrático por álbum). Acá los cortes se calculan antes
+# con métricas de fuente: cada párrafo se parte en renglones con los anchos de
+# Times y se reparte en cajas de alto fijo (el cuerpo de la página o cada una
+# de las tres columnas de reseñas). El HTML que sale ya viene en páginas y
+# columnas explícitas; el navegador solo las muestra.
+#
+# El CSS se genera con las mismas medidas que usa el cálculo, y la fuente es
+# Times o una de métricas idénticas (Liberation Serif, Nimbus Roman).
+
+# ---------------------------
+# Geometría (en puntos)
+# ---------------------------
+CM = 72 / 2.54
+PAGINA_ANCHO, PAGINA_ALTO = 612, 792  # carta, como el @page de libro3.html
+MARGEN_ARRIBA = MARGEN_ABAJO = 1.5 * CM
+MARGEN_LOMO = 2.5 * CM    # del lado de la encuadernación
+MARGEN_AFUERA = 1.5 * CM
+ANCHO = PAGINA_ANCHO - MARGEN_LOMO - MARGEN_AFUERA
+ALTO = (PAGINA_ALTO - MARGEN_ARRIBA - MARGEN_ABAJO) * 0.97  # 3% de holgura para redondeos del navegador
+SEPARACION = 12           # 1rem: entre columnas y alrededor de las imágenes
+COLUMNAS = 3
+ANCHO_COLUMNA = (ANCHO - SEPARACION * (COLUMNAS - 1)) / COLUMNAS
+LADO_PORTADA = (ANCHO - SEPARACION) / 2
+FOTO_ANCHO = ANCHO / 2
+FOTO_ALTO = FOTO_ANCHO * 0.75
+QR_ALTO = 75              # 100px
+SEPARADOR_ALTO = 25       # <hr> entre reseñas con sus márgenes
+MINIMO_COLUMNAS = 4       # renglones: con menos espacio las reseñas empiezan en la página siguiente
+FACTOR_NEGRITA = 1.08     # Times-Bold es ~8% más ancha que Times-Roman
+
+Estilo = namedtuple("Estilo", "selector tam interlinea negrita antes despues")
+BIO = Estilo(".bio-p", 10, 1.4, False, 0, 7)
+CUERPO = Estilo(".columna p", 10, 1.4, False, 0, 10)
+AUTOR = Estilo(".columna p.autor", 10, 1.4, True, 0, 2)
+BANDA = Estilo("h1.band-header", 24, 1.2, True, 0, 6)
+PAIS = Estilo("p.country", 10, 1.4, False, 0, 10)
+TITULO = Estilo("h2.album-title", 16, 1.2, True, 0, 4)
+TIPO = Estilo("p.tipo", 10, 1.4, False, 0, 8)
+SUBTITULO = Estilo("h3", 11, 1.3, True, 8, 4)
+PRE = Estilo(".tracklist, .lineup", 10, 1.4, False, 0, 8)
+INDICE_TITULO = Estilo("h1.indice-titulo", 20, 1.2, True, 0, 10)
+INDICE_LETRA = Estilo(".indice h4", 11, 1.3, True, 6, 2)
+INDICE = Estilo(".indice p", 9, 1.3, False, 0, 1)
+SANGRIA = 15              # 1.5em, primer renglón de cada párrafo de reseña
+
+# Times-Roman (AFM de Adobe), milésimas de em para ASCII 32..126
+_ANCHOS_ASCII = (
+    250, 333, 408, 500, 500, 833, 778, 180, 333, 333, 500, 564, 250, 333, 250, 278,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278, 564, 564, 564, 444, 921,
+    722, 667, 667, 722, 611, 556, 722, 722, 333, 389, 722, 611, 889,
+    722, 722, 556, 722, 667, 556, 611, 722, 722, 944, 722, 722, 611,
+    333, 278, 333, 469, 500, 333,
+    444, 500, 444, 500, 444, 333, 500, 500, 278, 278, 500, 278, 778,
+    500, 500, 500, 500, 333, 389, 278, 500, 500, 722, 500, 500, 444,
+    480, 200, 480, 541,
+)
+_ANCHOS_OTROS = {"‘": 333, "’": 333, "“": 444, "”": 444, "–": 500, "—": 1000, "…": 1000,
+                 "«": 500, "»": 500, "¿": 444, "¡": 333, "°": 400, "º": 310, "ª": 276, "·": 250}
+
+
+@lru_cache(maxsize=None)
+def _ancho_caracter(c):
+    if " " <= c <= "~":
+        return _ANCHOS_ASCII[ord(c) - 32]
+    if c in _ANCHOS_OTROS:
+        return _ANCHOS_OTROS[c]
+    base = unicodedata.normalize("NFD", c)[0]  # "é" mide lo que "e"
+    if " " <= base <= "~":
+        return _ANCHOS_ASCII[ord(base) - 32]
+    return 1000 if unicodedata.east_asian_width(c) in "WF" else 500
+
+
+@lru_cache(maxsize=1 << 16)
+def ancho_palabra(palabra):
+    """En milésimas de em."""
+    return sum(_ancho_caracter(c) for c in palabra)
+
+
+# ---------------------------
+# Renglones
+# ---------------------------
+SALTO = None  # marca de salto de línea forzado dentro de un párrafo
+
+
+def tokens(texto):
+    """Palabras del párrafo, con SALTO donde el texto tenía "\\n"."""
+    salida = []
+    for i, linea in enumerate(texto.split("\n")):
+        if i:
+            salida.append(SALTO)
+        salida.extend(linea.split())
+    return salida
+
+
+def cortar_renglon(palabras, i, ancho, estilo):
+    """Índice donde termina el renglón que empieza en i (corte voraz, como el navegador)."""
+    escala = estilo.tam / 1000 * (FACTOR_NEGRITA if estilo.negrita else 1)
+    espacio = _ANCHOS_ASCII[0]
+    limite = ancho / escala
+    usado = -espacio
+    j = i
+    while j < len(palabras):
+        palabra = palabras[j]
+        if palabra is SALTO:
+            return j + 1
+        usado += espacio + ancho_palabra(palabra)
+        if usado > limite and j > i:
+            return j
+        j += 1
+    return j
+
+
+def contar_renglones(texto, ancho, estilo):
+    palabras = tokens(texto)
+    n, i = 0, 0
+    while i < len(palabras):
+        i = cortar_renglon(palabras, i, ancho, estilo)
+        n += 1
+    return max(n, 1)
+
+
+def alto_texto(texto, ancho, estilo):
+    return estilo.antes + contar_renglones(texto, ancho, estilo) * estilo.tam * estilo.interlinea + estilo.despues
+
+
+def _html_tokens(palabras):
+    partes = []
+    for p in palabras:
+        if p is SALTO:
+            partes.append("<br>")
+        else:
+            if partes and partes[-1] != "<br>":
+                partes.append(" ")
+            partes.append(html.escape(p, quote=False))
+    return "".join(partes)
+
+
+# ---------------------------
+# Cajas y flujo
+# ---------------------------
+class Caja:
+    """Un rectángulo que se llena de arriba abajo: el cuerpo de una página o una columna."""
+
+    def __init__(self, ancho, alto, angosta_hasta=0, ancho_angosto=None):
+        self.ancho = ancho
+        self.alto = alto
+        self.angosta_hasta = angosta_hasta  # junto a una imagen flotante los renglones son más cortos
+        self.ancho_angosto = ancho_angosto
+        self.y = 0
+        self.html = []
+        self.columnas = []      # cajas de las columnas de reseñas, debajo del contenido
+        self.alto_columnas = 0
+
+    def ancho_en(self, y):
+        return self.ancho_angosto if y < self.angosta_hasta else self.ancho
+
+
+class Flujo:
+    """Reparte bloques y párrafos en cajas; `nueva_caja` entrega la siguiente cuando una se llena."""
+
+    def __init__(self, nueva_caja):
+        self._nueva_caja = nueva_caja
+        self.caja = nueva_caja()
+
+    def _siguiente(self):
+        self.caja = self._nueva_caja()
+
+    def bloque(self, contenido, alto, con_lo_que_sigue=0):
+        """Bloque que no se parte; `con_lo_que_sigue` es el alto que tiene que entrar junto a él."""
+        if self.caja.y > 0 and self.caja.y + alto + con_lo_que_sigue > self.caja.alto:
+            self._siguiente()
+        self.caja.html.append(contenido)
+        self.caja.y += alto
+
+    def parrafo(self, texto, estilo, clase, sangria=0):
+        """`texto` puede venir ya partido en tokens (la continuación de otro párrafo)."""
+        palabras = tokens(texto) if isinstance(texto, str) else texto
+        interlinea = estilo.tam * estilo.interlinea
+        i = 0
+        while i < len(palabras):
+            caja = self.caja
+            # Sin lugar para al menos dos renglones, el párrafo empieza en la caja siguiente
+            if caja.y > 0 and caja.alto - caja.y < 2 * interlinea:
+                self._siguiente()
+                continue
+            inicio, y = i, caja.y
+            while i < len(palabras) and (y + interlinea <= caja.alto or i == inicio):
+                i = cortar_renglon(palabras, i, caja.ancho_en(y) - (sangria if i == 0 else 0), estilo)
+                y += interlinea
+            clases = [clase]
+            if inicio > 0:
+                clases.append("sigue")   # sin sangría: continúa de la caja anterior
+            if i < len(palabras):
+                clases.append("corta")   # el último renglón se justifica: el párrafo sigue
+            caja.html.append(f'<p class="{" ".join(clases)}">{_html_tokens(palabras[inicio:i])}</p>')
+            caja.y = y + (estilo.despues if i >= len(palabras) else 0)
+            if i < len(palabras):
+                self._siguiente()
+
+
+def parrafos(texto):
+    return [p.strip() for p in re.split(r"\n\s*\n", texto or "") if p.strip()]
+
+
+# ---------------------------
+# Páginas
+# ---------------------------
+def e(texto):
+    return html.escape(str(texto if texto is not None else ""), quote=False)
+
+
+def _slug(texto):
+    sin_acentos = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", sin_acentos.lower()).strip("-")
+
+
+def ancla_banda(nombre):
+    return "banda-" + _slug(nombre)
+
+
+def ancla_album(album):
+    return "album-" + (almacen.id_progarchives(album.get("album_url")) or _slug(album.get("title") or ""))
+
+
+def url_foto(bio):
+    return SITIO + bio["photo_url"] if bio.get("photo_url") else None
+
+
+def _src(url, imagenes):
+    # Con el caché de imagenes.py, la copia local en lugar de la URL del sitio
+    return (imagenes or {}).get(url, url)
+
+
+def paginas_banda(nombre, info, imagenes=None):
+    """Portada de la banda con su biografía; devuelve el HTML del cuerpo de cada página."""
+    bio = info.get("biography") or {}
+    cabecera = (f'<h1 class="band-header" id="{ancla_banda(nombre)}">{e(nombre)}</h1>\n'
+                f'<p class="country">{e(bio.get("country"))}</p>\n')
+    alto_cabecera = alto_texto(nombre.upper(), ANCHO, BANDA) + alto_texto(bio.get("country") or "", ANCHO, PAIS)
+    if bio.get("photo_url"):
+        cabecera += (f'<img src="{e(_src(url_foto(bio), imagenes))}" '
+                     f'class="cover-image" alt="Foto de la banda">\n')
+        angosta = (FOTO_ALTO + SEPARACION, ANCHO - FOTO_ANCHO - SEPARACION)
+    else:
+        angosta = (0, None)
+
+    cajas = []
+
+    def nueva_caja():
+        if cajas:
+            caja = Caja(ANCHO, ALTO)
+        else:
+            caja = Caja(ANCHO, ALTO - alto_cabecera, *angosta)
+        cajas.append(caja)
+        return caja
+
+    flujo = Flujo(nueva_caja)
+    for p in parrafos(bio.get("translated_biography") or bio.get("original_biography")):
+        flujo.parrafo(p, BIO, "bio-p")
+
+    return [cabecera + _pagina_html(cajas[0])] + [_pagina_html(c) for c in cajas[1:] if c.html]
+
+
+def _archivos_qr(album, qr_dir):
+    album_id = almacen.id_progarchives(album.get("album_url"))
+    if not album_id:
+        return []
+    # Las mismas rutas (y el mismo formato) que escribe generar_qr.py
+    return [(servicio, almacen.ruta_qr(os.path.join(qr_dir, servicio), album_id)) for servicio in ("spotify", "tidal")]
+
+
+def _qr(album, qr_dir):
+    imgs = [f'<img src="{ruta.replace(os.sep, "/")}" alt="Qr {servicio.capitalize()}">'
+            for servicio, ruta in _archivos_qr(album, qr_dir) if os.path.exists(ruta)]
+    return f'<div class="qr-wrapper">{"".join(imgs)}</div>' if imgs else ""
+
+
+def _pagina_html(caja):
+    contenido = "\n".join(caja.html)
+    if caja.columnas:
+        columnas = "".join(f'<div class="columna">{"".join(c.html)}</div>' for c in caja.columnas)
+        contenido += f'\n<div class="columnas" style="height:{caja.alto_columnas:.1f}pt">{columnas}</div>'
+    return contenido
+
+
+def _datos_album(flujo, album, qr_dir, imagenes=None):
+    """Título, tipo, portada con los temas al lado, integrantes y QR; los temas y los integrantes se parten."""
+    titulo = f'{album.get("title") or ""} ({album.get("year") or "?"})'
+    tipo = re.sub(r"^Studio Album, released in", "Álbum de estudio, lanzado en", album.get("album_type") or "")
+    flujo.bloque(f'<h2 class="album-title" id="{ancla_album(album)}">{e(titulo)}</h2>', alto_texto(titulo, ANCHO, TITULO))
+    flujo.bloque(f'<p class="tipo"><em>{e(tipo)}</em></p>', alto_texto(tipo, ANCHO, TIPO),
+                 con_lo_que_sigue=LADO_PORTADA + SEPARACION)
+
+    # Junto a la portada van los temas que entran; el resto sigue debajo a todo lo ancho
+    temas = tokens(album.get("tracklist") or "")
+    interlinea = PRE.tam * PRE.interlinea
+    disponible = max(LADO_PORTADA, flujo.caja.alto - flujo.caja.y - SEPARACION)
+    i, renglones = 0, 0
+    while i < len(temas) and (renglones + 1) * interlinea <= disponible:
+        i = cortar_renglon(temas, i, LADO_PORTADA, PRE)
+        renglones += 1
+    flujo.bloque(f'<div class="flex-container">'
+                 f'<div class="portada"><img src="{e(_src(album.get("cover_url"), imagenes))}" alt="Carátula"></div>'
+                 f'<p class="tracklist">{_html_tokens(temas[:i])}</p></div>',
+                 max(LADO_PORTADA, renglones * interlinea) + SEPARACION)
+    if i < len(temas):
+        flujo.parrafo(temas[i:], PRE, "tracklist sigue")
+
+    flujo.bloque("<h3>Integrantes:</h3>", alto_texto("Integrantes:", ANCHO, SUBTITULO), con_lo_que_sigue=2 * interlinea)
+    flujo.parrafo(album.get("lineup") or "", PRE, "lineup")
+    qr = _qr(album, qr_dir)
+    if qr:
+        flujo.bloque(qr, QR_ALTO + 2 * SEPARACION)
+
+
+def paginas_album(album, qr_dir=QR_DIR, imagenes=None):
+    """Datos del álbum y sus reseñas en tres columnas, continuando en las páginas que hagan falta."""
+    paginas = []
+
+    def nueva_pagina():
+        caja = Caja(ANCHO, ALTO)
+        paginas.append(caja)
+        return caja
+
+    _datos_album(Flujo(nueva_pagina), album, qr_dir, imagenes)
+
+    resenas = [r for r in album.get("collaborator_reviews") or [] if parrafos(r.get("translated_text") or r.get("text"))]
+    if not resenas:
+        return [_pagina_html(p) for p in paginas]
+
+    interlinea = CUERPO.tam * CUERPO.interlinea
+    alto_titulo = alto_texto("Reseñas", ANCHO, SUBTITULO)
+
+    def nueva_columna():
+        pagina = paginas[-1]
+        if not pagina.columnas or len(pagina.columnas) == COLUMNAS:
+            libre = pagina.alto - pagina.y - alto_titulo
+            if pagina.columnas or libre < MINIMO_COLUMNAS * interlinea:
+                pagina = nueva_pagina()
+                pagina.html.append("<h3>Reseñas (continuación)</h3>")
+            else:
+                pagina.html.append("<h3>Reseñas:</h3>")
+            pagina.alto_columnas = pagina.alto - pagina.y - alto_titulo
+            pagina.y = pagina.alto
+        caja = Caja(ANCHO_COLUMNA, pagina.alto_columnas)
+        pagina.columnas.append(caja)
+        return caja
+
+    flujo = Flujo(nueva_columna)
+    for n, resena in enumerate(resenas):
+        if n and flujo.caja.y > 0:
+            flujo.bloque('<hr class="separador">', SEPARADOR_ALTO)
+        flujo.bloque(f'<p class="autor">Autor: {e(resena.get("author"))}</p>',
+                     AUTOR.tam * AUTOR.interlinea + AUTOR.despues, con_lo_que_sigue=2 * interlinea)
+        for p in parrafos(resena.get("translated_text") or resena.get("text")):
+            flujo.parrafo(p, CUERPO, "resena", sangria=SANGRIA)
+
+    return [_pagina_html(p) for p in paginas]
+
+
+# ---------------------------
+# Construcción incremental
+# ---------------------------
+# Cada banda (portada y biografía) y cada álbum es un fragmento de páginas con
+# una huella: el registro del JSON, el código de este archivo (plantilla y CSS),
+# los archivos de QR que usa y la ruta local de sus imágenes, si las hay. Las páginas de los fragmentos sin cambios salen de la
+# caché; la numeración y los márgenes izquierda/derecha se ponen al armar el tomo,
+# así un fragmento no depende de en qué página cae.
+@lru_cache(maxsize=None)
+def _plantilla():
+    with open(os.path.abspath(__file__), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _hash_archivo(ruta):
+    try:
+        with open(ruta, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return "-"
+
+
+def huella(tipo, registro, archivos=()):
+    h = hashlib.sha256()
+    partes = [_plantilla(), tipo, json.dumps(registro, sort_keys=True, ensure_ascii=False)]
+    partes += [_hash_archivo(ruta) for ruta in archivos]
+    for parte in partes:
+        h.update(parte.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def orden_bandas(datos):
+    """Bandas en orden alfabético, como libro.html."""
+    return sorted(datos, key=str.casefold)
+
+
+def orden_albums(info):
+    return sorted(info.get("albums", []), key=lambda a: a.get("year") or 0)
+
+
+def fragmentos_libro(datos, qr_dir=QR_DIR, imagenes=None):
+    """(huella, función que genera las páginas, ancla) por banda y por álbum, en el orden del libro."""
+    for nombre in orden_bandas(datos):
+        info = datos[nombre]
+        foto = _src(url_foto(info.get("biography") or {}), imagenes)
+        yield (huella("banda", [nombre, info.get("biography"), foto]),
+               partial(paginas_banda, nombre, info, imagenes), ancla_banda(nombre))
+        for album in orden_albums(info):
+            archivos = [ruta for _, ruta in _archivos_qr(album, qr_dir)]
+            portada = _src(album.get("cover_url"), imagenes)
+            yield (huella("album", [qr_dir, album, portada], archivos),
+                   partial(paginas_album, album, qr_dir, imagenes), ancla_album(album))
+
+
+class CacheFragmentos:
+    """Páginas ya renderizadas de cada fragmento, por huella."""
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or CACHE_LIBRO
+        self.aciertos = 0
+        self.fallos = 0
+        self._usados = []
+        self._db = sqlite3.connect(self.ruta)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fragmentos ("
+            " huella TEXT PRIMARY KEY, paginas TEXT NOT NULL, usado REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def obtener(self, huella):
+        fila = self._db.execute("SELECT paginas FROM fragmentos WHERE huella = ?", (huella,)).fetchone()
+        if fila is None:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        self._usados.append((time.time(), huella))
+        return json.loads(fila[0])
+
+    def guardar(self, huella, paginas):
+        self._db.execute("INSERT OR REPLACE INTO fragmentos (huella, paginas, usado) VALUES (?, ?, ?)",
+                         (huella, json.dumps(paginas, ensure_ascii=False), time.time()))
+
+    def cerrar(self):
+        # Un solo commit por construcción; lo que nadie usa hace rato se borra
+        self._db.executemany("UPDATE fragmentos SET usado = ? WHERE huella = ?", self._usados)
+        self._db.execute("DELETE FROM fragmentos WHERE usado < ?", (time.time() - VIGENCIA_CACHE,))
+        self._db.commit()
+        self._db.close()
+
+
+def paginas_libro(datos, qr_dir=QR_DIR, cache=None, imagenes=None, anclas=None):
+    """Páginas del libro; en `anclas` (si se da) queda ancla -> número de página contando desde 0."""
+    n = 0
+    for h, generar, ancla in fragmentos_libro(datos, qr_dir, imagenes):
+        paginas = cache.obtener(h) if cache else None
+        if paginas is None:
+            paginas = generar()
+            if cache:
+                cache.guardar(h, paginas)
+        if anclas is not None:
+            anclas[ancla] = n
+        n += len(paginas)
+        yield from paginas
+
+
+# ---------------------------
+# HTML
+# ---------------------------
+def _css_estilo(estilo):
+    return (f"{estilo.selector} {{ font-size: {estilo.tam}pt; line-height: {estilo.tam * estilo.interlinea:.2f}pt; "
+            f"font-weight: {'bold' if estilo.negrita else 'normal'}; margin: {estilo.antes}pt 0 {estilo.despues}pt 0; }}")
+
+
+def css():
+    estilos = "\n".join(_css_estilo(s) for s in (BIO, CUERPO, AUTOR, BANDA, PAIS, TITULO, TIPO, SUBTITULO, PRE,
+                                                  INDICE_TITULO, INDICE_LETRA, INDICE))
+    return f"""
+@page {{ size: letter; margin: 0; }}
+body {{ margin: 0; font-family: "Times New Roman", Times, "Liberation Serif", "Nimbus Roman", serif; color: black; }}
+@media screen {{ body {{ background: #ddd; }} .pagina {{ margin: 1em auto; box-shadow: 0 0 4px #888; }} }}
+.pagina {{ position: relative; width: {PAGINA_ANCHO}pt; height: {PAGINA_ALTO}pt; overflow: hidden;
+  background: white; break-after: page; page-break-after: always; }}
+.cuerpo {{ position: absolute; top: {MARGEN_ARRIBA:.2f}pt; width: {ANCHO:.2f}pt; }}
+.derecha .cuerpo {{ left: {MARGEN_LOMO:.2f}pt; }}
+.izquierda .cuerpo {{ left: {MARGEN_AFUERA:.2f}pt; }}
+.folio {{ position: absolute; bottom: {MARGEN_ABAJO / 2:.2f}pt; font-size: 12pt; }}
+.derecha .folio {{ right: {MARGEN_AFUERA:.2f}pt; }}
+.izquierda .folio {{ left: {MARGEN_AFUERA:.2f}pt; }}
+{estilos}
+h1.band-header {{ text-transform: uppercase; }}
+p.country {{ font-style: italic; color: gray; }}
+.bio-p, .columna p {{ text-align: justify; text-align-last: left; }}
+.columna p.resena {{ text-indent: {SANGRIA}pt; }}
+.columna p.sigue {{ text-indent: 0; }}
+.bio-p.corta, .columna p.corta {{ text-align-last: justify; }}
+.cover-image {{ float: right; width: {FOTO_ANCHO:.2f}pt; height: {FOTO_ALTO:.2f}pt; object-fit: contain;
+  margin: 0 0 {SEPARACION}pt {SEPARACION}pt; }}
+.flex-container {{ display: flex; gap: {SEPARACION}pt; margin-bottom: {SEPARACION}pt; }}
+.flex-container > * {{ width: {LADO_PORTADA:.2f}pt; flex: none; margin: 0; }}
+.tracklist.sigue, .lineup {{ text-align: left; }}
+.portada img {{ width: {LADO_PORTADA:.2f}pt; height: {LADO_PORTADA:.2f}pt; object-fit: contain; }}
+.qr-wrapper {{ display: flex; gap: {SEPARACION}pt; height: {QR_ALTO}pt; margin: {SEPARACION}pt 0; }}
+.qr-wrapper img {{ height: 100%; width: auto; }}
+.columnas {{ display: flex; gap: {SEPARACION}pt; }}
+.columna {{ width: {ANCHO_COLUMNA:.2f}pt; flex: none; }}
+hr.separador {{ margin: {SEPARACION}pt 0; border: 0; border-top: 1px dashed #888; }}
+.indice p {{ text-align: left; padding-left: {SANGRIA}pt; text-indent: -{SANGRIA}pt; }}
+.indice p.sub {{ padding-left: {2 * SANGRIA}pt; }}
+.indice a {{ color: inherit; text-decoration: none; }}
+.indice a:empty::after {{ content: target-counter(attr(href), page); }}
+"""
+
+
+def escribir_libro(paginas, salida, primera=1, titulo="Libro Progresivo"):
+    """Escribe las páginas numeradas a medida que llegan; devuelve cuántas fueron."""
+    tmp = salida + ".tmp"
+    n = primera
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(f'<!DOCTYPE html>\n<html lang="es">\n<head>\n<meta charset="UTF-8">\n'
+                f'<title>{e(titulo)}</title>\n<style>{css()}</style>\n</head>\n<body>\n')
+        for cuerpo in paginas:
+            lado = "derecha" if n % 2 else "izquierda"  # la primera página impar va a la derecha
+            f.write(f'<section class="pagina {lado}"><div class="cuerpo">\n{cuerpo}\n</div>'
+                    f'<div class="folio">{n}</div></section>\n')
+            n += 1
+        f.write("</body>\n</html>\n")
+    os.replace(tmp, salida)
+    return n - primera
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera el libro en HTML ya paginado a partir del JSON")
+    parser.add_argument("entradas", nargs="*", default=[ENTRADA], help="dataset o parte*.json")
+    parser.add_argument("-o", "--salida", help=f"HTML de salida (con varias entradas: libro_<parte>.html)")
+    parser.add_argument("--primera-pagina", type=int, default=1,
+                        help="número de la primera página (para continuar la numeración entre tomos)")
+    parser.add_argument("--qr", default=QR_DIR, help="carpeta con qr/spotify y qr/tidal")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"volver a renderizar solo las bandas y álbumes que cambiaron (caché en {CACHE_LIBRO})")
+    parser.add_argument("--indice", action="store_true",
+                        help="agregar al final el índice de bandas, álbumes y músicos con sus páginas")
+    parser.add_argument("--imagenes", choices=["impresion", "vista"],
+                        help="usar las copias locales de imagenes.py en lugar de las URLs del sitio")
+    args = parser.parse_args(argv)
+
+    imagenes = None
+    if args.imagenes:
+        import imagenes as modulo_imagenes
+        imagenes = modulo_imagenes.CacheImagenes().locales(args.imagenes)
+
+    if args.salida and len(args.entradas) > 1:
+        parser.error("--salida solo sirve con una entrada")
+    primera = args.primera_pagina
+    for entrada in args.entradas:
+        if not os.path.exists(entrada):
+            print(f"❌ No existe {entrada}")
+            return 1
+        if args.salida:
+            salida = args.salida
+        elif entrada == ENTRADA:
+            salida = SALIDA
+        else:
+            salida = f"libro_{os.path.splitext(os.path.basename(entrada))[0]}.html"
+
+        inicio = time.perf_counter()
+        datos = almacen.cargar(entrada)
+        cache = CacheFragmentos() if args.incremental else None
+        anclas = {}
+        paginas = paginas_libro(datos, args.qr, cache, imagenes, anclas)
+        if args.indice:
+            import indice_libro
+            # Generador: se arma recién cuando se terminó de paginar el libro y se conocen las páginas
+            paginas = itertools.chain(paginas, indice_libro.paginas_indice(datos, anclas, primera))
+        total = escribir_libro(paginas, salida, primera)
+        albums = sum(len(info.get("albums", [])) for info in datos.values())
+        print(f"📖 {entrada} -> {salida}: {len(datos)} bandas, {albums} álbumes, "
+              f"páginas {primera}-{primera + total - 1} en {time.perf_counter() - inicio:.2f}s")
+        if cache:
+            print(f"♻️ {cache.aciertos} fragmentos de la caché, {cache.fallos} renderizados")
+            cache.cerrar()
+        primera += total
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
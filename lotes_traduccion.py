@@ -0,0 +1,258 @@
+import re
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import metricas
+import traduccion
+
+# ---------------------------
+# Traducción por lotes
+# ---------------------------
+# En vez de una llamada por reseña o biografía:
+#  1. se descartan los textos que ya están en la caché de traduccion.py (y los
+#     repetidos: cada texto distinto se traduce una vez),
+#  2. los textos largos se parten por párrafos,
+#  3. los trozos cortos se empaquetan en una sola petición hasta un
+#     presupuesto de tokens, marcados con <<<n>>>,
+#  4. los lotes corren en paralelo bajo límites de peticiones y tokens por
+#     minuto, y el resultado se rearma en el orden original.
+
+TOKENS_POR_LOTE = 3000       # tokens de entrada por petición
+TOKENS_POR_TROZO = 1500      # un texto más largo que esto se parte
+MAX_CONCURRENCIA = 6
+RPM = 400                    # peticiones por minuto
+TPM = 200000                 # tokens por minuto (entrada + salida estimada)
+
+PROMPT_LOTE = (
+    "Traduce al español cada uno de los siguientes textos manteniendo el estilo original. "
+    "Cada texto comienza con una marca <<<n>>>. Responde con las mismas marcas, en el mismo "
+    "orden, cada una seguida solo de su traducción.\n\n"
+)
+MARCA = re.compile(r"<<<(\d+)>>>")
+
+
+def estimar_tokens(texto):
+    # ~4 caracteres por token en inglés/español; suficiente para presupuestar
+    return len(texto) // 4 + 1
+
+
+# ---------------------------
+# Troceo y empaquetado
+# ---------------------------
+def trocear(texto, max_tokens=TOKENS_POR_TROZO):
+    """
+    Parte un texto por párrafos (y si hace falta por oraciones) sin pasar de max_tokens
+    por trozo. Devuelve (trozos, separadores), con un separador más que trozos:
+    separadores[0] + trozos[0] + separadores[1] + ... + separadores[-1] es el texto original.
+    """
+    if estimar_tokens(texto) <= max_tokens:
+        return [texto], ["", ""]
+
+    # Cada pieza va con el separador que la sigue ("\n", "\n\n", espacios entre oraciones)
+    piezas = []
+    prefijo = ""
+    partes = re.split(r"(\n\s*\n|\n)", texto)
+    for k in range(0, len(partes), 2):
+        parrafo, sep = partes[k], partes[k + 1] if k + 1 < len(partes) else ""
+        if estimar_tokens(parrafo) <= max_tokens:
+            oraciones = [parrafo, sep]
+        else:
+            oraciones = re.split(r"(?<=[.!?])(\s+)", parrafo) + [sep]
+        for j in range(0, len(oraciones), 2):
+            pieza, sep_pieza = oraciones[j], oraciones[j + 1]
+            if pieza.strip():
+                piezas.append([pieza, sep_pieza])
+            elif piezas:
+                piezas[-1][1] += pieza + sep_pieza  # renglón en blanco: se suma al separador
+            else:
+                prefijo += pieza + sep_pieza
+
+    if not piezas:
+        return [texto], ["", ""]
+
+    # Se vuelven a juntar piezas consecutivas mientras quepan, con sus separadores originales
+    trozos, separadores = [], [prefijo]
+    actual, sep_actual = None, ""
+    for pieza, sep in piezas:
+        if actual is not None and estimar_tokens(actual + sep_actual + pieza) > max_tokens:
+            trozos.append(actual)
+            separadores.append(sep_actual)
+            actual = None
+        actual = pieza if actual is None else actual + sep_actual + pieza
+        sep_actual = sep
+    trozos.append(actual)
+    separadores.append(sep_actual)
+    return trozos, separadores
+
+
+def empaquetar(trozos, presupuesto=TOKENS_POR_LOTE):
+    """Agrupa (indice, texto) consecutivos en lotes de hasta `presupuesto` tokens."""
+    lotes, actual, tokens = [], [], 0
+    for item in trozos:
+        t = estimar_tokens(item[1])
+        if actual and tokens + t > presupuesto:
+            lotes.append(actual)
+            actual, tokens = [], 0
+        actual.append(item)
+        tokens += t
+    if actual:
+        lotes.append(actual)
+    return lotes
+
+
+# ---------------------------
+# Límite de peticiones y tokens por minuto
+# ---------------------------
+class LimitadorTasa:
+    def __init__(self, rpm=RPM, tpm=TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._ventana = deque()  # (instante, tokens) del último minuto
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def adquirir(self, tokens):
+        tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                while self._ventana and ahora - self._ventana[0][0] >= 60:
+                    self._tokens -= self._ventana.popleft()[1]
+                if len(self._ventana) < self.rpm and self._tokens + tokens <= self.tpm:
+                    self._ventana.append((ahora, tokens))
+                    self._tokens += tokens
+                    return
+                espera = 60 - (ahora - self._ventana[0][0])
+            time.sleep(max(espera, 0.01))
+
+
+# ---------------------------
+# Ejecución
+# ---------------------------
+class Estadisticas:
+    def __init__(self):
+        self.textos = 0
+        self.tokens = 0
+        self.peticiones = 0
+        self.segundos = 0.0
+
+    def __str__(self):
+        s = self.segundos or 1e-9
+        return (f"{self.textos} textos, {self.peticiones} peticiones en {self.segundos:.1f} s → "
+                f"{self.textos / s:.1f} textos/s, {self.tokens / s:.0f} tokens/s")
+
+
+def _traducir_lote(lote, limitador, stats, lock):
+    cuerpo = "\n\n".join(f"<<<{n}>>>\n{texto}" for n, (_, texto) in enumerate(lote))
+    tokens = estimar_tokens(PROMPT_LOTE + cuerpo)
+    with metricas.medir("traduccion_espera_segundos", etapa="traduccion"):
+        limitador.adquirir(tokens * 2)  # la salida mide más o menos lo mismo que la entrada
+
+    if len(lote) == 1:
+        salida = [traduccion.llamar_gpt(lote[0][1])]
+    else:
+        respuesta = traduccion.llamar_gpt(cuerpo, prompt=PROMPT_LOTE)
+        partes = MARCA.split(respuesta)
+        # partes = [antes, "0", texto0, "1", texto1, ...]
+        por_marca = {int(partes[i]): partes[i + 1].strip() for i in range(1, len(partes) - 1, 2)}
+        if sorted(por_marca) != list(range(len(lote))):
+            # El modelo no respetó las marcas: se traduce uno por uno
+            logging.warning(f"Lote de {len(lote)} textos con marcas inválidas; se reintenta de a uno")
+            metricas.contar("traduccion_reintentos", motivo="marcas", etapa="traduccion")
+            return [r for item in lote for r in _traducir_lote([item], limitador, stats, lock)]
+        salida = [por_marca[n] for n in range(len(lote))]
+
+    with lock:
+        stats.peticiones += 1
+        stats.tokens += tokens
+    # Con el prompt usado: de él depende la clave de la caché
+    prompt = traduccion.PROMPT if len(lote) == 1 else PROMPT_LOTE
+    return [(i, t, prompt) for (i, _), t in zip(lote, salida)]
+
+
+def traducir_textos(textos, max_concurrencia=MAX_CONCURRENCIA, limitador=None, stats=None):
+    """
+    Traduce una lista de textos y devuelve las traducciones en el mismo orden.
+    Si un lote falla, sus textos se devuelven sin traducir (como traducir()).
+    """
+    inicio = time.perf_counter()
+    stats = stats if stats is not None else Estadisticas()
+    lock = threading.Lock()
+    limitador = limitador or _limitador
+    resultado = list(textos)
+
+    # 1. Caché (la traducción pudo haberse hecho sola o dentro de un lote): un
+    #    acierto o un fallo por texto distinto; los repetidos se traducen una vez
+    cache = traduccion.cache()
+    pendientes = []  # (indice_texto, texto)
+    posiciones = {}  # texto -> índices donde aparece
+    for i, texto in enumerate(textos):
+        if not texto:
+            continue
+        if texto in posiciones:
+            posiciones[texto].append(i)
+            continue
+        posiciones[texto] = [i]
+        guardada = None
+        for prompt in (traduccion.PROMPT, PROMPT_LOTE):
+            guardada = cache.obtener(traduccion.clave_cache(texto, prompt=prompt), contar=False)
+            if guardada is not None:
+                break
+        cache.contar(guardada is not None)
+        if guardada is not None:
+            resultado[i] = guardada
+        else:
+            pendientes.append((i, texto))
+
+    # 2. Troceo: cada trozo recuerda (texto, posición del trozo)
+    trozos = []
+    partes_por_texto = {}
+    separadores_por_texto = {}
+    prompts_por_texto = {i: set() for i, _ in pendientes}
+    fallidos = set()
+    for i, texto in pendientes:
+        partes, separadores_por_texto[i] = trocear(texto)
+        partes_por_texto[i] = [None] * len(partes)
+        trozos.extend(((i, j), p) for j, p in enumerate(partes))
+
+    # 3 y 4. Lotes en paralelo
+    lotes = empaquetar(trozos)
+    with ThreadPoolExecutor(max_workers=max_concurrencia) as ex:
+        futuros = [(lote, ex.submit(_traducir_lote, lote, limitador, stats, lock)) for lote in lotes]
+        for lote, futuro in futuros:
+            try:
+                traducidos = futuro.result()
+            except Exception as e:
+                logging.error(f"Error al traducir lote de {len(lote)} trozos: {e}")
+                traducidos = [(item, t, None) for item, t in lote]
+                fallidos.update(i for (i, _), _ in lote)
+            for (i, j), t, prompt in traducidos:
+                partes_por_texto[i][j] = t
+                prompts_por_texto[i].add(prompt)
+
+    # Rearmado en orden y guardado en la caché
+    for i, texto in pendientes:
+        partes = partes_por_texto[i]
+        if i in fallidos:
+            continue  # queda el original, sin cachear
+        # Cada trozo traducido vuelve a su lugar con el separador que tenía en el original
+        separadores = separadores_por_texto[i]
+        traducido = separadores[0] + "".join(p + sep for p, sep in zip(partes, separadores[1:]))
+        resultado[i] = traducido
+        prompt = PROMPT_LOTE if PROMPT_LOTE in prompts_por_texto[i] else traduccion.PROMPT
+        cache.guardar(traduccion.clave_cache(texto, prompt=prompt), traducido)
+
+    for indices in posiciones.values():
+        for k in indices[1:]:
+            resultado[k] = resultado[indices[0]]
+
+    stats.textos += len(pendientes)
+    stats.segundos += time.perf_counter() - inicio
+    if pendientes:
+        logging.info(f"Traducción por lotes: {stats}")
+    return resultado
+
+
+_limitador = LimitadorTasa()
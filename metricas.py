@@ -0,0 +1,368 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+
+# Configuración
+CARPETA = "metricas"       # <etapa>.json y <etapa>.prom (apto para el textfile collector de node_exporter)
+PREFIJO = "progarchives_"
+ETAPA = "general"          # etiqueta por defecto; la fija cada script con iniciar()
+DETALLADO = False          # depurar() solo imprime con --detallado
+# Límites (en segundos) de los histogramas: de 1 ms a 1 minuto
+LIMITES = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOP_PERFIL = 25            # funciones del perfil que van al resumen
+PERFIL_POR_HILO = sys.version_info < (3, 12)  # un cProfile por hilo hasta 3.11 (ver más abajo)
+TOP_MEMORIA = 10           # líneas que más memoria reservaron
+
+# ---------------------------
+# Métricas por etapa y host
+# ---------------------------
+# Contadores, histogramas y valores con etiquetas, en memoria y con un solo
+# lock: registrar algo en el camino caliente cuesta un par de microsegundos.
+# Cada script llama a iniciar() al arrancar y a finalizar() al terminar (o se
+# llama solo al salir del proceso), que deja:
+#   metricas/<etapa>.json   resumen legible (p50/p95/p99 de cada histograma)
+#   metricas/<etapa>.prom   formato de texto de Prometheus
+# Con --perfil se perfila con cProfile (todos los hilos) y con --memoria se
+# siguen las reservas con tracemalloc. Los procesos de los pools (QR,
+# variantes de imágenes) no se perfilan: sus tiempos vuelven como métricas.
+#
+# Hasta Python 3.11 cada cProfile mira un solo hilo, así que cada hilo nuevo
+# arranca el suyo. Desde 3.12 cProfile usa sys.monitoring: un único perfil ve
+# todos los hilos y no puede haber otro activo (enable() lanza ValueError),
+# así que ahí se perfila con uno solo, creado en el hilo principal.
+
+
+class Histograma:
+    __slots__ = ("cuentas", "suma", "n", "minimo", "maximo")
+
+    def __init__(self):
+        self.cuentas = [0] * (len(LIMITES) + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.n = 0
+        self.minimo = float("inf")
+        self.maximo = 0.0
+
+    def observar(self, valor):
+        self.cuentas[bisect.bisect_left(LIMITES, valor)] += 1
+        self.suma += valor
+        self.n += 1
+        if valor < self.minimo:
+            self.minimo = valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def cuantil(self, q):
+        """Estimado por interpolación dentro del intervalo, como histogram_quantile de Prometheus."""
+        if not self.n:
+            return None
+        objetivo = q * self.n
+        acumulado = 0
+        for i, cuenta in enumerate(self.cuentas):
+            if cuenta and acumulado + cuenta >= objetivo:
+                desde = LIMITES[i - 1] if i else 0.0
+                hasta = LIMITES[i] if i < len(LIMITES) else self.maximo
+                desde, hasta = max(desde, self.minimo), min(hasta, self.maximo)
+                return desde + (hasta - desde) * (objetivo - acumulado) / cuenta
+            acumulado += cuenta
+        return self.maximo
+
+
+def _clave(nombre, etiquetas):
+    etiquetas.setdefault("etapa", ETAPA)
+    return nombre, tuple(sorted(etiquetas.items()))
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contadores = {}
+        self.histogramas = {}
+        self.valores = {}
+
+    def contar(self, nombre, n=1, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + n
+
+    def observar(self, nombre, valor, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            h = self.histogramas.get(clave)
+            if h is None:
+                h = self.histogramas[clave] = Histograma()
+            h.observar(valor)
+
+    def fijar(self, nombre, valor, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self.valores[clave] = valor
+
+    def medir(self, nombre, **etiquetas):
+        return _Cronometro(self, nombre, etiquetas)
+
+    def limpiar(self):
+        with self._lock:
+            self.contadores.clear()
+            self.histogramas.clear()
+            self.valores.clear()
+
+    # ---------------------------
+    # Salidas
+    # ---------------------------
+    def resumen(self):
+        with self._lock:
+            contadores = dict(self.contadores)
+            histogramas = {k: (h.n, h.suma, h.maximo, [h.cuantil(q) for q in (0.5, 0.95, 0.99)])
+                           for k, h in self.histogramas.items()}
+            valores = dict(self.valores)
+        salida = {"contadores": {}, "histogramas": {}, "valores": {}}
+        for (nombre, etiquetas), valor in sorted(contadores.items()):
+            salida["contadores"].setdefault(nombre, []).append({"etiquetas": dict(etiquetas), "valor": valor})
+        for (nombre, etiquetas), (n, suma, maximo, (p50, p95, p99)) in sorted(histogramas.items()):
+            salida["histogramas"].setdefault(nombre, []).append({
+                "etiquetas": dict(etiquetas), "n": n, "suma": round(suma, 6), "media": round(suma / n, 6),
+                "p50": round(p50, 6), "p95": round(p95, 6), "p99": round(p99, 6), "max": round(maximo, 6),
+            })
+        for (nombre, etiquetas), valor in sorted(valores.items()):
+            salida["valores"].setdefault(nombre, []).append({"etiquetas": dict(etiquetas), "valor": valor})
+        return salida
+
+    def prometheus(self):
+        """Formato de texto de Prometheus (un # TYPE por familia, contadores con _total)."""
+        with self._lock:
+            contadores = sorted(self.contadores.items())
+            histogramas = sorted((k, (list(h.cuentas), h.suma, h.n)) for k, h in self.histogramas.items())
+            valores = sorted(self.valores.items())
+        lineas = []
+        anterior = None
+        for (nombre, etiquetas), valor in contadores:
+            if nombre != anterior:
+                lineas.append(f"# TYPE {PREFIJO}{nombre}_total counter")
+                anterior = nombre
+            lineas.append(f"{PREFIJO}{nombre}_total{_etiquetas_prom(etiquetas)} {_numero(valor)}")
+        for (nombre, etiquetas), (cuentas, suma, n) in histogramas:
+            if nombre != anterior:
+                lineas.append(f"# TYPE {PREFIJO}{nombre} histogram")
+                anterior = nombre
+            acumulado = 0
+            for limite, cuenta in zip(LIMITES + ("+Inf",), cuentas):
+                acumulado += cuenta
+                le = limite if isinstance(limite, str) else _numero(limite)
+                lineas.append(f"{PREFIJO}{nombre}_bucket{_etiquetas_prom(etiquetas + (('le', le),))} {acumulado}")
+            lineas.append(f"{PREFIJO}{nombre}_sum{_etiquetas_prom(etiquetas)} {_numero(suma)}")
+            lineas.append(f"{PREFIJO}{nombre}_count{_etiquetas_prom(etiquetas)} {n}")
+        for (nombre, etiquetas), valor in valores:
+            if nombre != anterior:
+                lineas.append(f"# TYPE {PREFIJO}{nombre} gauge")
+                anterior = nombre
+            lineas.append(f"{PREFIJO}{nombre}{_etiquetas_prom(etiquetas)} {_numero(valor)}")
+        return "\n".join(lineas) + "\n"
+
+
+class _Cronometro:
+    __slots__ = ("registro", "nombre", "etiquetas", "inicio")
+
+    def __init__(self, registro, nombre, etiquetas):
+        self.registro = registro
+        self.nombre = nombre
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registro.observar(self.nombre, time.perf_counter() - self.inicio, **self.etiquetas)
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _etiquetas_prom(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas) + "}"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Registro por defecto del proceso
+registro = Registro()
+
+
+def contar(nombre, n=1, **etiquetas):
+    registro.contar(nombre, n, **etiquetas)
+
+
+def observar(nombre, valor, **etiquetas):
+    registro.observar(nombre, valor, **etiquetas)
+
+
+def fijar(nombre, valor, **etiquetas):
+    registro.fijar(nombre, valor, **etiquetas)
+
+
+def medir(nombre, **etiquetas):
+    """with medir("parseo_segundos", pagina="album"): ... -> una observación en segundos."""
+    return registro.medir(nombre, **etiquetas)
+
+
+def cronometrar(nombre, **etiquetas):
+    """Decorador: cada llamada a la función es una observación de `nombre`."""
+    def decorador(fn):
+        def envuelta(*args, **kwargs):
+            with registro.medir(nombre, **etiquetas):
+                return fn(*args, **kwargs)
+        envuelta.__name__, envuelta.__doc__, envuelta.__wrapped__ = fn.__name__, fn.__doc__, fn
+        return envuelta
+    return decorador
+
+
+def depurar(mensaje, *args):
+    """Salida de depuración: con DETALLADO apagado no se arma ni se formatea el mensaje."""
+    if DETALLADO:
+        print("[DEBUG] " + (mensaje % args if args else mensaje))
+
+
+# ---------------------------
+# Corrida: perfil, memoria y volcado
+# ---------------------------
+_corrida = None
+
+
+class _Corrida:
+    def __init__(self, etapa, carpeta, perfil, memoria):
+        self.etapa = etapa
+        self.carpeta = os.path.abspath(carpeta)  # finalizar() puede correr con otro directorio actual
+        self.ruta_perfil = os.path.abspath(perfil) if perfil else None
+        self.memoria = memoria
+        self.inicio = time.time()
+        self.reloj = time.perf_counter()
+        self.perfiles = []
+        self._lock = threading.Lock()
+        self.terminada = False
+
+    def _perfilar_hilo(self, *_):
+        # Primer evento de un hilo nuevo: su propio cProfile (uno solo no ve los otros hilos)
+        perfil = cProfile.Profile()
+        with self._lock:
+            self.perfiles.append(perfil)
+        perfil.enable()
+
+    def arrancar(self):
+        if self.memoria:
+            tracemalloc.start()
+        if self.ruta_perfil:
+            if PERFIL_POR_HILO:
+                threading.setprofile(self._perfilar_hilo)
+            perfil = cProfile.Profile()
+            self.perfiles.append(perfil)
+            perfil.enable()
+
+    def _resumen_perfil(self):
+        if PERFIL_POR_HILO:
+            threading.setprofile(None)
+        with self._lock:
+            # Los de hilos que siguen vivos (trabajadores daemon) también: así
+            # dejan de anotar mientras se arman las estadísticas
+            for perfil in self.perfiles:
+                perfil.disable()
+            stats = pstats.Stats(*self.perfiles)
+        stats.dump_stats(self.ruta_perfil)
+        funciones = sorted(stats.stats.items(), key=lambda x: x[1][3], reverse=True)[:TOP_PERFIL]
+        return {
+            "archivo": self.ruta_perfil,
+            "hilos": len(self.perfiles),
+            "funciones": [{"funcion": f"{archivo}:{linea}({nombre})", "llamadas": nc,
+                           "propio_s": round(tt, 4), "acumulado_s": round(ct, 4)}
+                          for (archivo, linea, nombre), (_, nc, tt, ct, _) in funciones],
+        }
+
+    def _resumen_memoria(self):
+        actual, pico = tracemalloc.get_traced_memory()
+        lineas = tracemalloc.take_snapshot().statistics("lineno")[:TOP_MEMORIA]
+        tracemalloc.stop()
+        fijar("memoria_pico_bytes", pico)
+        return {"actual_bytes": actual, "pico_bytes": pico,
+                "lineas": [{"linea": str(s.traceback[0]), "bytes": s.size, "bloques": s.count} for s in lineas]}
+
+    def terminar(self):
+        with self._lock:
+            if self.terminada:
+                return None
+            self.terminada = True
+        duracion = time.perf_counter() - self.reloj
+        fijar("duracion_segundos", round(duracion, 3))
+        extra = {}
+        if self.ruta_perfil:
+            extra["perfil"] = self._resumen_perfil()
+        if self.memoria:
+            extra["memoria"] = self._resumen_memoria()
+
+        resumen = {"etapa": self.etapa, "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.inicio)),
+                   "duracion_s": round(duracion, 3), **registro.resumen(), **extra}
+        os.makedirs(self.carpeta, exist_ok=True)
+        ruta_json = os.path.join(self.carpeta, f"{self.etapa}.json")
+        ruta_prom = os.path.join(self.carpeta, f"{self.etapa}.prom")
+        for ruta, texto in ((ruta_json, json.dumps(resumen, indent=2, ensure_ascii=False)),
+                            (ruta_prom, registro.prometheus())):
+            # El textfile collector puede leer en cualquier momento: nunca un archivo a medias
+            with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+                f.write(texto)
+            os.replace(ruta + ".tmp", ruta)
+        return resumen, ruta_json, ruta_prom
+
+
+def agregar_argumentos(parser):
+    grupo = parser.add_argument_group("métricas")
+    grupo.add_argument("--metricas", metavar="CARPETA", default=CARPETA,
+                       help=f"dónde dejar <etapa>.json y <etapa>.prom (por defecto {CARPETA}/)")
+    grupo.add_argument("--perfil", metavar="ARCHIVO", help="perfilar con cProfile y guardar las estadísticas (pstats)")
+    grupo.add_argument("--memoria", action="store_true", help="seguir las reservas de memoria con tracemalloc")
+    grupo.add_argument("--detallado", action="store_true", help="mostrar la salida de depuración")
+    return grupo
+
+
+def iniciar(etapa, args=None, carpeta=CARPETA, perfil=None, memoria=False, detallado=False):
+    """Fija la etapa del proceso y arranca perfil/memoria según `args` (ver agregar_argumentos)."""
+    global ETAPA, DETALLADO, _corrida
+    if args is not None:
+        carpeta, perfil = args.metricas, args.perfil
+        memoria, detallado = args.memoria, args.detallado
+    ETAPA = etapa
+    if detallado:
+        DETALLADO = True
+        logging.getLogger().setLevel(logging.DEBUG)
+    if _corrida is None:
+        atexit.register(finalizar)  # si el script termina con una excepción, igual quedan las métricas
+    _corrida = _Corrida(etapa, carpeta, perfil, memoria)
+    _corrida.arrancar()
+    return _corrida
+
+
+def finalizar():
+    """Vuelca el resumen JSON y el textfile de Prometheus (una sola vez por corrida)."""
+    if _corrida is None:
+        return None
+    hecho = _corrida.terminar()
+    if hecho is None:
+        return None
+    resumen, ruta_json, ruta_prom = hecho
+    for h in resumen["histogramas"].get("http_segundos", []):
+        e = h["etiquetas"]
+        bytes_host = next((c["valor"] for c in resumen["contadores"].get("http_bytes", []) if c["etiquetas"] == e), 0)
+        print(f"🌐 {e.get('host')}: {h['n']} peticiones, p50 {h['p50'] * 1000:.0f} ms, "
+              f"p95 {h['p95'] * 1000:.0f} ms, {bytes_host / 1e6:.1f} MB")
+    print(f"📊 Métricas de {resumen['etapa']} en {ruta_json} y {ruta_prom}")
+    return resumen
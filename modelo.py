@@ -0,0 +1,399 @@
+import gc
+import os
+import sys
+import json
+import mmap
+import time
+import array
+import struct
+import marshal
+import argparse
+import tracemalloc
+import almacen
+
+# Configuración
+SUFIJO_SNAPSHOT = ".modelo"  # progarchives_albums_full_actualizado.json.modelo
+MAGIA = b"PAMODEL1"
+
+# ---------------------------
+# Modelo compacto del dataset
+# ---------------------------
+# Banda, Biografia, Album y Resena son clases con __slots__ en lugar de dicts,
+# pero responden a get / [] / in / keys / items con las mismas claves del JSON,
+# así que el código que recorre el dataset (indice.py, generar_qr.py, ...) las
+# usa sin cambios. Las cadenas que se repiten (países, autores, tipos de álbum)
+# se guardan una sola vez, y los textos largos (biografías, reseñas,
+# tracklist, lineup) no se cargan: quedan como la posición del texto en el
+# snapshot binario y se leen la primera vez que alguien los pide.
+#
+# Casi toda la memoria del dataset son esos textos. Los __slots__ solo achican
+# la estructura (en este dataset ~106 KB contra ~236 KB de dicts y listas, de
+# unos 3 MB en total), así que sin snapshot el modelo ocupa casi lo mismo que
+# json.load; el ahorro real es no tener los textos en memoria (--comparar).
+#
+# El snapshot (<json>.modelo) se arma solo la primera vez y se vuelve a armar
+# cuando cambia el JSON o su diario. Formato:
+#   MAGIA | cabecera | estructura (marshal) | límites de los textos | textos UTF-8
+
+_FALTA = ...  # clave ausente en el JSON (marshal sabe guardar Ellipsis)
+_CABECERA = struct.Struct("<qqqqQQ")  # firma del JSON y del diario, bytes de estructura, cantidad de textos
+
+
+class _Perezoso:
+    """Campo de texto que queda en el snapshot hasta que se lo pide."""
+
+    def __init__(self, privado):
+        self.privado = privado
+
+    def __get__(self, obj, tipo=None):
+        if obj is None:
+            return self
+        valor = getattr(obj, self.privado)
+        if type(valor) is int:  # posición en el snapshot (los textos del JSON son str o null)
+            valor = obj._fuente.texto(valor)
+            setattr(obj, self.privado, valor)
+        return valor
+
+    def __set__(self, obj, valor):
+        setattr(obj, self.privado, valor)
+
+
+class _Registro:
+    __slots__ = ("_fuente", "_otros")
+    CAMPOS = ()       # claves del JSON, en el orden en que se escriben
+    PEREZOSOS = ()    # de esas, las que se leen del snapshot recién al usarlas
+    INTERNADOS = ()   # las que se repiten mucho entre registros
+    HIJOS = {}        # clave -> clase del registro anidado (o de cada elemento de la lista)
+
+    def _slot(self, clave):
+        return "_" + clave if clave in self.PEREZOSOS else clave
+
+    def __contains__(self, clave):
+        if clave in self.CAMPOS:
+            return hasattr(self, self._slot(clave))
+        return self._otros is not None and clave in self._otros
+
+    def get(self, clave, defecto=None):
+        if clave in self.CAMPOS:
+            return getattr(self, clave, defecto)
+        return self._otros.get(clave, defecto) if self._otros else defecto
+
+    def __getitem__(self, clave):
+        if clave not in self:
+            raise KeyError(clave)
+        return self.get(clave)
+
+    def keys(self):
+        return [c for c in self.CAMPOS if c in self] + list(self._otros or ())
+
+    def items(self):
+        return [(c, self.get(c)) for c in self.keys()]
+
+    def a_dict(self):
+        """El dict tal como está en el JSON (lee los textos perezosos)."""
+        salida = {}
+        for clave, valor in self.items():
+            if isinstance(valor, _Registro):
+                valor = valor.a_dict()
+            elif clave in self.HIJOS and isinstance(valor, list):
+                valor = [v.a_dict() for v in valor]
+            salida[clave] = valor
+        return salida
+
+    # ---------------------------
+    # Armado
+    # ---------------------------
+    @classmethod
+    def desde_dict(cls, d, fuente=None, compartidas=None):
+        """`compartidas`: {cadena: cadena} para guardar una sola copia de las INTERNADAS."""
+        if compartidas is None:
+            compartidas = {}
+        obj = cls.__new__(cls)
+        obj._fuente = fuente
+        obj._otros = {k: v for k, v in d.items() if k not in cls.CAMPOS} or None
+        for clave in cls.CAMPOS:
+            if clave not in d:
+                continue
+            valor = d[clave]
+            if clave in cls.HIJOS and valor is not None:
+                hijo = cls.HIJOS[clave]
+                valor = ([hijo.desde_dict(v, fuente, compartidas) for v in valor] if isinstance(valor, list)
+                         else hijo.desde_dict(valor, fuente, compartidas))
+            elif clave in cls.INTERNADOS and isinstance(valor, str):
+                # Tabla propia y no sys.intern: la tabla global de internadas crece
+                # de a cientos de KB y no se achica al soltar el modelo
+                valor = compartidas.setdefault(valor, valor)
+            setattr(obj, obj._slot(clave), valor)
+        return obj
+
+    @classmethod
+    def _a_tupla(cls, d, textos, compartidas):
+        """Estructura para marshal: los textos perezosos van a `textos` y queda su número."""
+        fila = []
+        for clave in cls.CAMPOS:
+            valor = d.get(clave, _FALTA)
+            if clave in cls.HIJOS and valor not in (None, _FALTA):
+                hijo = cls.HIJOS[clave]
+                valor = ([hijo._a_tupla(v, textos, compartidas) for v in valor] if isinstance(valor, list)
+                         else hijo._a_tupla(valor, textos, compartidas))
+            elif clave in cls.PEREZOSOS and isinstance(valor, str):
+                textos.append(valor)
+                valor = len(textos) - 1
+            elif clave in cls.INTERNADOS and isinstance(valor, str):
+                valor = compartidas.setdefault(valor, valor)  # marshal guarda una sola copia del mismo objeto
+            fila.append(valor)
+        otros = {k: v for k, v in d.items() if k not in cls.CAMPOS}
+        fila.append(otros or None)
+        return tuple(fila)
+
+    @classmethod
+    def _desde_tupla(cls, fila, fuente):
+        obj = cls.__new__(cls)
+        obj._fuente = fuente
+        obj._otros = fila[-1]
+        for clave, valor in zip(cls.CAMPOS, fila):
+            if valor is _FALTA:
+                continue
+            if clave in cls.HIJOS and valor is not None:
+                hijo = cls.HIJOS[clave]
+                valor = [hijo._desde_tupla(v, fuente) for v in valor] if isinstance(valor, list) else hijo._desde_tupla(valor, fuente)
+            setattr(obj, obj._slot(clave), valor)
+        return obj
+
+
+class Resena(_Registro):
+    __slots__ = ("author", "_text", "_translated_text")
+    CAMPOS = ("author", "text", "translated_text")
+    PEREZOSOS = ("text", "translated_text")
+    INTERNADOS = ("author",)
+    text = _Perezoso("_text")
+    translated_text = _Perezoso("_translated_text")
+
+    def __repr__(self):
+        return f"<Resena de {self.get('author')}>"
+
+
+class Biografia(_Registro):
+    __slots__ = ("country", "photo_url", "_original_biography", "_translated_biography")
+    CAMPOS = ("country", "photo_url", "original_biography", "translated_biography")
+    PEREZOSOS = ("original_biography", "translated_biography")
+    INTERNADOS = ("country",)
+    original_biography = _Perezoso("_original_biography")
+    translated_biography = _Perezoso("_translated_biography")
+
+
+class Album(_Registro):
+    __slots__ = ("rank", "title", "album_url", "cover_url", "year", "average_rating", "ratings_count",
+                 "album_type", "_release_info", "_tracklist", "_lineup", "collaborator_reviews")
+    CAMPOS = ("rank", "title", "album_url", "cover_url", "year", "average_rating", "ratings_count",
+              "album_type", "release_info", "tracklist", "lineup", "collaborator_reviews")
+    PEREZOSOS = ("release_info", "tracklist", "lineup")
+    INTERNADOS = ("album_type",)
+    HIJOS = {"collaborator_reviews": Resena}
+    release_info = _Perezoso("_release_info")
+    tracklist = _Perezoso("_tracklist")
+    lineup = _Perezoso("_lineup")
+
+    def __repr__(self):
+        return f"<Album {self.get('title')} ({self.get('year')})>"
+
+
+class Banda(_Registro):
+    __slots__ = ("nombre", "band_url", "biography", "albums")
+    CAMPOS = ("band_url", "biography", "albums")
+    HIJOS = {"biography": Biografia, "albums": Album}
+
+    def __repr__(self):
+        return f"<Banda {self.nombre}: {len(self.get('albums') or [])} álbumes>"
+
+
+def modelo_desde_dicts(datos, fuente=None):
+    """{banda: Banda} a partir del dataset ya cargado como dicts (todo en memoria)."""
+    modelo = {}
+    compartidas = {}
+    for nombre, info in datos.items():
+        banda = Banda.desde_dict(info, fuente, compartidas)
+        banda.nombre = nombre
+        modelo[nombre] = banda
+    return modelo
+
+
+def a_dicts(modelo):
+    """El dataset como dicts, para escribirlo con almacen.escribir_json_atomico."""
+    return {nombre: banda.a_dict() for nombre, banda in modelo.items()}
+
+
+# ---------------------------
+# Snapshot binario
+# ---------------------------
+class _Fuente:
+    """Los textos del snapshot, leídos de un mmap a pedido."""
+
+    def __init__(self, mm, base, limites):
+        self.mm = mm
+        self.base = base
+        self.limites = limites
+
+    def texto(self, k):
+        return self.mm[self.base + self.limites[k]:self.base + self.limites[k + 1]].decode("utf-8")
+
+
+def _firma(ruta_json):
+    diario = ruta_json + almacen.SUFIJO_DIARIO
+    st = os.stat(ruta_json)
+    sd = os.stat(diario) if os.path.exists(diario) else None
+    return st.st_size, st.st_mtime_ns, sd.st_size if sd else -1, sd.st_mtime_ns if sd else -1
+
+
+def guardar_snapshot(datos, ruta, firma=(-1, -1, -1, -1)):
+    """Escribe el snapshot de `datos` (dicts) en `ruta`."""
+    textos = []
+    compartidas = {}
+    estructura = marshal.dumps([(nombre, Banda._a_tupla(info, textos, compartidas)) for nombre, info in datos.items()])
+    limites = array.array("Q", [0])
+    cuerpo = []
+    for t in textos:
+        b = t.encode("utf-8")
+        cuerpo.append(b)
+        limites.append(limites[-1] + len(b))
+    tmp = ruta + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIA)
+        f.write(_CABECERA.pack(*firma, len(estructura), len(textos)))
+        f.write(estructura)
+        f.write(limites.tobytes())
+        f.writelines(cuerpo)
+    os.replace(tmp, ruta)
+
+
+def abrir_snapshot(ruta, firma=None):
+    """{banda: Banda} desde el snapshot, o None si no existe o no corresponde a `firma`."""
+    try:
+        f = open(ruta, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size < len(MAGIA) + _CABECERA.size:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(MAGIA)] != MAGIA:
+        mm.close()
+        return None
+    *firma_guardada, largo, n_textos = _CABECERA.unpack_from(mm, len(MAGIA))
+    if firma is not None and tuple(firma_guardada) != tuple(firma):
+        mm.close()
+        return None
+    inicio = len(MAGIA) + _CABECERA.size
+    estructura = marshal.loads(mm[inicio:inicio + largo])
+    inicio += largo
+    limites = array.array("Q")
+    limites.frombytes(mm[inicio:inicio + 8 * (n_textos + 1)])
+    fuente = _Fuente(mm, inicio + 8 * (n_textos + 1), limites)
+
+    modelo = {}
+    for nombre, fila in estructura:
+        banda = Banda._desde_tupla(fila, fuente)
+        banda.nombre = nombre
+        modelo[nombre] = banda
+    return modelo
+
+
+def cargar(ruta_json, snapshot=True):
+    """
+    Dataset como {banda: Banda}, con el diario de almacen ya aplicado.
+    Con snapshot=True usa (y si hace falta rehace) <ruta_json>.modelo.
+    """
+    if not snapshot:
+        return modelo_desde_dicts(almacen.cargar(ruta_json))
+    ruta = ruta_json + SUFIJO_SNAPSHOT
+    firma = _firma(ruta_json)
+    modelo = abrir_snapshot(ruta, firma)
+    if modelo is None:
+        guardar_snapshot(almacen.cargar(ruta_json), ruta, firma)
+        modelo = abrir_snapshot(ruta, firma)
+    return modelo
+
+
+# ---------------------------
+# Comparación JSON / modelo
+# ---------------------------
+def _medir(funcion, repeticiones):
+    gc.collect()
+    tracemalloc.start()
+    resultado = funcion()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del resultado
+    gc.collect()
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return memoria, (time.perf_counter() - inicio) / repeticiones
+
+
+def _copiar_estructura(valor):
+    # Dicts y listas nuevos sobre las mismas cadenas
+    if isinstance(valor, dict):
+        return {k: _copiar_estructura(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_copiar_estructura(v) for v in valor]
+    return valor
+
+
+def comparar(ruta_json, repeticiones=5):
+    def con_json():
+        with open(ruta_json, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def recorrer_titulos(modelo):
+        # Lo que hacen generar_qr / indice: títulos, URLs y números, sin textos
+        return sum(len(a.get("title") or "") for b in modelo.values() for a in b.get("albums", []))
+
+    # Una pasada sin medir: deja el snapshot armado y hace crecer una sola vez la
+    # tabla de cadenas internadas y la caché de urllib, que si no se le cobran a
+    # la primera fila que las usa
+    cargar(ruta_json, snapshot=False)
+    cargar(ruta_json)
+    datos = con_json()
+    filas = [
+        ("json.load (dicts)", *_medir(con_json, repeticiones)),
+        ("modelo sin snapshot", *_medir(lambda: cargar(ruta_json, snapshot=False), repeticiones)),
+        ("modelo desde snapshot", *_medir(lambda: cargar(ruta_json), repeticiones)),
+        # Mismas cadenas ya en memoria: solo lo que ocupa cada representación
+        ("  estructura dicts", *_medir(lambda: _copiar_estructura(datos), repeticiones)),
+        ("  estructura __slots__", *_medir(lambda: modelo_desde_dicts(datos), repeticiones)),
+    ]
+    modelo = cargar(ruta_json)
+    recorrer_titulos(modelo)
+    print(f"{'carga':<24} {'memoria KB':>11} {'tiempo ms':>10}")
+    for nombre, memoria, segundos in filas:
+        print(f"{nombre:<24} {memoria / 1024:11.0f} {segundos * 1000:10.1f}")
+    print(f"💾 snapshot: {os.path.getsize(ruta_json + SUFIJO_SNAPSHOT) / 1024:.0f} KB "
+          f"(JSON: {os.path.getsize(ruta_json) / 1024:.0f} KB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot binario del dataset y comparación de carga")
+    parser.add_argument("json", nargs="?", default="progarchives_albums_full_actualizado.json")
+    parser.add_argument("--rehacer", action="store_true", help="volver a armar el snapshot aunque esté al día")
+    parser.add_argument("--comparar", action="store_true", help="memoria y tiempo de carga: JSON contra modelo")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.json):
+        print(f"❌ No existe {args.json}")
+        return 1
+    if args.rehacer and os.path.exists(args.json + SUFIJO_SNAPSHOT):
+        os.remove(args.json + SUFIJO_SNAPSHOT)
+    if args.comparar:
+        comparar(args.json)
+        return 0
+    inicio = time.perf_counter()
+    modelo = cargar(args.json)
+    albums = sum(len(b.get("albums") or []) for b in modelo.values())
+    print(f"📦 {args.json}{SUFIJO_SNAPSHOT}: {len(modelo)} bandas, {albums} álbumes "
+          f"en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
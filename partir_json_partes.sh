@@ -1,11 +1,5 @@
 #!/bin/bash
 
-
-# Parte 1
-jq 'to_entries | .[0:(length / 3 | floor)] | from_entries' progarchives_albums_full_actualizado.json > parte1.json
-
-# Parte 2
-jq 'to_entries | .[(length / 3 | floor):(2 * (length / 3 | floor))] | from_entries' progarchives_albums_full_actualizado.json > parte2.json
-
-# Parte 3
-jq 'to_entries | .[(2 * (length / 3 | floor)):] | from_entries' progarchives_albums_full_actualizado.json > parte3.json
+# Parte el dataset en tomos con una cantidad pareja de páginas (ver partir_partes.py).
+# Uso: ./partir_json_partes.sh [-n PARTES] [entrada.json]
+exec python3 "$(dirname "$0")/partir_partes.py" "$@"
@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+import argparse
+import almacen
+import libro
+
+# Configuración
+ENTRADA = "progarchives_albums_full_actualizado.json"
+PREFIJO = "parte"   # parte1.json, parte2.json, ...
+PARTES = 3
+
+# ---------------------------
+# Partición en tomos parejos
+# ---------------------------
+# El dataset se lee una vez y cada banda pesa las páginas que ocupa en el libro
+# (portada, biografía, álbumes y reseñas, según la paginación de libro.py). Las
+# bandas se cortan en tramos contiguos en el orden alfabético del libro, de modo
+# que las partes queden lo más parejas posible en páginas, y se escriben todas
+# en una sola pasada, banda por banda.
+
+
+def paginas_de_banda(nombre, info, qr_dir=libro.QR_DIR):
+    return (len(libro.paginas_banda(nombre, info))
+            + sum(len(libro.paginas_album(album, qr_dir)) for album in libro.orden_albums(info)))
+
+
+def partir(pesos, n):
+    """
+    Índices de inicio de cada uno de los n tramos contiguos de `pesos`.
+    Se minimiza la suma de los cuadrados de los tramos: con el mismo total,
+    es mínima cuando todos pesan lo mismo.
+    """
+    acumulado = [0]
+    for p in pesos:
+        acumulado.append(acumulado[-1] + p)
+    total = len(pesos)
+    infinito = float("inf")
+    # costo[k][i]: mejor reparto de los primeros i pesos en k tramos; desde[k][i]: dónde empieza el último
+    costo = [[infinito] * (total + 1) for _ in range(n + 1)]
+    desde = [[0] * (total + 1) for _ in range(n + 1)]
+    costo[0][0] = 0
+    for k in range(1, n + 1):
+        for i in range(k, total - (n - k) + 1):
+            for j in range(k - 1, i):
+                c = costo[k - 1][j] + (acumulado[i] - acumulado[j]) ** 2
+                if c < costo[k][i]:
+                    costo[k][i] = c
+                    desde[k][i] = j
+    inicios = []
+    i = total
+    for k in range(n, 0, -1):
+        i = desde[k][i]
+        inicios.append(i)
+    return inicios[::-1]
+
+
+def _entrada_json(nombre, info):
+    # Lo mismo que escribiría json.dump(parte, indent=2) para esta clave
+    return json.dumps({nombre: info}, indent=2, ensure_ascii=False)[2:-2]
+
+
+def escribir_partes(datos, orden, inicios, prefijo):
+    """Escribe las partes recorriendo las bandas una vez; devuelve las rutas."""
+    limites = inicios[1:] + [len(orden)]
+    rutas = []
+    for numero, (inicio, fin) in enumerate(zip(inicios, limites), 1):
+        ruta = f"{prefijo}{numero}.json"
+        with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+            f.write("{\n")
+            f.write(",\n".join(_entrada_json(nombre, datos[nombre]) for nombre in orden[inicio:fin]))
+            f.write("\n}")
+        rutas.append(ruta)
+    for ruta in rutas:
+        os.replace(ruta + ".tmp", ruta)
+    return rutas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parte el dataset en tomos con una cantidad pareja de páginas")
+    parser.add_argument("entrada", nargs="?", default=ENTRADA)
+    parser.add_argument("-n", "--partes", type=int, default=PARTES)
+    parser.add_argument("--prefijo", default=PREFIJO, help="las partes se llaman <prefijo>1.json, <prefijo>2.json, ...")
+    parser.add_argument("--qr", default=libro.QR_DIR, help="carpeta de los QR (cambian el alto de cada álbum)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.entrada):
+        print(f"❌ No existe {args.entrada}")
+        return 1
+    inicio = time.perf_counter()
+    datos = almacen.cargar(args.entrada)
+    orden = libro.orden_bandas(datos)
+    if not 1 <= args.partes <= len(orden):
+        parser.error(f"--partes tiene que estar entre 1 y {len(orden)}")
+
+    pesos = [paginas_de_banda(nombre, datos[nombre], args.qr) for nombre in orden]
+    inicios = partir(pesos, args.partes)
+    rutas = escribir_partes(datos, orden, inicios, args.prefijo)
+
+    print(f"{'parte':<12} {'bandas':>6} {'álbumes':>8} {'páginas':>8}  desde - hasta")
+    for ruta, desde, hasta in zip(rutas, inicios, inicios[1:] + [len(orden)]):
+        bandas = orden[desde:hasta]
+        albums = sum(len(datos[b].get("albums", [])) for b in bandas)
+        print(f"{ruta:<12} {len(bandas):6d} {albums:8d} {sum(pesos[desde:hasta]):8d}  {bandas[0]} - {bandas[-1]}")
+    print(f"⏱ {sum(pesos)} páginas en {len(rutas)} partes, {time.perf_counter() - inicio:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,561 @@
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import graphlib
+import itertools
+import threading
+from collections import Counter
+import almacen
+import cliente_http
+import extractor
+import metricas
+import corregir_codificacion_utf as codificacion
+from actualizar import detectar_y_arreglar_encoding
+
+# Configuración
+HTML_FILE = "table.html"
+SALIDA = "progarchives_albums_full_actualizado.json"
+PUNTOS = "pipeline_puntos.sqlite"
+BASE_URL = "https://www.progarchives.com/"
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+MAX_REVIEW_CHARS = 4000
+GPT_TRANSLATE = True
+GENERAR_QR = True
+TAM_COLA = 16           # registros esperando entre una etapa y la siguiente
+LOTE_TRADUCCION = 8     # registros que se juntan en una sola llamada a traducir_textos
+# Hilos por etapa. La reparación va en uno solo: el vocabulario aprende de cada
+# registro que pasa y sus contadores no se comparten entre hilos.
+HILOS = {"extraccion": 8, "enriquecimiento": 4, "reparacion": 1, "traduccion": 2, "qr": 4}
+# Etapas que recorre cada tipo de registro, en orden. Juntas forman el DAG:
+#
+#   extraccion ──────────┐
+#       │ (banda nueva)  ├─> reparacion ─> traduccion ─┬─> qr ─> guardado
+#   enriquecimiento ─────┘                             └──────> guardado
+RUTAS = {
+    "album": ("extraccion", "reparacion", "traduccion", "qr"),
+    "banda": ("enriquecimiento", "reparacion", "traduccion"),
+}
+
+# ---------------------------
+# Pipeline por registro
+# ---------------------------
+# prog.py → completar.py → actualizar.py → corregir_codificacion_utf.py → generar_qr.py
+# cargan y reescriben el catálogo entero, y cada uno espera a que termine el
+# anterior. Acá cada álbum (y cada banda, la primera vez que aparece) pasa por
+# las etapas apenas está listo: mientras se bajan los últimos álbumes de la
+# tabla, los primeros ya se traducen y tienen su QR.
+#
+# Entre etapa y etapa hay una cola acotada: si la traducción se atrasa, la
+# extracción se frena en vez de acumular páginas en memoria. Cada registro
+# guarda en SQLite su último paso completado (con sus datos); una corrida
+# cortada o con errores retoma cada registro en la etapa donde quedó. Al final
+# de su ruta el registro entra al dataset por el diario de almacen.py.
+#
+#   python pipeline.py --tabla "https://www.progarchives.com/top-prog-albums.asp?page={pagina}" --paginas 5
+
+
+class PuntosControl:
+    """Último paso completado de cada registro (clave -> registro con sus datos)."""
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or PUNTOS
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS registros ("
+            " clave TEXT PRIMARY KEY, tipo TEXT NOT NULL, estado TEXT NOT NULL, paso INTEGER NOT NULL,"
+            " registro TEXT, error TEXT, actualizado REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _escribir(self, registro, estado, guardar_datos=True, error=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO registros (clave, tipo, estado, paso, registro, error, actualizado)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (registro["clave"], registro["tipo"], estado, registro["paso"],
+                 json.dumps(registro, ensure_ascii=False) if guardar_datos else None, error, time.time()),
+            )
+            self._db.commit()
+
+    def guardar(self, registro):
+        self._escribir(registro, "en_curso")
+
+    def fallo(self, registro, error):
+        # Se conservan los datos del último paso completado: de ahí se retoma
+        self._escribir(registro, "error", error=error)
+
+    def terminar(self, registro):
+        # Ya está en el dataset; no hace falta guardar sus datos
+        self._escribir(registro, "listo", guardar_datos=False)
+
+    def todos(self):
+        """clave -> (estado, registro o None)."""
+        with self._lock:
+            filas = self._db.execute("SELECT clave, estado, registro FROM registros").fetchall()
+        return {clave: (estado, json.loads(registro) if registro else None) for clave, estado, registro in filas}
+
+    def cerrar(self):
+        self._db.close()
+
+
+class Etapa:
+    """
+    Un nodo del DAG: `funcion(registros)` procesa una lista de registros (hasta
+    `lote`, los que ya estén en la cola) y devuelve los registros nuevos que
+    haya que sumar al pipeline, o None.
+    """
+
+    def __init__(self, nombre, funcion, hilos=1, lote=1):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.hilos = hilos
+        self.lote = lote
+        self.registros = 0
+        self.errores = 0
+        self.segundos = 0.0
+
+
+class Pipeline:
+    """
+    Corre las etapas a la vez, cada una con sus hilos y una cola acotada de
+    entrada. Un registro {"clave", "tipo", "banda", "paso", ...} avanza por
+    rutas[tipo]; "paso" es cuántas etapas de su ruta ya completó.
+    """
+
+    def __init__(self, etapas, rutas, puntos, al_terminar, tam_cola=TAM_COLA):
+        self.etapas = {e.nombre: e for e in etapas}
+        self.rutas = rutas
+        self.orden = self._ordenar()
+        self.puntos = puntos
+        self.al_terminar = al_terminar
+        self.colas = {nombre: queue.Queue(maxsize=tam_cola) for nombre in self.etapas}
+        self.terminados = Counter()
+        self.fallidos = Counter()
+        self._en_vuelo = 0
+        self._cond = threading.Condition()
+
+    def _ordenar(self):
+        """Orden topológico de las etapas; falla si una ruta nombra una etapa que no existe o hay un ciclo."""
+        grafo = graphlib.TopologicalSorter({nombre: () for nombre in self.etapas})
+        for tipo, ruta in self.rutas.items():
+            desconocidas = [nombre for nombre in ruta if nombre not in self.etapas]
+            if desconocidas:
+                raise ValueError(f"la ruta de {tipo} usa etapas que no existen: {', '.join(desconocidas)}")
+            for anterior, siguiente in zip(ruta, ruta[1:]):
+                grafo.add(siguiente, anterior)
+        return list(grafo.static_order())
+
+    # ---------------------------
+    # Encaminamiento
+    # ---------------------------
+    def enviar(self, registro):
+        """Pone el registro en la cola de su próxima etapa (se bloquea si está llena) o lo termina."""
+        ruta = self.rutas[registro["tipo"]]
+        if registro["paso"] >= len(ruta):
+            self._terminar(registro)
+            return
+        with self._cond:
+            self._en_vuelo += 1
+        cola = self.colas[ruta[registro["paso"]]]
+        cola.put(registro)
+        metricas.fijar("pipeline_cola", cola.qsize(), nodo=ruta[registro["paso"]])
+
+    def _terminar(self, registro):
+        try:
+            self.al_terminar(registro)
+        except Exception as e:
+            self._fallo(registro, "guardado", e)
+            return
+        self.puntos.terminar(registro)
+        with self._cond:
+            self.terminados[registro["tipo"]] += 1
+        metricas.contar("pipeline_terminados", tipo=registro["tipo"])
+
+    def _fallo(self, registro, etapa, error):
+        print(f"⚠️ {registro['clave']} en {etapa}: {error}")
+        self.puntos.fallo(registro, f"{etapa}: {error}")
+        with self._cond:
+            self.fallidos[etapa] += 1
+        metricas.contar("pipeline_errores", nodo=etapa)
+
+    def _listos(self, n):
+        with self._cond:
+            self._en_vuelo -= n
+            if self._en_vuelo == 0:
+                self._cond.notify_all()
+
+    # ---------------------------
+    # Trabajadores
+    # ---------------------------
+    def _trabajar(self, etapa):
+        cola = self.colas[etapa.nombre]
+        fin = False
+        while not fin:
+            registro = cola.get()
+            if registro is None:
+                break
+            registros = [registro]
+            # Lo que ya está esperando se procesa junto, sin esperar a que llegue más
+            while len(registros) < etapa.lote:
+                try:
+                    registro = cola.get_nowait()
+                except queue.Empty:
+                    break
+                if registro is None:
+                    fin = True
+                    break
+                registros.append(registro)
+            self._procesar(etapa, registros)
+
+    def _procesar(self, etapa, registros):
+        inicio = time.perf_counter()
+        try:
+            nuevos = etapa.funcion(registros) or []
+        except Exception as e:
+            with self._cond:
+                etapa.errores += len(registros)
+            for registro in registros:
+                self._fallo(registro, etapa.nombre, e)
+            self._listos(len(registros))
+            return
+        segundos = time.perf_counter() - inicio
+        with self._cond:
+            etapa.segundos += segundos
+            etapa.registros += len(registros)
+        metricas.observar("pipeline_segundos", segundos, nodo=etapa.nombre)
+
+        # Los registros nuevos se confirman antes que el que los creó: si se corta
+        # acá, al retomar no se pierde una banda que su álbum ya no va a volver a pedir
+        for registro in nuevos:
+            self.puntos.guardar(registro)
+        for registro in registros:
+            registro["paso"] += 1
+            self.puntos.guardar(registro)
+        for registro in [*nuevos, *registros]:
+            self.enviar(registro)
+        self._listos(len(registros))
+
+    def ejecutar(self, registros):
+        """
+        Hace pasar los registros por el DAG y vuelve cuando todos terminaron o
+        fallaron. Si `registros` lanza una excepción (p. ej. no se pudo leer una
+        página del ranking), igual se espera a los que ya entraron, con sus
+        puntos de control, y después se la vuelve a lanzar.
+        """
+        hilos = []
+        for nombre in self.orden:
+            etapa = self.etapas[nombre]
+            for i in range(etapa.hilos):
+                # daemon: con Ctrl+C el proceso sale y los puntos de control ya guardados alcanzan para retomar
+                hilo = threading.Thread(target=self._trabajar, args=(etapa,), name=f"{nombre}-{i}", daemon=True)
+                hilo.start()
+                hilos.append(hilo)
+
+        error = None
+        try:
+            for registro in registros:
+                self.enviar(registro)
+        except Exception as e:
+            # main() cierra los puntos de control al salir: antes tienen que terminar los trabajadores
+            error = e
+        with self._cond:
+            self._cond.wait_for(lambda: self._en_vuelo == 0)
+
+        for nombre in self.orden:
+            for _ in range(self.etapas[nombre].hilos):
+                self.colas[nombre].put(None)
+        for hilo in hilos:
+            hilo.join()
+        if error is not None:
+            raise error
+
+
+# ---------------------------
+# Etapas
+# ---------------------------
+def _bajar(url):
+    res = cliente_http.get(url, headers=HEADERS)
+    if res.status_code != 200:
+        raise Exception(f"HTTP {res.status_code} en {url}")
+    # La detección de actualizar.py: la página ya llega bien decodificada
+    html, _ = detectar_y_arreglar_encoding(res)
+    return html
+
+
+def _cadenas(valor, campo=None):
+    """(contenedor, clave, campo, texto) de cada cadena de un registro, recorriendo dicts y listas."""
+    if isinstance(valor, dict):
+        for k, v in valor.items():
+            if isinstance(v, str):
+                yield valor, k, k, v
+            else:
+                yield from _cadenas(v, k)
+    elif isinstance(valor, list):
+        for i, v in enumerate(valor):
+            if isinstance(v, str):
+                yield valor, i, campo, v
+            else:
+                yield from _cadenas(v, campo)
+
+
+class Tareas:
+    """Las funciones de cada etapa y lo que comparten: el almacén, las bandas ya vistas y los QR."""
+
+    def __init__(self, salida, bandas_vistas=(), traducir=GPT_TRANSLATE, qr=GENERAR_QR):
+        self.salida = salida
+        self.traducir_activo = traducir
+        self._bandas = set(bandas_vistas)
+        self._lock = threading.Lock()
+
+        vocabulario = codificacion.Vocabulario()
+        for palabra in codificacion.DICCIONARIO:
+            vocabulario.aprender(palabra, peso=0)
+        if os.path.exists(salida.ruta_json):
+            codificacion.aprender_de([salida.ruta_json], vocabulario)
+        self.reparador = codificacion.Reparador(vocabulario)
+
+        self.motor = self.cache = None
+        self.proveedores = {}
+        self._sin_token = set()
+        self._lock_tokens = threading.Lock()
+        if qr:
+            import generar_qr
+            import render_qr
+            self.proveedores = generar_qr.crear_proveedores()
+            self.cache = generar_qr.CacheBusquedas()
+            self.motor = render_qr.MotorQR(procesos=generar_qr.MAX_RENDER)
+
+    def cerrar(self):
+        if self.motor is not None:
+            self.motor.cerrar()
+            self.cache.cerrar()
+
+    def etapas(self, hilos=HILOS):
+        return [
+            Etapa("extraccion", self.extraer, hilos["extraccion"]),
+            Etapa("enriquecimiento", self.enriquecer, hilos["enriquecimiento"]),
+            Etapa("reparacion", self.reparar, hilos["reparacion"]),
+            Etapa("traduccion", self.traducir, hilos["traduccion"], lote=LOTE_TRADUCCION),
+            Etapa("qr", self.qr, hilos["qr"]),
+        ]
+
+    def _banda_nueva(self, registro):
+        """El registro de la banda del álbum, la primera vez que aparece y si le falta la info del artista."""
+        banda = registro["banda"]
+        with self._lock:
+            if banda in self._bandas:
+                return None
+            self._bandas.add(banda)
+        if "country" in self.salida.datos.get(banda, {}).get("biography", {}):
+            return None
+        return {"clave": "banda:" + banda, "tipo": "banda", "banda": banda, "paso": 0,
+                "datos": {"band_url": registro["band_url"]}}
+
+    # prog.py (página del álbum)
+    def extraer(self, registros):
+        nuevos = []
+        for registro in registros:
+            album = registro["datos"]
+            album.update(extractor.extraer_album(_bajar(album["album_url"]), MAX_REVIEW_CHARS))
+            banda = self._banda_nueva(registro)
+            if banda:
+                nuevos.append(banda)
+        return nuevos
+
+    # completar.py (país, foto y biografía); la biografía que ya estaba se conserva
+    def enriquecer(self, registros):
+        for registro in registros:
+            datos = registro["datos"]
+            artista = extractor.extraer_artista(_bajar(datos["band_url"]))
+            actual = self.salida.datos.get(registro["banda"], {}).get("biography", {})
+            con_bio = bool(actual.get("original_biography"))
+            datos["biography"] = {
+                "country": artista["country"],
+                "photo_url": artista["photo_url"],
+                "original_biography": actual["original_biography"] if con_bio else artista["biography"],
+                "translated_biography": actual.get("translated_biography", "") if con_bio else "",
+            }
+
+    # corregir_codificacion_utf.py, registro por registro
+    def reparar(self, registros):
+        for registro in registros:
+            cadenas = list(_cadenas(registro["datos"]))
+            # Primero se aprenden las palabras sanas del registro: "Capit�n" se
+            # resuelve con el "Capitán" de la reseña del mismo álbum
+            for *_, texto in cadenas:
+                if not texto.isascii():
+                    self.reparador.vocabulario.aprender(texto)
+            for contenedor, clave, campo, texto in cadenas:
+                if texto.isascii() or not codificacion.SOSPECHOSO.search(texto):
+                    continue
+                nuevo = self.reparador.reparar(texto, campo)
+                if nuevo is not texto:
+                    contenedor[clave] = nuevo
+                    metricas.contar("pipeline_reparadas", campo=str(campo))
+
+    # lotes_traduccion.py: reseñas y biografías de varios registros en una sola llamada
+    def traducir(self, registros):
+        if not self.traducir_activo:
+            return
+        import lotes_traduccion
+        destinos = []  # (dict, clave de la traducción, texto original)
+        for registro in registros:
+            datos = registro["datos"]
+            if registro["tipo"] == "album":
+                for r in datos.get("collaborator_reviews", []):
+                    if r.get("text") and not r.get("translated_text"):
+                        destinos.append((r, "translated_text", r["text"]))
+            else:
+                bio = datos.get("biography", {})
+                if bio.get("original_biography") and not bio.get("translated_biography"):
+                    destinos.append((bio, "translated_biography", bio["original_biography"]))
+        if destinos:
+            traducidos = lotes_traduccion.traducir_textos([texto for *_, texto in destinos])
+            for (destino, clave, _), traducido in zip(destinos, traducidos):
+                destino[clave] = traducido
+
+    def _proveedor_activo(self, nombre):
+        proveedor = self.proveedores[nombre][0]
+        with self._lock_tokens:
+            if nombre in self._sin_token:
+                return False
+            try:
+                proveedor.token.valor()
+            except Exception as e:
+                print(f"[ERROR] {e}; se omiten las búsquedas en {proveedor.nombre}")
+                self._sin_token.add(nombre)
+                return False
+        return True
+
+    # generar_qr.py, con la misma caché de búsquedas y el mismo pool de render
+    def qr(self, registros):
+        if self.motor is None:
+            return
+        for registro in registros:
+            album = registro["datos"]
+            consulta = f"{registro['banda']} - {album.get('title')}"
+            # El mismo id que generar_qr.py: sin id de ProgArchives, "banda/título"
+            prog_id = almacen.id_progarchives(album.get("album_url")) or f"{registro['banda']}/{album.get('title')}"
+            renders = []
+            for nombre, (proveedor, plantilla, logo, carpeta) in self.proveedores.items():
+                encontrado, album_id = self.cache.obtener(nombre, consulta)
+                if encontrado:
+                    proveedor.desde_cache += 1
+                elif self._proveedor_activo(nombre):
+                    # SinRespuesta no se guarda: el registro queda con error y se reintenta
+                    album_id = proveedor.buscar(consulta)
+                    self.cache.guardar(nombre, consulta, album_id, plantilla.format(album_id) if album_id else None)
+                else:
+                    continue
+                if album_id:
+                    path = almacen.ruta_qr(carpeta, prog_id)
+                    renders.append(self.motor.enviar(plantilla.format(album_id), logo, path))
+                else:
+                    metricas.depurar("Sin ID de %s para %s", proveedor.nombre, consulta)
+            for futuro in renders:
+                futuro.result()
+
+    def guardar(self, registro):
+        if registro["tipo"] == "album":
+            self.salida.guardar_album(registro["banda"], registro["datos"])
+        else:
+            self.salida.guardar_banda(registro["banda"], registro["datos"])
+        metricas.depurar("✓ %s listo: %s", registro["tipo"], registro["clave"])
+
+
+# ---------------------------
+# Registros de entrada
+# ---------------------------
+def clave_album(album):
+    return "album:" + (almacen.id_progarchives(album.get("album_url")) or album.get("title") or "")
+
+
+def registros_de_filas(filas, salida, vistas):
+    """Un registro por fila de ranking, salvo los álbumes que ya están en el dataset o en los puntos de control."""
+    for fila in filas:
+        album = fila["album"]
+        clave = clave_album(album)
+        if clave in vistas or salida.existe_album(fila["band_name"], album["title"]):
+            continue
+        vistas.add(clave)  # una tabla puede repetir un álbum
+        yield {"clave": clave, "tipo": "album", "banda": fila["band_name"], "band_url": fila["band_url"],
+               "paso": 0, "datos": album}
+
+
+def _hilos(texto):
+    nombre, _, n = texto.partition("=")
+    if nombre not in HILOS:
+        raise argparse.ArgumentTypeError(f"etapa desconocida: {nombre} (hay {', '.join(HILOS)})")
+    try:
+        return nombre, max(1, int(n))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"se espera ETAPA=N, no {texto}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extrae, completa, repara, traduce y genera QR álbum por álbum")
+    parser.add_argument("--tabla", action="append",
+                        help=f"archivo HTML o URL de ranking, repetible (por defecto {HTML_FILE}); "
+                             "'{pagina}' en la URL se reemplaza por 1..--paginas")
+    parser.add_argument("--paginas", type=int, default=1)
+    parser.add_argument("--base-url", default=BASE_URL, help="base de los enlaces de las tablas")
+    parser.add_argument("-o", "--salida", default=SALIDA)
+    parser.add_argument("--puntos", default=PUNTOS, help="SQLite con el último paso completado de cada registro")
+    parser.add_argument("--hilos", type=_hilos, action="append", default=[], metavar="ETAPA=N",
+                        help=f"hilos de una etapa ({', '.join(HILOS)})")
+    parser.add_argument("--cola", type=int, default=TAM_COLA, help="registros en espera entre etapas")
+    parser.add_argument("--sin-traducir", action="store_true")
+    parser.add_argument("--sin-qr", action="store_true")
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+    metricas.iniciar("pipeline", args)
+
+    inicio = time.perf_counter()
+    salida = almacen.Almacen(args.salida)
+    puntos = PuntosControl(args.puntos)
+    previos = puntos.todos()
+    # Lo que quedó a medias (o con error) se retoma en la etapa que sigue a su último paso
+    retomados = [registro for estado, registro in previos.values() if estado != "listo" and registro]
+    bandas_vistas = {clave.removeprefix("banda:") for clave in previos if clave.startswith("banda:")}
+
+    tareas = Tareas(salida, bandas_vistas, traducir=GPT_TRANSLATE and not args.sin_traducir,
+                    qr=GENERAR_QR and not args.sin_qr)
+    pipeline = Pipeline(tareas.etapas({**HILOS, **dict(args.hilos)}), RUTAS, puntos, tareas.guardar, args.cola)
+    if retomados:
+        print(f"↩️ Se retoman {len(retomados)} registros de una corrida anterior ("
+              + ", ".join(f"{tipo} {n}" for tipo, n in Counter(r["tipo"] for r in retomados).items()) + ")")
+
+    fuentes = list(extractor.expandir_fuentes(args.tabla or [HTML_FILE], args.paginas))
+    filas = extractor.iterar_rankings(fuentes, args.base_url)
+    try:
+        # Las tablas se leen a medida que el pipeline pide registros
+        pipeline.ejecutar(itertools.chain(retomados, registros_de_filas(filas, salida, set(previos))))
+    finally:
+        tareas.cerrar()
+        puntos.cerrar()
+    if sum(pipeline.terminados.values()):
+        salida.cerrar()  # el JSON se reescribe una sola vez, al final; hasta acá todo fue al diario
+
+    for nombre in pipeline.orden:
+        etapa = pipeline.etapas[nombre]
+        if etapa.registros or etapa.errores:
+            print(f"🧩 {nombre}: {etapa.registros} registros en {etapa.segundos:.1f}s de trabajo"
+                  + (f", {etapa.errores} con error" if etapa.errores else ""))
+    if tareas.motor is not None:
+        print(f"🔳 QR: {tareas.motor.generados} generados, {tareas.motor.omitidos} sin cambios")
+    errores = sum(pipeline.fallidos.values())
+    print(f"⏱ {pipeline.terminados['album']} álbumes y {pipeline.terminados['banda']} bandas en "
+          f"{time.perf_counter() - inicio:.1f}s" + (f"; {errores} con error (se retoman en la próxima corrida)"
+                                                    if errores else ""))
+    metricas.finalizar()
+    return 0 if not errores else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
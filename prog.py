@@ -1,11 +1,17 @@
-import json
-import os
 import time
 import logging
-from bs4 import BeautifulSoup
-import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import asyncio
+import queue
+import threading
+import cliente_http
+import extractor
+import metricas
+from concurrent.futures import ThreadPoolExecutor
 import openai
+import traduccion
+import lotes_traduccion
+from almacen import Almacen
 
 # Config
 HTML_FILE = "table.html"
@@ -13,6 +19,10 @@ OUTPUT_JSON = "progarchives_albums_full.json"
 BASE_URL = "https://www.progarchives.com/"
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 MAX_WORKERS = 12
+TAMANO_COLA = 2 * MAX_WORKERS  # filas leídas por adelantado: la tabla no se lee más rápido de lo que se procesa
+MAX_INFLIGHT = 16          # modo async: páginas de ProgArchives en vuelo a la vez
+REQUESTS_PER_SECOND = 4.0  # modo async: ritmo sostenido contra ProgArchives
+MAX_TRADUCCIONES = 8       # modo async: llamadas a GPT simultáneas
 MAX_REVIEW_CHARS = 4000
 GPT_TRANSLATE = True
 OPENAI_API_KEY = "OPENAI_API_KEY"
@@ -21,44 +31,29 @@ openai.api_key = OPENAI_API_KEY
 # Logger setup
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# Cargar archivo JSON existente si lo hay
-if os.path.exists(OUTPUT_JSON):
-    with open(OUTPUT_JSON, "r", encoding="utf-8") as f:
-        bands = json.load(f)
-else:
-    bands = {}
+# Cargar el almacén (JSON existente + diario pendiente, si lo hay)
+almacen = Almacen(OUTPUT_JSON)
+bands = almacen.datos
+
+def traducir_varios(textos):
+    if not GPT_TRANSLATE:
+        return list(textos)
+    # Pipeline compartido con completar.py: caché en disco, lotes y troceo de textos largos
+    return lotes_traduccion.traducir_textos(textos)
 
 def traducir(texto):
     if not GPT_TRANSLATE or not texto:
         return texto
-    try:
-        logging.debug("→ Traduciendo con GPT...")
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "user", "content": f"Traduce al español el siguiente texto manteniendo el estilo original:\n\n{texto}"}
-            ],
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logging.error(f"Error al traducir: {e}")
-        return texto
+    return traducir_varios([texto])[0]
 
-def fetch_artist_info(band_url):
+def fetch_artist_info(band_url, traducir_ahora=True):
     try:
-        res = requests.get(band_url, headers=HEADERS)
+        res = cliente_http.get(band_url, headers=HEADERS)
         res.encoding = "utf-8"
-        soup = BeautifulSoup(res.text, "html.parser")
-        bio_span = soup.select_one("span#moreBio")
-        bio_text = ""
-
-        if bio_span:
-            for tag in bio_span.find_all("a"):
-                tag.unwrap()
-            bio_text = bio_span.get_text(separator="\n", strip=True)
+        bio_text = extractor.extraer_artista(res.text)["biography"]
 
-        translated_bio = traducir(bio_text)
+        # En modo async la traducción se hace aparte, fuera del cupo de red
+        translated_bio = traducir(bio_text) if traducir_ahora else ""
         return {
             "band_url": band_url,
             "biography": {
@@ -75,137 +70,252 @@ def fetch_artist_info(band_url):
             "albums": []
         }
 
-def fetch_album_details(album_url):
+def fetch_album_details(album_url, traducir_ahora=True):
     try:
-        res = requests.get(album_url, headers=HEADERS)
+        res = cliente_http.get(album_url, headers=HEADERS)
         res.encoding = "utf-8"
-        soup = BeautifulSoup(res.text, "html.parser")
-
-        details = {
-            "album_type": None,
-            "release_info": None,
-            "tracklist": None,
-            "lineup": None,
-            "collaborator_reviews": []
-        }
+        details = extractor.extraer_album(res.text, MAX_REVIEW_CHARS)
 
-        type_block = soup.find("strong", string=lambda x: x and "Album" in x)
-        if type_block:
-            details["album_type"] = type_block.get_text(strip=True)
-            release_info = type_block.find_next("p")
-            if release_info:
-                details["release_info"] = release_info.get_text(separator="\n", strip=True)
-
-        tracklist_tag = soup.find("strong", string="Songs / Tracks Listing")
-        if tracklist_tag:
-            tracklist = tracklist_tag.find_next("p")
-            if tracklist:
-                details["tracklist"] = tracklist.get_text(separator="\n", strip=True)
-
-        lineup_tag = soup.find("strong", string="Line-up / Musicians")
-        if lineup_tag:
-            lineup = lineup_tag.find_next("p")
-            if lineup:
-                details["lineup"] = lineup.get_text(separator="\n", strip=True)
-
-        reviews = soup.find_all("div", style=lambda x: x and "background-color:#f0f0f0" in x)
-        char_count = 0
-        for r in reviews:
-            if "SPECIAL COLLABORATOR" in r.get_text():
-                content = r.find("div", style=lambda x: x and "color:#333" in x)
-                if content:
-                    text = content.get_text(separator="\n", strip=True)
-                    if char_count + len(text) > MAX_REVIEW_CHARS:
-                        break
-                    char_count += len(text)
-                    author_tag = r.find("a")
-                    author = author_tag.get_text(strip=True) if author_tag else "Desconocido"
-                    translated = traducir(text)
-                    details["collaborator_reviews"].append({
-                        "author": author,
-                        "text": text,
-                        "translated_text": translated
-                    })
+        # Todas las reseñas del álbum van juntas al traductor (un lote, no una llamada por reseña)
+        if traducir_ahora:
+            reviews = details["collaborator_reviews"]
+            for r, t in zip(reviews, traducir_varios([r["text"] for r in reviews])):
+                r["translated_text"] = t
 
         return details
     except Exception as e:
         logging.error(f"Error en detalles del álbum {album_url}: {e}")
         return {}
 
-def process_album(row):
-    cols = row.find_all("td")
-    if len(cols) < 4:
-        return None
+def process_album(fila):
+    band_name = fila["band_name"]
+    band_url = fila["band_url"]
+    album_data = fila["album"]
+    album_name = album_data["title"]
 
-    try:
-        rank = int(cols[0].text.strip())
-    except:
+    if almacen.existe_album(band_name, album_name):
+        logging.debug("⏩ Álbum ya existe: %s (%s)", album_name, band_name)
         return None
 
-    album_link = cols[2].find_all("a")[0]
-    band_link = cols[2].find_all("a")[1]
-
-    album_name = album_link.text.strip()
-    band_name = band_link.text.strip()
-
-    if band_name in bands:
-        if any(a["title"] == album_name for a in bands[band_name]["albums"]):
-            logging.info(f"⏩ Álbum ya existe: {album_name} ({band_name})")
-            return None
+    logging.debug("→ Procesando álbum: %s (%s)", album_name, band_name)
 
-    album_url = BASE_URL + album_link["href"]
-    band_url = BASE_URL + band_link["href"]
+    album_data.update(fetch_album_details(album_data["album_url"]))
 
-    img_tag = cols[1].find("img")
-    cover_url = img_tag["src"] if img_tag else ""
-    info = cols[3].text.strip()
-    year = int(info[-4:]) if info[-4:].isdigit() else None
+    if not almacen.existe_banda(band_name):
+        logging.debug("→ Extrayendo biografía de: %s", band_name)
+        almacen.guardar_banda(band_name, fetch_artist_info(band_url))
 
-    rating_span = cols[4].find("span", id=lambda x: x and "avgRatings_" in x)
-    count_span = cols[4].find("span", id=lambda x: x and "nbRatings_" in x)
-    avg_rating = float(rating_span.text.strip()) if rating_span else None
-    rating_count = int(count_span.text.strip().replace(",", "")) if count_span else None
-
-    logging.info(f"→ Procesando álbum: {album_name} ({band_name})")
-
-    album_data = {
-        "rank": rank,
-        "title": album_name,
-        "album_url": album_url,
-        "cover_url": cover_url,
-        "year": year,
-        "average_rating": avg_rating,
-        "ratings_count": rating_count
-    }
-
-    album_data.update(fetch_album_details(album_url))
-
-    if band_name not in bands:
-        logging.info(f"→ Extrayendo biografía de: {band_name}")
-        bands[band_name] = fetch_artist_info(band_url)
-
-    bands[band_name]["albums"].append(album_data)
-
-    # Guardar después de cada álbum
-    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(bands, f, indent=2, ensure_ascii=False)
+    # Cada álbum se confirma en el diario (O(1)), sin reescribir el JSON completo
+    almacen.guardar_album(band_name, album_data)
 
     return album_name
 
-def main():
-    logging.info("Cargando tabla desde archivo local...")
-    with open(HTML_FILE, "r", encoding="utf-8") as f:
-        soup = BeautifulSoup(f, "html.parser")
-
-    rows = soup.find_all("tr")
-    logging.info(f"Filas encontradas: {len(rows)})")
+# ---------------------------
+# Modo async
+# ---------------------------
+class TokenBucket:
+    """Limita el ritmo a `tasa` peticiones por segundo, con ráfagas de hasta `capacidad`."""
+
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = tasa
+        self.capacidad = capacidad or max(1.0, tasa)
+        self.tokens = self.capacidad
+        self.ultimo = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def tomar(self):
+        async with self.lock:
+            while True:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.tasa)
+
+class CrawlerAsync:
+    """
+    Baja álbumes y artistas en paralelo bajo un semáforo global y un token
+    bucket. Cada banda se pide una sola vez aunque tenga varios álbumes en la
+    tabla, y las traducciones corren en paralelo con la red.
+    """
+
+    def __init__(self, max_inflight=MAX_INFLIGHT, rps=REQUESTS_PER_SECOND):
+        self.max_inflight = max_inflight
+        self.red = asyncio.Semaphore(max_inflight)
+        self.gpt = asyncio.Semaphore(MAX_TRADUCCIONES)
+        self.bucket = TokenBucket(rps)
+        self.artistas = {}  # band_name -> Task con la info de la banda
+        self.procesados = 0
+
+    async def _pedir(self, fn, *args):
+        await self.bucket.tomar()
+        async with self.red:
+            return await asyncio.to_thread(fn, *args)
+
+    async def _traducir(self, texto):
+        if not GPT_TRANSLATE or not texto:
+            return texto
+        async with self.gpt:
+            return await asyncio.to_thread(traducir, texto)
+
+    async def _traducir_varios(self, textos):
+        async with self.gpt:
+            return await asyncio.to_thread(traducir_varios, textos)
+
+    async def _artista(self, band_name, band_url):
+        logging.debug("→ Extrayendo biografía de: %s", band_name)
+        info = await self._pedir(fetch_artist_info, band_url, False)
+        bio = info["biography"]
+        bio["translated_biography"] = await self._traducir(bio["original_biography"])
+        almacen.guardar_banda(band_name, info)
+
+    def _asegurar_artista(self, band_name, band_url):
+        # La primera fila de la banda crea la tarea; las siguientes esperan la misma
+        tarea = self.artistas.get(band_name)
+        if tarea is None:
+            if almacen.existe_banda(band_name):
+                return None
+            tarea = self.artistas[band_name] = asyncio.ensure_future(self._artista(band_name, band_url))
+        return tarea
+
+    async def procesar(self, fila):
+        band_name = fila["band_name"]
+        album_data = fila["album"]
+        album_name = album_data["title"]
+
+        if almacen.existe_album(band_name, album_name):
+            logging.debug("⏩ Álbum ya existe: %s (%s)", album_name, band_name)
+            return None
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = [executor.submit(process_album, row) for row in rows]
-        for future in as_completed(futures):
-            result = future.result()
+        logging.debug("→ Procesando álbum: %s (%s)", album_name, band_name)
+        artista = self._asegurar_artista(band_name, fila["band_url"])
+
+        album_data.update(await self._pedir(fetch_album_details, album_data["album_url"], False))
+        reviews = album_data.get("collaborator_reviews", [])
+        if reviews:
+            traducidas = await self._traducir_varios([r["text"] for r in reviews])
+            for r, t in zip(reviews, traducidas):
+                r["translated_text"] = t
+
+        # El álbum se guarda cuando la banda ya existe en el almacén
+        if artista is not None:
+            await artista
+        almacen.guardar_album(band_name, album_data)
+        self.procesados += 1
+        return album_name
+
+    async def ejecutar(self, filas):
+        # Hilos suficientes para que to_thread no sea el cuello de botella
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_inflight + MAX_TRADUCCIONES + 1))
+        cola = asyncio.Queue(maxsize=max(TAMANO_COLA, self.max_inflight))
+
+        async def una(fila):
+            try:
+                result = await self.procesar(fila)
+                if result:
+                    logging.info(f"✓ Álbum procesado: {result}")
+            except Exception as e:
+                logging.error(f"Error procesando {fila['album']['title']}: {e}")
+
+        def productor():
+            # Lee la tabla en un hilo; se bloquea cuando la cola está llena
+            try:
+                for fila in filas:
+                    asyncio.run_coroutine_threadsafe(cola.put(fila), loop).result()
+            finally:
+                for _ in range(self.max_inflight):
+                    asyncio.run_coroutine_threadsafe(cola.put(None), loop).result()
+
+        async def consumidor():
+            while (fila := await cola.get()) is not None:
+                await una(fila)
+
+        await asyncio.gather(asyncio.to_thread(productor), *(consumidor() for _ in range(self.max_inflight)))
+
+def procesar_en_hilos(filas):
+    """MAX_WORKERS hilos sacan filas de una cola acotada que se llena a medida que se lee la tabla."""
+    cola = queue.Queue(maxsize=TAMANO_COLA)
+    procesados = 0
+    lock = threading.Lock()
+
+    def trabajador():
+        nonlocal procesados
+        while (fila := cola.get()) is not None:
+            try:
+                result = process_album(fila)
+            except Exception as e:
+                logging.error(f"Error procesando {fila['album']['title']}: {e}")
+                continue
             if result:
+                with lock:
+                    procesados += 1
                 logging.info(f"✓ Álbum procesado: {result}")
 
+    hilos = [threading.Thread(target=trabajador) for _ in range(MAX_WORKERS)]
+    for h in hilos:
+        h.start()
+    try:
+        for fila in filas:
+            cola.put(fila)
+    finally:
+        # Aunque falle la lectura de la tabla, los trabajadores reciben su fin y el error sale
+        for _ in hilos:
+            cola.put(None)
+        for h in hilos:
+            h.join()
+    return procesados
+
+def reportar_throughput(procesados, inicio):
+    minutos = (time.perf_counter() - inicio) / 60
+    ritmo = procesados / minutos if minutos else 0
+    logging.info(f"⏱ {procesados} álbumes en {minutos * 60:.1f} s → {ritmo:.1f} álbumes/minuto")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scraper de ProgArchives")
+    parser.add_argument("--async", dest="modo_async", action="store_true",
+                        help="usar el crawler asyncio en vez del ThreadPoolExecutor")
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT,
+                        help="modo async: peticiones simultáneas a ProgArchives")
+    parser.add_argument("--rps", type=float, default=REQUESTS_PER_SECOND,
+                        help="modo async: peticiones por segundo (token bucket)")
+    parser.add_argument("--tabla", action="append",
+                        help=f"archivo HTML o URL de ranking, repetible (por defecto {HTML_FILE}); "
+                             "'{pagina}' en la URL se reemplaza por 1..--paginas")
+    parser.add_argument("--paginas", type=int, default=1)
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+    metricas.iniciar("extraccion", args)
+
+    fuentes = list(extractor.expandir_fuentes(args.tabla or [HTML_FILE], args.paginas))
+    logging.info(f"Leyendo {len(fuentes)} tabla(s) de ranking en streaming...")
+    leidas = 0
+
+    def contar(filas):
+        nonlocal leidas
+        for fila in filas:
+            leidas += 1
+            yield fila
+
+    filas = contar(extractor.iterar_rankings(fuentes, BASE_URL))
+    inicio = time.perf_counter()
+
+    if args.modo_async:
+        crawler = CrawlerAsync(args.max_inflight, args.rps)
+        asyncio.run(crawler.ejecutar(filas))
+        procesados = crawler.procesados
+    else:
+        procesados = procesar_en_hilos(filas)
+
+    logging.info(f"Filas encontradas: {leidas}")
+
+    almacen.cerrar()
+    reportar_throughput(procesados, inicio)
+    if GPT_TRANSLATE:
+        logging.info(traduccion.cache().resumen())
+    metricas.finalizar()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import almacen
+import cliente_http
+import extractor
+import metricas
+from actualizar import detectar_y_arreglar_encoding
+
+# Configuración
+ENTRADA = "progarchives_albums_full_actualizado.json"
+ESTADO = "cache_refresco.sqlite"
+BASE_URL = "https://www.progarchives.com/"
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+MAX_WORKERS = 10
+MAX_REVIEW_CHARS = 4000
+GPT_TRANSLATE = True
+DIA = 24 * 3600
+# Tipo de página -> (intervalo mínimo, intervalo máximo) en días. Una página que no
+# cambió se vuelve a mirar al doble de tiempo, hasta el máximo; una que cambió, al mínimo.
+POLITICA = {"ranking": (1, 7), "album": (7, 56), "artista": (30, 180)}
+CAMPOS_ALBUM = ("album_type", "release_info", "tracklist", "lineup", "average_rating", "ratings_count")
+CAMPOS_RANKING = ("rank", "average_rating", "ratings_count")
+
+# ---------------------------
+# Refresco incremental
+# ---------------------------
+# Ratings, votos y ranks cambian con el tiempo; prog.py y actualizar.py vuelven a
+# bajar y parsear todo. Acá cada URL (tabla de ranking, álbum, artista) guarda en
+# SQLite su ETag, Last-Modified y el hash del cuerpo, y se pide con un GET
+# condicional:
+#   304              -> no se baja ni se parsea nada
+#   200, mismo hash  -> no se parsea
+#   200, otro cuerpo -> se parsea y solo se traduce el texto que cambió
+# Solo se piden las páginas vencidas según POLITICA, las más atrasadas primero.
+# El dataset se actualiza por el diario de almacen.py y el estado de cada URL se
+# guarda después de su registro: una corrida cortada retoma donde quedó.
+
+
+class EstadoRefresco:
+    """Validadores y vencimiento de cada URL (url -> dict con las columnas de la tabla)."""
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta or ESTADO
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS paginas ("
+            " url TEXT PRIMARY KEY, tipo TEXT NOT NULL, etag TEXT, modificado TEXT, hash TEXT,"
+            " bytes INTEGER NOT NULL DEFAULT 0, verificada REAL NOT NULL, intervalo REAL NOT NULL,"
+            " cambios INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.commit()
+
+    def todas(self):
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM paginas")
+            columnas = [c[0] for c in cursor.description]
+            return {fila[0]: dict(zip(columnas, fila)) for fila in cursor}
+
+    def guardar(self, fila):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO paginas (url, tipo, etag, modificado, hash, bytes, verificada, intervalo, cambios)"
+                " VALUES (:url, :tipo, :etag, :modificado, :hash, :bytes, :verificada, :intervalo, :cambios)",
+                fila,
+            )
+            self._db.commit()
+
+    def cerrar(self):
+        self._db.close()
+
+
+# ---------------------------
+# Qué refrescar
+# ---------------------------
+def paginas_del_dataset(datos, tablas=()):
+    """[(url, tipo, banda)] de las tablas de ranking y de cada artista y álbum del dataset."""
+    paginas = [(url, "ranking", None) for url in tablas]
+    for banda, info in datos.items():
+        if info.get("band_url"):
+            paginas.append((info["band_url"], "artista", banda))
+        for album in info.get("albums", []):
+            if album.get("album_url"):
+                paginas.append((album["album_url"], "album", banda))
+    return paginas
+
+
+def vencidas(paginas, estado, politica=POLITICA, ahora=None, todo=False):
+    """
+    Las páginas que toca mirar, de la más atrasada a la menos: atraso = tiempo desde
+    la última verificación / su intervalo (una página nunca vista va primero).
+    """
+    ahora = time.time() if ahora is None else ahora
+    lista = []
+    for orden, pagina in enumerate(paginas):
+        fila = estado.get(pagina[0])
+        atraso = float("inf") if fila is None else (ahora - fila["verificada"]) / fila["intervalo"]
+        if todo or atraso >= 1:
+            lista.append((-atraso, orden, pagina))
+    lista.sort(key=lambda x: x[:2])
+    return [pagina for *_, pagina in lista]
+
+
+def _nuevo_intervalo(fila, tipo, cambio, politica):
+    minimo, maximo = (d * DIA for d in politica[tipo])
+    if fila is None or cambio:
+        return minimo
+    return min(max(fila["intervalo"] * 2, minimo), maximo)
+
+
+# ---------------------------
+# Actualización de registros
+# ---------------------------
+def _traducir(textos):
+    if not GPT_TRANSLATE or not textos:
+        return list(textos)
+    import lotes_traduccion
+    return lotes_traduccion.traducir_textos(textos)
+
+
+def refrescar_album(album, html):
+    """Álbum con los campos de la página; las reseñas que no cambiaron conservan su traducción."""
+    details = extractor.extraer_album(html, MAX_REVIEW_CHARS, valoracion=True)
+    nuevo = dict(album)
+    for campo in CAMPOS_ALBUM:
+        if details.get(campo) is not None:
+            nuevo[campo] = details[campo]
+
+    resenas = details["collaborator_reviews"]
+    if resenas or not album.get("collaborator_reviews"):
+        traducidas = {r.get("text"): r.get("translated_text") for r in album.get("collaborator_reviews") or []}
+        pendientes = []
+        for r in resenas:
+            r["translated_text"] = traducidas.get(r["text"]) or ""
+            if not r["translated_text"]:
+                pendientes.append(r)
+        for r, t in zip(pendientes, _traducir([r["text"] for r in pendientes])):
+            r["translated_text"] = t
+        nuevo["collaborator_reviews"] = resenas
+    return nuevo
+
+
+def refrescar_artista(info, html):
+    artista = extractor.extraer_artista(html)
+    bio = dict(info.get("biography") or {})
+    for campo in ("country", "photo_url"):
+        if artista.get(campo):
+            bio[campo] = artista[campo]
+    if artista["biography"] and artista["biography"] != bio.get("original_biography"):
+        bio["original_biography"] = artista["biography"]
+        bio["translated_biography"] = _traducir([artista["biography"]])[0]
+    return {**info, "biography": bio}
+
+
+def refrescar_ranking(salida, html, base_url):
+    """Rank, rating y votos de cada álbum de la tabla que ya está en el dataset; devuelve cuántos cambiaron."""
+    cambiados = 0
+    for fila in extractor.extraer_tabla(html, base_url):
+        nuevo = fila["album"]
+        id_album = almacen.id_progarchives(nuevo["album_url"])
+        banda = fila["band_name"]
+        for album in salida.datos.get(banda, {}).get("albums", []):
+            if almacen.id_progarchives(album.get("album_url")) == id_album:
+                if any(nuevo.get(c) is not None and album.get(c) != nuevo[c] for c in CAMPOS_RANKING):
+                    salida.guardar_album(banda, {**album, **{c: nuevo[c] for c in CAMPOS_RANKING
+                                                              if nuevo.get(c) is not None}})
+                    cambiados += 1
+                break
+    return cambiados
+
+
+# ---------------------------
+# GET condicional
+# ---------------------------
+def refrescar_pagina(salida, estado, pagina, fila, politica=POLITICA, base_url=BASE_URL):
+    """Devuelve (resultado, bytes recibidos); resultado: 304, igual, sin_cambios, actualizado o error."""
+    url, tipo, banda = pagina
+    headers = dict(HEADERS)
+    if fila and fila.get("etag"):
+        headers["If-None-Match"] = fila["etag"]
+    if fila and fila.get("modificado"):
+        headers["If-Modified-Since"] = fila["modificado"]
+
+    res = cliente_http.get(url, headers=headers)
+    recibidos = res.raw.tell()
+    if res.status_code not in (200, 304):
+        # Sin guardar estado: vuelve a estar vencida en la próxima corrida
+        return "error", recibidos
+    nueva = {"url": url, "tipo": tipo, "etag": res.headers.get("ETag") or (fila or {}).get("etag"),
+             "modificado": res.headers.get("Last-Modified") or (fila or {}).get("modificado"),
+             "hash": (fila or {}).get("hash"), "bytes": (fila or {}).get("bytes", 0),
+             "verificada": time.time(), "cambios": (fila or {}).get("cambios", 0)}
+
+    if res.status_code == 304:
+        resultado = "304"
+    else:
+        nueva["hash"] = hashlib.sha256(res.content).hexdigest()
+        nueva["bytes"] = recibidos
+        if fila is not None and fila.get("hash") == nueva["hash"]:
+            resultado = "igual"
+        else:
+            html, _ = detectar_y_arreglar_encoding(res)
+            with metricas.medir("refresco_actualizacion_segundos", tipo=tipo):
+                if tipo == "ranking":
+                    cambio = refrescar_ranking(salida, html, base_url) > 0
+                elif tipo == "album":
+                    # El álbum actual (una tabla de ranking pudo haberlo reemplazado)
+                    album = next(a for a in salida.datos[banda]["albums"] if a.get("album_url") == url)
+                    nuevo = refrescar_album(album, html)
+                    cambio = nuevo != album
+                    if cambio:
+                        salida.guardar_album(banda, nuevo)
+                else:
+                    info = salida.datos[banda]
+                    nuevo = refrescar_artista(info, html)
+                    cambio = nuevo != info
+                    if cambio:
+                        salida.guardar_banda(banda, nuevo)
+            resultado = "actualizado" if cambio else "sin_cambios"
+            nueva["cambios"] += cambio
+
+    nueva["intervalo"] = _nuevo_intervalo(fila, tipo, resultado == "actualizado", politica)
+    estado.guardar(nueva)  # después del registro: si se corta antes, la página sigue vencida
+    return resultado, recibidos
+
+
+def _politica(texto):
+    tipo, _, dias = texto.partition("=")
+    minimo, _, maximo = dias.partition(":")
+    if tipo not in POLITICA:
+        raise argparse.ArgumentTypeError(f"tipo desconocido: {tipo} (hay {', '.join(POLITICA)})")
+    try:
+        minimo = float(minimo)
+        maximo = float(maximo) if maximo else max(minimo, POLITICA[tipo][1])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"se espera TIPO=DIAS o TIPO=MIN:MAX, no {texto}")
+    return tipo, (minimo, maximo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresca ratings, ranks y textos con GET condicionales")
+    parser.add_argument("entrada", nargs="?", default=ENTRADA)
+    parser.add_argument("--estado", default=ESTADO, help="SQLite con ETag/Last-Modified/hash de cada URL")
+    parser.add_argument("--tabla", action="append", default=[],
+                        help="URL de ranking, repetible; '{pagina}' se reemplaza por 1..--paginas")
+    parser.add_argument("--paginas", type=int, default=1)
+    parser.add_argument("--base-url", default=BASE_URL, help="base de los enlaces de las tablas")
+    parser.add_argument("--politica", type=_politica, action="append", default=[], metavar="TIPO=MIN[:MAX]",
+                        help="días entre verificaciones por tipo (ranking, album, artista)")
+    parser.add_argument("--maximo", type=int, help="páginas por corrida como mucho (las más atrasadas)")
+    parser.add_argument("--todo", action="store_true", help="verificar todo, vencido o no")
+    parser.add_argument("--sin-traducir", action="store_true")
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args(argv)
+    metricas.iniciar("refresco", args)
+
+    global GPT_TRANSLATE
+    if args.sin_traducir:
+        GPT_TRANSLATE = False
+    if not os.path.exists(args.entrada):
+        print(f"❌ No existe {args.entrada}")
+        return 1
+    politica = {**POLITICA, **dict(args.politica)}
+
+    inicio = time.perf_counter()
+    salida = almacen.Almacen(args.entrada)
+    estado = EstadoRefresco(args.estado)
+    filas = estado.todas()
+    paginas = paginas_del_dataset(salida.datos, list(extractor.expandir_fuentes(args.tabla, args.paginas)))
+    plan = vencidas(paginas, filas, politica, todo=args.todo)[:args.maximo]
+    print(f"🔎 {len(plan)} de {len(paginas)} páginas para verificar ("
+          + ", ".join(f"{tipo} {n}" for tipo, n in Counter(p[1] for p in plan).items()) + ")")
+
+    resultados = Counter()
+    recibidos = 0
+    completos = sum(filas[p[0]]["bytes"] for p in plan if p[0] in filas)  # lo que se bajó la última vez
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # Primero las tablas (cada una toca muchos álbumes), después artistas y álbumes
+        for tanda in ([p for p in plan if p[1] == "ranking"], [p for p in plan if p[1] != "ranking"]):
+            futuros = {executor.submit(refrescar_pagina, salida, estado, p, filas.get(p[0]), politica,
+                                       args.base_url): p for p in tanda}
+            for futuro in as_completed(futuros):
+                url, tipo, _ = futuros[futuro]
+                try:
+                    resultado, n = futuro.result()
+                except Exception as e:
+                    print(f"⚠️ {url}: {e}")
+                    resultado, n = "error", 0
+                resultados[resultado] += 1
+                recibidos += n
+                metricas.contar("refresco_paginas", tipo=tipo, resultado=resultado)
+    estado.cerrar()
+
+    if resultados["actualizado"]:
+        salida.cerrar()  # el JSON se reescribe una sola vez, al final
+    print(f"⏱ {len(plan)} páginas en {time.perf_counter() - inicio:.1f}s: "
+          + ", ".join(f"{resultados[r]} {r}" for r in ("304", "igual", "sin_cambios", "actualizado", "error")))
+    if completos:
+        print(f"📦 {recibidos / 1e6:.2f} MB recibidos; bajarlas enteras eran ~{completos / 1e6:.2f} MB "
+              f"({100 * recibidos / completos:.0f}%)")
+    metricas.finalizar()
+    return 0 if not resultados["error"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
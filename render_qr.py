@@ -0,0 +1,204 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from PIL import Image
+import qrcode
+from almacen import escribir_json_atomico
+import metricas
+
+# ---------------------------
+# Motor de renderizado de QR
+# ---------------------------
+# - El logo se abre, se escala y se compone sobre blanco una sola vez por
+#   proceso (no una vez por QR).
+# - La matriz del QR se dibuja directo al tamaño final (un píxel por módulo
+#   y escalado NEAREST), sin renderizar a box_size 10 y remuestrear con LANCZOS.
+# - Un manifiesto por carpeta guarda la huella (URL + logo + tamaño) de cada
+#   archivo: si no cambió, no se vuelve a escribir.
+# - Los QR se reparten en un pool de procesos; opcionalmente se escriben en SVG.
+#   Cada proceso mide su render y el tiempo vuelve al padre (qr_render_segundos).
+
+TAMANO = 500
+PROPORCION_LOGO = 0.25
+MAX_PROCESOS = max(1, (os.cpu_count() or 2) - 1)
+MANIFIESTO = ".manifiesto_qr.json"
+VERSION_RENDER = 1  # subirla invalida todos los manifiestos
+
+
+@lru_cache(maxsize=None)
+def _hash_archivo(ruta):
+    with open(ruta, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def huella(url, logo_path, size_px=TAMANO):
+    h = hashlib.sha256()
+    for parte in (str(VERSION_RENDER), url, _hash_archivo(logo_path), str(size_px)):
+        h.update(parte.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _logo(logo_path, logo_size):
+    logo = Image.open(logo_path).convert("RGBA")
+    logo = logo.resize((logo_size, logo_size), Image.LANCZOS)
+    logo_bg = Image.new("RGB", logo.size, "white")
+    logo_bg.paste(logo, mask=logo.split()[3])
+    return logo_bg
+
+
+@lru_cache(maxsize=None)
+def _logo_png_base64(logo_path, logo_size):
+    buf = io.BytesIO()
+    _logo(logo_path, logo_size).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def matriz(url):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, border=4)
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr.get_matrix()  # incluye el borde
+
+
+# ---------------------------
+# Salidas
+# ---------------------------
+def renderizar_png(url, logo_path, save_path, size_px=TAMANO):
+    m = matriz(url)
+    n = len(m)
+    modulos = Image.frombytes("L", (n, n), bytes(0 if c else 255 for fila in m for c in fila))
+    qr_img = modulos.resize((size_px, size_px), Image.NEAREST).convert("RGB")
+
+    logo_size = int(size_px * PROPORCION_LOGO)
+    pos = ((size_px - logo_size) // 2, (size_px - logo_size) // 2)
+    qr_img.paste(_logo(logo_path, logo_size), pos)
+    qr_img.save(save_path)
+    return save_path
+
+
+def renderizar_svg(url, logo_path, save_path, size_px=TAMANO):
+    m = matriz(url)
+    n = len(m)
+    # Un rectángulo por tramo horizontal de módulos oscuros, en unidades de módulo
+    trazos = []
+    for y, fila in enumerate(m):
+        x = 0
+        while x < n:
+            if fila[x]:
+                inicio = x
+                while x < n and fila[x]:
+                    x += 1
+                trazos.append(f"M{inicio},{y}h{x - inicio}v1h-{x - inicio}z")
+            else:
+                x += 1
+
+    logo_size = int(size_px * PROPORCION_LOGO)
+    lado = n * logo_size / size_px
+    origen = (n - lado) / 2
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size_px}" height="{size_px}" '
+        f'viewBox="0 0 {n} {n}" shape-rendering="crispEdges">'
+        f'<rect width="{n}" height="{n}" fill="#fff"/>'
+        f'<path d="{"".join(trazos)}" fill="#000"/>'
+        f'<rect x="{origen:.3f}" y="{origen:.3f}" width="{lado:.3f}" height="{lado:.3f}" fill="#fff"/>'
+        f'<image x="{origen:.3f}" y="{origen:.3f}" width="{lado:.3f}" height="{lado:.3f}" '
+        f'href="data:image/png;base64,{_logo_png_base64(logo_path, logo_size)}"/>'
+        f'</svg>'
+    )
+    with open(save_path, "w", encoding="utf-8") as f:
+        f.write(svg)
+    return save_path
+
+
+def renderizar(url, logo_path, save_path, size_px=TAMANO):
+    """PNG o SVG según la extensión de save_path."""
+    if save_path.endswith(".svg"):
+        return renderizar_svg(url, logo_path, save_path, size_px)
+    return renderizar_png(url, logo_path, save_path, size_px)
+
+
+def _renderizar_medido(url, logo_path, save_path, size_px):
+    # Corre en el pool: las métricas de este proceso no llegan al padre, el tiempo sí
+    inicio = time.perf_counter()
+    renderizar(url, logo_path, save_path, size_px)
+    return save_path, time.perf_counter() - inicio
+
+
+# ---------------------------
+# Pool de procesos + manifiesto
+# ---------------------------
+class MotorQR:
+    """
+    Reparte los QR en un pool de procesos y omite los que ya están al día.
+    Los manifiestos se escriben al cerrar (o al salir del `with`).
+    """
+
+    def __init__(self, procesos=MAX_PROCESOS):
+        # spawn: el pool se crea con hilos de red ya corriendo en el proceso padre
+        self._pool = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"))
+        self._manifiestos = {}
+        self._lock = threading.Lock()
+        self.generados = 0
+        self.omitidos = 0
+
+    def _manifiesto(self, carpeta):
+        man = self._manifiestos.get(carpeta)
+        if man is None:
+            ruta = os.path.join(carpeta, MANIFIESTO)
+            man = {}
+            if os.path.exists(ruta):
+                with open(ruta, "r", encoding="utf-8") as f:
+                    man = json.load(f)
+            self._manifiestos[carpeta] = man
+        return man
+
+    def enviar(self, url, logo_path, save_path, size_px=TAMANO):
+        """Devuelve un Future con la ruta del archivo (ya resuelto si no hacía falta regenerarlo)."""
+        carpeta, nombre = os.path.split(save_path)
+        formato = os.path.splitext(nombre)[1].lstrip(".")
+        h = huella(url, logo_path, size_px)
+        listo = Future()
+        with self._lock:
+            man = self._manifiesto(carpeta)
+            if man.get(nombre) == h and os.path.exists(save_path):
+                self.omitidos += 1
+                metricas.contar("qr_omitidos", formato=formato)
+                listo.set_result(save_path)
+                return listo
+
+        def registrar(futuro):
+            error = futuro.exception()
+            if error is not None:
+                metricas.contar("qr_errores", formato=formato)
+                listo.set_exception(error)
+                return
+            ruta, segundos = futuro.result()
+            metricas.observar("qr_render_segundos", segundos, formato=formato)
+            with self._lock:
+                man[nombre] = h
+                self.generados += 1
+            listo.set_result(ruta)
+
+        self._pool.submit(_renderizar_medido, url, logo_path, save_path, size_px).add_done_callback(registrar)
+        return listo
+
+    def cerrar(self):
+        self._pool.shutdown()
+        with self._lock:
+            for carpeta, man in self._manifiestos.items():
+                escribir_json_atomico(os.path.join(carpeta, MANIFIESTO), man)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
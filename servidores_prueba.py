@@ -0,0 +1,297 @@
+import gzip
+import json
+import threading
+import time
+import random
+import re
+import urllib.parse
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ---------------------------
+# Servidores locales de prueba
+# ---------------------------
+# Reemplazan a progarchives.com y a las APIs (OpenAI, Spotify, Tidal) para medir los
+# scripts sin salir a internet. Cada ruta es una función
+# (metodo, path, query, headers, cuerpo) -> (estado, headers, cuerpo).
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, igual que un servidor real
+    disable_nagle_algorithm = True  # cabeceras y cuerpo salen en dos write(): sin esto, +40 ms por ACK retrasado
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        # Costo de abrir conexión (TCP + TLS contra el servidor real)
+        if self.server.latencia_conexion:
+            time.sleep(self.server.latencia_conexion)
+        super().setup()
+
+    def _responder(self, metodo):
+        srv = self.server
+        largo = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(largo) if largo else b""
+        parsed = urllib.parse.urlsplit(self.path)
+        query = {k: v[0] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+
+        with srv.lock:
+            srv.peticiones += 1
+            srv.conexiones.add(self.client_address)
+
+        if srv.latencia:
+            time.sleep(srv.latencia)
+
+        if srv.tasa_fallos and random.random() < srv.tasa_fallos:
+            estado, headers, datos = 503, {"Retry-After": "0"}, b"fallo simulado"
+        else:
+            estado, headers, datos = srv.rutas(metodo, parsed.path, query, self.headers, cuerpo)
+
+        if isinstance(datos, str):
+            datos = datos.encode("utf-8")
+        elif not isinstance(datos, bytes):
+            datos = json.dumps(datos).encode("utf-8")
+            headers = {"Content-Type": "application/json", **headers}
+
+        if "gzip" in (self.headers.get("Accept-Encoding") or "") and len(datos) > 1024:
+            datos = gzip.compress(datos, 5)
+            headers = {**headers, "Content-Encoding": "gzip"}
+
+        self.send_response(estado)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        if metodo != "HEAD":
+            self.wfile.write(datos)
+        with srv.lock:
+            srv.bytes_enviados += len(datos)
+
+    def do_GET(self):
+        self._responder("GET")
+
+    def do_HEAD(self):
+        self._responder("HEAD")
+
+    def do_POST(self):
+        self._responder("POST")
+
+
+class ServidorPrueba(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, rutas, latencia=0.0, tasa_fallos=0.0, latencia_conexion=0.0, puerto=0):
+        super().__init__(("127.0.0.1", puerto), _Manejador)
+        self.rutas = rutas
+        self.latencia = latencia
+        self.tasa_fallos = tasa_fallos
+        self.latencia_conexion = latencia_conexion
+        self.lock = threading.Lock()
+        self.peticiones = 0
+        self.bytes_enviados = 0
+        self.conexiones = set()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def iniciar(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self.shutdown()
+        self.server_close()
+
+
+def con_validadores(rutas, modificado="Mon, 06 Jan 2025 10:00:00 GMT"):
+    """
+    Agrega ETag (hash del cuerpo) y Last-Modified a las respuestas 200 de `rutas`
+    y contesta 304 sin cuerpo a un GET condicional que coincide, como un servidor
+    con caché HTTP.
+    """
+
+    def rutas_validadas(metodo, path, query, headers, cuerpo):
+        estado, cabeceras, datos = rutas(metodo, path, query, headers, cuerpo)
+        if estado != 200 or metodo != "GET":
+            return estado, cabeceras, datos
+        if isinstance(datos, str):
+            crudo = datos.encode("utf-8")
+        else:
+            crudo = datos if isinstance(datos, bytes) else json.dumps(datos).encode("utf-8")
+        etag = f'"{zlib.crc32(crudo):08x}"'
+        cabeceras = {**cabeceras, "ETag": etag, "Last-Modified": modificado}
+        if headers.get("If-None-Match") == etag or (
+                "If-None-Match" not in headers and headers.get("If-Modified-Since") == modificado):
+            return 304, {"ETag": etag, "Last-Modified": modificado}, b""
+        return estado, cabeceras, datos
+
+    return rutas_validadas
+
+
+# ---------------------------
+# ProgArchives simulado
+# ---------------------------
+def pagina_relleno(n_bytes=60000):
+    parrafo = "<p>" + "Lorem ipsum dolor sit amet, progressive rock. " * 20 + "</p>\n"
+    return "<html><body>" + parrafo * (n_bytes // len(parrafo) + 1) + "</body></html>"
+
+
+def rutas_progarchives(paginas=None):
+    """paginas: dict path -> html (por ejemplo '/album.asp'). Lo que no está, recibe una página de relleno."""
+    paginas = paginas or {}
+    relleno = pagina_relleno()
+
+    def rutas(metodo, path, query, headers, cuerpo):
+        html = paginas.get(path, relleno)
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, html
+
+    return rutas
+
+
+# ---------------------------
+# OpenAI simulado
+# ---------------------------
+def rutas_openai(segundos_por_peticion=0.2, segundos_por_token=0.0005):
+    """Imita /v1/chat/completions: "traduce" anteponiendo [es] a cada texto (o a cada marca <<<n>>>)."""
+
+    def rutas(metodo, path, query, headers, cuerpo):
+        if not path.endswith("/chat/completions"):
+            return 404, {}, {"error": "ruta desconocida"}
+        pedido = json.loads(cuerpo)
+        contenido = pedido["messages"][-1]["content"]
+        if "<<<0>>>" in contenido:
+            segmentos = re.split(r"(<<<\d+>>>)", contenido[contenido.index("<<<0>>>"):])
+            respuesta = "".join(s if s.startswith("<<<") else "\n[es] " + s.strip() + "\n" for s in segmentos if s.strip())
+        else:
+            respuesta = "[es] " + contenido.split(":\n\n", 1)[-1]
+        tokens_in = len(contenido) // 4 + 1
+        tokens_out = len(respuesta) // 4 + 1
+        time.sleep(segundos_por_peticion + segundos_por_token * tokens_out)
+        return 200, {}, {
+            "id": "chatcmpl-prueba",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": pedido.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": respuesta}}],
+            "usage": {"prompt_tokens": tokens_in, "completion_tokens": tokens_out,
+                      "total_tokens": tokens_in + tokens_out},
+        }
+
+    return rutas
+
+
+# ---------------------------
+# Spotify / Tidal simulados
+# ---------------------------
+class Cuota:
+    """Cubeta de tokens del lado del servidor: lo que se pasa de `rps` recibe 429 con Retry-After."""
+
+    def __init__(self, rps, rafaga=None):
+        self.rps = rps
+        self.capacidad = rafaga or rps
+        self.tokens = self.capacidad
+        self.ultimo = time.monotonic()
+        self.rechazadas = 0
+        self.lock = threading.Lock()
+
+    def pedir(self):
+        """None si la petición entra en la cuota; si no, los segundos a esperar."""
+        with self.lock:
+            ahora = time.monotonic()
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.rps)
+            self.ultimo = ahora
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            self.rechazadas += 1
+            return (1 - self.tokens) / self.rps
+
+
+def _id_falso(texto):
+    return str(zlib.crc32(texto.encode("utf-8")))
+
+
+def _limitado(cuota):
+    espera = cuota.pedir() if cuota else None
+    if espera is None:
+        return None
+    # Retry-After es en segundos enteros, como en las APIs reales
+    return 429, {"Retry-After": str(max(1, round(espera)))}, {"error": "rate limited"}
+
+
+class Tokens:
+    """Emite tokens que vencen a los `expira_en` segundos; uno vencido recibe 401."""
+
+    def __init__(self, prefijo, expira_en=3600):
+        self.prefijo = prefijo
+        self.expira_en = expira_en
+        self.emitidos = {}
+        self.lock = threading.Lock()
+
+    def emitir(self):
+        with self.lock:
+            token = f"{self.prefijo}-{len(self.emitidos) + 1}"
+            self.emitidos[token] = time.monotonic() + self.expira_en
+        return 200, {}, {"access_token": token, "token_type": "Bearer", "expires_in": self.expira_en}
+
+    def rechazo(self, headers):
+        token = (headers.get("Authorization") or "").removeprefix("Bearer ")
+        with self.lock:
+            vence = self.emitidos.get(token)
+        if vence is None or time.monotonic() >= vence:
+            return 401, {}, {"error": "invalid or expired token"}
+        return None
+
+
+def _sin_resultado(q, proporcion):
+    # Determinista: la misma consulta nunca se encuentra
+    return zlib.crc32(q.encode("utf-8")) % 1000 < proporcion * 1000
+
+
+def rutas_spotify(rps=None, latencia=0.05, expira_en=3600, sin_resultado=0.0):
+    """/api/token y /v1/search. Con `rps`, lo que exceda la cuota recibe 429."""
+    cuota = Cuota(rps) if rps else None
+    tokens = Tokens("token-spotify", expira_en)
+
+    def rutas(metodo, path, query, headers, cuerpo):
+        if path.endswith("/api/token"):
+            return tokens.emitir()
+        if path.endswith("/v1/search"):
+            rechazo = tokens.rechazo(headers) or _limitado(cuota)
+            if rechazo:
+                return rechazo
+            time.sleep(latencia)
+            q = query.get("q", "")
+            items = [] if _sin_resultado(q, sin_resultado) else [{"id": "sp" + _id_falso(q), "name": q}]
+            return 200, {}, {"albums": {"items": items}}
+        return 404, {}, {"error": "ruta desconocida"}
+
+    rutas.cuota = cuota
+    rutas.tokens = tokens
+    return rutas
+
+
+def rutas_tidal(rps=None, latencia=0.05, expira_en=3600, sin_resultado=0.0):
+    """/v1/oauth2/token y /v2/searchResults/<query>. Con `rps`, lo que exceda la cuota recibe 429."""
+    cuota = Cuota(rps) if rps else None
+    tokens = Tokens("token-tidal", expira_en)
+
+    def rutas(metodo, path, query, headers, cuerpo):
+        if path.endswith("/oauth2/token"):
+            return tokens.emitir()
+        if "/searchResults/" in path:
+            rechazo = tokens.rechazo(headers) or _limitado(cuota)
+            if rechazo:
+                return rechazo
+            time.sleep(latencia)
+            q = urllib.parse.unquote(path.rsplit("/", 1)[-1])
+            albums = [] if _sin_resultado(q, sin_resultado) else [{"id": _id_falso(q), "type": "albums"}]
+            return 200, {}, {"data": {"relationships": {"albums": {"data": albums}}}}
+        return 404, {}, {"error": "ruta desconocida"}
+
+    rutas.cuota = cuota
+    rutas.tokens = tokens
+    return rutas
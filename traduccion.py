@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import openai
+import metricas
+
+# ---------------------------
+# Traducción con GPT + caché en disco
+# ---------------------------
+# prog.py y completar.py traducen biografías y reseñas con el mismo prompt.
+# Cada traducción queda guardada en SQLite bajo el hash de (modelo, prompt,
+# texto): volver a correr un script no repite llamadas por textos que no
+# cambiaron. La caché tiene un tope de tamaño y expulsa lo menos usado (LRU).
+
+MODELO = "gpt-4o"
+PROMPT = "Traduce al español el siguiente texto manteniendo el estilo original:\n\n"
+TEMPERATURA = 0.7
+CACHE_DB = "cache_traducciones.sqlite"
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+
+def clave_cache(texto, modelo=MODELO, prompt=PROMPT):
+    h = hashlib.sha256()
+    for parte in (modelo, prompt, texto):
+        h.update(parte.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class CacheTraducciones:
+    def __init__(self, ruta=None, max_bytes=None):
+        # Se leen al crear la caché, así CACHE_DB / CACHE_MAX_BYTES se pueden cambiar antes
+        ruta = ruta or CACHE_DB
+        self.ruta = ruta
+        self.max_bytes = max_bytes or CACHE_MAX_BYTES
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS traducciones ("
+            " clave TEXT PRIMARY KEY, traduccion TEXT NOT NULL,"
+            " bytes INTEGER NOT NULL, usado REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_usado ON traducciones(usado)")
+        self._db.commit()
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM traducciones").fetchone()[0]
+
+    def obtener(self, clave, contar=True):
+        """
+        La traducción guardada bajo `clave`, o None. Con contar=False no suma
+        aciertos ni fallos: quien busca un texto bajo varias claves cuenta una
+        sola vez con contar().
+        """
+        with self._lock:
+            fila = self._db.execute("SELECT traduccion FROM traducciones WHERE clave = ?", (clave,)).fetchone()
+            if contar:
+                self._contar(fila is not None)
+            if fila is None:
+                return None
+            self._db.execute("UPDATE traducciones SET usado = ? WHERE clave = ?", (time.time(), clave))
+            self._db.commit()
+            return fila[0]
+
+    def contar(self, acierto):
+        with self._lock:
+            self._contar(acierto)
+
+    def _contar(self, acierto):
+        if acierto:
+            self.aciertos += 1
+            metricas.contar("cache_aciertos", cache="traducciones", etapa="traduccion")
+        else:
+            self.fallos += 1
+            metricas.contar("cache_fallos", cache="traducciones", etapa="traduccion")
+
+    def guardar(self, clave, traduccion):
+        tam = len(traduccion.encode("utf-8"))
+        with self._lock:
+            anterior = self._db.execute("SELECT bytes FROM traducciones WHERE clave = ?", (clave,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO traducciones (clave, traduccion, bytes, usado) VALUES (?, ?, ?, ?)",
+                (clave, traduccion, tam, time.time()),
+            )
+            self._bytes += tam - (anterior[0] if anterior else 0)
+            self._expulsar()
+            self._db.commit()
+
+    def _expulsar(self):
+        # Se borran las entradas menos usadas recientemente hasta volver bajo el tope
+        while self._bytes > self.max_bytes:
+            filas = self._db.execute(
+                "SELECT clave, bytes FROM traducciones ORDER BY usado LIMIT 64"
+            ).fetchall()
+            if not filas:
+                break
+            for clave, tam in filas:
+                self._db.execute("DELETE FROM traducciones WHERE clave = ?", (clave,))
+                self._bytes -= tam
+                if self._bytes <= self.max_bytes:
+                    break
+
+    def resumen(self):
+        total = self.aciertos + self.fallos
+        tasa = 100 * self.aciertos / total if total else 0
+        return f"caché de traducciones: {self.aciertos} aciertos, {self.fallos} fallos ({tasa:.0f}% aciertos), {self._bytes / 1e6:.1f} MB"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheTraducciones()
+        return _cache
+
+
+def llamar_gpt(texto, modelo=MODELO, prompt=PROMPT):
+    metricas.contar("traduccion_llamadas", modelo=modelo, etapa="traduccion")
+    try:
+        with metricas.medir("traduccion_segundos", modelo=modelo, etapa="traduccion"):
+            response = openai.chat.completions.create(
+                model=modelo,
+                messages=[{"role": "user", "content": f"{prompt}{texto}"}],
+                temperature=TEMPERATURA
+            )
+    except Exception as e:
+        metricas.contar("traduccion_errores", modelo=modelo, error=type(e).__name__, etapa="traduccion")
+        raise
+    uso = getattr(response, "usage", None)
+    if uso is not None:
+        metricas.contar("traduccion_tokens", uso.prompt_tokens or 0, modelo=modelo, tipo="entrada", etapa="traduccion")
+        metricas.contar("traduccion_tokens", uso.completion_tokens or 0, modelo=modelo, tipo="salida", etapa="traduccion")
+    return response.choices[0].message.content.strip()
+
+
+def traducir(texto):
+    if not texto:
+        return texto
+    clave = clave_cache(texto)
+    guardada = cache().obtener(clave)
+    if guardada is not None:
+        return guardada
+    try:
+        traducido = llamar_gpt(texto)
+    except Exception as e:
+        # No se cachea: la próxima corrida lo vuelve a intentar
+        logging.error(f"Error al traducir: {e}")
+        return texto
+    cache().guardar(clave, traducido)
+    return traducido
+
+
+def sembrar(datos):
+    """Carga en la caché los pares original → traducción que ya están en un dataset."""
+    c = cache()
+    n = 0
+    for info in datos.values():
+        bio = info.get("biography") or {}
+        pares = [(bio.get("original_biography"), bio.get("translated_biography"))]
+        for album in info.get("albums", []):
+            for r in album.get("collaborator_reviews") or []:
+                pares.append((r.get("text"), r.get("translated_text")))
+        for original, traducido in pares:
+            # Si la traducción es igual al original, la llamada había fallado
+            if original and traducido and traducido != original:
+                c.guardar(clave_cache(original), traducido)
+                n += 1
+    return n
+
+
+if __name__ == "__main__":
+    import argparse
+    import almacen
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Caché de traducciones")
+    parser.add_argument("--sembrar", metavar="JSON", help="precargar las traducciones de un dataset existente")
+    args = parser.parse_args()
+
+    if args.sembrar:
+        n = sembrar(almacen.cargar(args.sembrar))
+        logging.info(f"{n} traducciones precargadas desde {args.sembrar}")
+    logging.info(cache().resumen())